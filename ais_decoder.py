@@ -0,0 +1,256 @@
+import binascii
+import math
+from collections import namedtuple
+
+import numpy as np
+
+"""
+     Fast decoder of the AIS position reports (message types 1, 2, 3, 18 and 19) without pyais.
+
+     The message type is read from the first character of the armored payload, so any other message type is
+     rejected before anything is decoded. Position reports are decoded by table lookup: the 6 bit payload characters
+     are translated to the base64 characters of the same value (bytes.translate with a precomputed table), so
+     binascii turns them into one integer, and only the fields the collision check needs are taken out by shift and
+     mask (mmsi, lat, lon, speed, course, heading, accuracy, turn). Values are the same as pyais gives
+     them (lat/lon rounded to 6 decimals, speed and course in tenths, rate of turn as pyais.messages.to_turn).
+
+     Only single-fragment sentences of the usual form are decoded here; for anything else (multi-fragment,
+     short or invalid payload, other sentence formats) decode_position() returns None and the caller falls back
+     to pyais, which also remains the reference: python ais_decoder.py benchmark_corpus.nmea compares both.
+
+     decode_positions() decodes many sentences at once with NumPy, e.g., a whole capture file.
+     encode_position() is the reverse for test traffic (payload of a type 1, 2, 3 or 18 report).
+"""
+
+position_fields = ('msg_type', 'mmsi', 'lat', 'lon', 'speed', 'course', 'heading', 'accuracy', 'turn')
+PositionReport = namedtuple('PositionReport', position_fields)     # attributes as the pyais message
+OtherMessage = namedtuple('OtherMessage', ('msg_type',))           # not a position report, not decoded
+
+# armored payload character -> 6 bit value ('0' to 'W' = 0 to 39, '`' to 'w' = 40 to 63)
+sixbit = {c: c - 48 if c < 88 else c - 56 for c in list(range(48, 88)) + list(range(96, 120))}
+armor_characters = bytes(sorted(sixbit))
+base64_alphabet = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+to_base64 = bytes.maketrans(armor_characters, bytes(base64_alphabet[sixbit[c]] for c in armor_characters))
+from_base64 = bytes.maketrans(bytes(base64_alphabet[sixbit[c]] for c in armor_characters), armor_characters)
+sixbit_table = np.full(256, 255, dtype=np.uint8)
+sixbit_table[list(sixbit)] = list(sixbit.values())
+
+message_bits = {1: 168, 2: 168, 3: 168, 18: 168, 19: 312}     # payload length of the position reports
+decoded_characters = 24     # payload characters decoded (whole base64 groups), all fields are in the first 137 bits
+
+# bit ranges of the fields, class B (18, 19) fields from speed on are 4 bits earlier than class A
+class_a_fields = {'mmsi': (8, 38), 'turn': (42, 50), 'speed': (50, 60), 'accuracy': (60, 61), 'lon': (61, 89),
+                  'lat': (89, 116), 'course': (116, 128), 'heading': (128, 137)}
+class_b_fields = {'mmsi': (8, 38), 'speed': (46, 56), 'accuracy': (56, 57), 'lon': (57, 85), 'lat': (85, 112),
+                  'course': (112, 124), 'heading': (124, 133)}
+# (shift, mask) of the fields in the integer of the first decoded_characters * 6 bits, turn last
+class_a_shifts = [(decoded_characters * 6 - end, (1 << (end - start)) - 1) for start, end in
+                  [class_a_fields[name] for name in class_b_fields] + [class_a_fields['turn']]]
+class_b_shifts = [(decoded_characters * 6 - end, (1 << (end - start)) - 1) for start, end in class_b_fields.values()]
+
+
+def payload_of(sentence):
+    """
+    :param sentence: NMEA AIS sentence as bytes, e.g., b'!AIVDM,1,1,,A,13u?etPv2;0n:dDPwUM1U1Cb069D,0*24'
+    :return: armored payload of a single-fragment !xxVDM/!xxVDO sentence, None for anything else
+    """
+    fields = sentence.split(b',')
+    if len(fields) != 7 or fields[1] != b'1' or fields[2] != b'1' or not fields[0].startswith(b'!') or \
+            not fields[0].endswith((b'VDM', b'VDO')):
+        return None
+    return fields[5]
+
+
+def signed(value, bits):
+    return value - (1 << bits) if value >= 1 << (bits - 1) else value
+
+
+def to_lat_lon(value):
+    # round(value / 600000, 6) in integer arithmetic, as pyais
+    return ((10 * value + 3) // 6) / 1e6
+
+
+def to_turn(turn):
+    # rate of turn indicator to degrees per minute, as pyais (0, +-127 and -128 are kept)
+    if turn == 0:
+        return 0.0
+    if abs(turn) >= 127:
+        return float(turn)
+    return math.copysign(round((turn / 4.733) ** 2), turn)
+
+
+def decode_position(sentence):
+    """
+    :param sentence: one NMEA AIS sentence as bytes
+    :return: PositionReport of a position report, OtherMessage (msg_type only) of other message types,
+             None if the sentence has to be decoded by pyais
+    """
+    payload = payload_of(sentence)
+    if not payload:
+        return None
+    msg_type = sixbit.get(payload[0])
+    if msg_type is None:
+        return None
+    if msg_type not in message_bits:
+        return OtherMessage(msg_type)
+    if len(payload) * 6 < message_bits[msg_type] or payload.translate(None, armor_characters):
+        return None
+
+    # first 144 bits as one integer, fields by shift and mask
+    value = int.from_bytes(binascii.a2b_base64(payload[:decoded_characters].translate(to_base64)), 'big')
+    if msg_type < 4:
+        mmsi, speed, accuracy, lon, lat, course, heading, turn = [(value >> shift) & mask for shift, mask in
+                                                                  class_a_shifts]
+        turn = to_turn(signed(turn, 8))
+    else:
+        mmsi, speed, accuracy, lon, lat, course, heading = [(value >> shift) & mask for shift, mask in class_b_shifts]
+        turn = -128.0               # class B reports have no rate of turn
+
+    return PositionReport(msg_type, mmsi, to_lat_lon(signed(lat, 27)), to_lat_lon(signed(lon, 28)), speed / 10.0,
+                          course / 10.0, heading, bool(accuracy), turn)
+
+
+def encode_position(mmsi, lat, lon, speed, course, heading=511, msg_type=1, turn=-128, accuracy=False, second=60):
+    """
+    :param speed: knots, None = not available
+    :param course: degrees over ground, None = not available
+    :param heading: degrees, 511 = not available
+    :param msg_type: 1, 2, 3 (class A) or 18 (class B)
+    :param turn: rate of turn in degrees per minute, -128 = not available (class A only)
+    :param second: UTC second of the report, 60 = not available
+    :return: armored payload (28 characters, no fill bits) as bytes
+    """
+    speed = 1023 if speed is None else min(int(round(speed * 10)), 1022)
+    course = 3600 if course is None else int(round(course * 10)) % 3600
+    position = [(speed, 10), (int(accuracy), 1), (round(lon * 600000), 28), (round(lat * 600000), 27), (course, 12),
+                (int(heading), 9), (second, 6)]
+    if msg_type < 4:
+        if turn != 0 and abs(turn) not in (127, 128):
+            # degrees per minute to the rate of turn indicator, as pyais
+            turn = int(math.copysign(min(round(4.733 * math.sqrt(abs(turn))), 126), turn))
+        fields = [(msg_type, 6), (0, 2), (mmsi, 30), (0, 4), (int(turn), 8)] + position + [(0, 2), (0, 3), (0, 1),
+                                                                                           (0, 19)]
+    else:
+        fields = [(msg_type, 6), (0, 2), (mmsi, 30), (0, 8)] + position + [(0, 2), (1, 1), (0, 5), (0, 1), (0, 20)]
+
+    value = 0
+    for field, bits in fields:
+        value = (value << bits) | (field & ((1 << bits) - 1))
+    return binascii.b2a_base64(value.to_bytes(21, 'big'), newline=False).translate(from_base64)
+
+
+def decode_positions(sentences):
+    """
+    :param sentences: list of NMEA AIS sentences as bytes
+    :return: dict of arrays 'index' (positions of the decoded sentences in the list) and the position_fields of
+             the position reports; other message types and sentences for pyais are left out
+    """
+    index = []
+    payloads = []
+    for i, sentence in enumerate(sentences):
+        payload = payload_of(sentence)
+        if not payload:
+            continue
+        msg_type = sixbit.get(payload[0])
+        if msg_type in message_bits and len(payload) * 6 >= message_bits[msg_type] and \
+                not payload.translate(None, armor_characters):
+            index.append(i)
+            payloads.append(payload[:decoded_characters])
+
+    # n x 144 bits
+    characters = np.frombuffer(b''.join(payloads), dtype=np.uint8).reshape(len(payloads), decoded_characters)
+    values = sixbit_table[characters]
+    bits = (values[:, :, None] >> np.arange(5, -1, -1, dtype=np.uint8)) & 1
+    bits = bits.reshape(len(payloads), decoded_characters * 6)
+
+    def field(rows, start, end):
+        weights = 1 << np.arange(end - start - 1, -1, -1, dtype=np.int64)
+        return bits[rows, start:end].astype(np.int64) @ weights
+
+    msg_type = field(slice(None), 0, 6)
+    columns = {'index': np.asarray(index, dtype=np.intp), 'msg_type': msg_type.astype(np.uint8)}
+    raw = {name: np.zeros(len(payloads), dtype=np.int64) for name in class_a_fields}
+    raw['turn'][:] = -128
+    class_a = msg_type < 4
+    for rows, fields in ((class_a, class_a_fields), (~class_a, class_b_fields)):
+        for name, (start, end) in fields.items():
+            raw[name][rows] = field(rows, start, end)
+
+    raw['lat'] = np.where(raw['lat'] >= 1 << 26, raw['lat'] - (1 << 27), raw['lat'])
+    raw['lon'] = np.where(raw['lon'] >= 1 << 27, raw['lon'] - (1 << 28), raw['lon'])
+    turn = np.where(class_a & (raw['turn'] >= 128), raw['turn'] - 256, raw['turn']).astype(float)
+    rate = np.copysign(np.round((turn / 4.733) ** 2), turn)
+    columns['mmsi'] = raw['mmsi']
+    columns['lat'] = ((10 * raw['lat'] + 3) // 6) / 1e6
+    columns['lon'] = ((10 * raw['lon'] + 3) // 6) / 1e6
+    columns['speed'] = raw['speed'] / 10.0
+    columns['course'] = raw['course'] / 10.0
+    columns['heading'] = raw['heading']
+    columns['accuracy'] = raw['accuracy'].astype(bool)
+    columns['turn'] = np.where(np.abs(turn) >= 127, turn, rate)
+    return columns
+
+
+if __name__ == "__main__":
+
+    import argparse
+    import time
+
+    from pyais import decode
+
+    parser = argparse.ArgumentParser(description="Compare the fast position report decoder with pyais")
+    parser.add_argument("file", help="file with one NMEA AIS sentence per line, e.g., benchmark_corpus.nmea")
+
+    args = parser.parse_args()
+
+    with open(args.file, 'rb') as f:
+        sentences = [line.strip() for line in f if line.strip()]
+
+    fast = pyais = others = mismatches = 0
+    for sentence in sentences:
+        decoded = decode_position(sentence)
+        try:
+            reference = decode(sentence.decode('latin1'))
+        except Exception:
+            reference = None
+        if decoded is None:
+            pyais += 1
+            continue
+        if isinstance(decoded, OtherMessage):
+            others += 1
+            matches = reference is None or reference.msg_type == decoded.msg_type
+        else:
+            fast += 1
+            matches = reference is not None and all(
+                float(getattr(reference, name)) == float(getattr(decoded, name)) for name in position_fields
+                if name != 'turn' or decoded.msg_type < 4)
+        if not matches:
+            mismatches += 1
+            print(f'Mismatch: {sentence} fast {decoded} pyais {reference}')
+
+    batch = decode_positions(sentences)
+    for row, i in enumerate(batch['index']):
+        decoded = decode_position(sentences[i])
+        if any(float(batch[name][row]) != float(getattr(decoded, name)) for name in position_fields):
+            mismatches += 1
+            print(f'Batch mismatch: {sentences[i]}')
+
+    print(f'{len(sentences)} sentences: {fast} position reports decoded, {others} other message types rejected, '
+          f'{pyais} left to pyais; {mismatches} mismatches')
+
+    start = time.perf_counter()
+    for sentence in sentences:
+        decode_position(sentence)
+    fast_time = time.perf_counter() - start
+    start = time.perf_counter()
+    decode_positions(sentences)
+    batch_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for sentence in sentences:
+        try:
+            decode(sentence.decode('latin1')).asdict()
+        except Exception:
+            pass
+    pyais_time = time.perf_counter() - start
+    print(f'Per sentence: fast {fast_time / len(sentences) * 1e6:.2f} us, batch {batch_time / len(sentences) * 1e6:.2f} '
+          f'us, pyais decode and asdict {pyais_time / len(sentences) * 1e6:.2f} us')
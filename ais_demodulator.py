@@ -0,0 +1,522 @@
+import binascii
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+"""
+     AIS receiver in NumPy: IQ samples of an RTL-SDR (or an IQ file) to !AIVDM sentences, without SDRangel.
+
+     Per block of IQ samples (centered between the two AIS channels, e.g., 162.0 MHz at 2.048 MS/s):
+          1. channel filter: complex band-pass FIR around channel A (161.975 MHz) and B (162.025 MHz), decimated by
+             decimation (2.048 MS/s -> 64 kS/s, 6.67 samples per symbol) as a polyphase filter, i.e., a few matrix
+             products; the mixing to baseband is folded into the taps and the discriminator. The short polyphase
+             filter only has to stop aliasing, the channel bandwidth is set by a second, sharp band-pass at the
+             channel rate (cheap at 64 kS/s)
+          2. GMSK demodulation: FM discriminator (phase difference of consecutive samples), moving average over 3/4
+             symbol against noise
+          3. clock recovery: every packet is sampled at phases (e.g., 8) offsets within the symbol, the drift of the
+             symbol clock over one packet (< 1100 bits) is negligible
+          4. packet search: correlation of the symbols with the levels of the end of the training sequence and the
+             start flag (0101010101010101 01111110); the correlation has zero mean, so it does not depend on the
+             frequency offset of the receiver, which is then fitted to the training sequence of each packet and
+             taken as the decision level of its symbols
+          5. NRZI decoding, HDLC bit de-stuffing up to an end flag and CRC-16 (X.25) check
+          6. the message bits (bytes are sent LSB first) as 6-bit ASCII payload of !AIVDM sentences
+     All steps work on whole blocks, packets are searched in the symbols of all phases at once. The last
+     history_samples of every block are kept, so packets across block boundaries are found once.
+
+     E.g., demodulator = AISDemodulator(sample_rate=2.048e6, center_freq=162e6)
+           sentences = demodulator.process(sdr.read_samples(256 * 1024))
+     Test with IQ files: python ais_demodulator.py --synthesize test.cu8; python ais_demodulator.py test.cu8
+"""
+
+baud_rate = 9600
+channels = (('A', 161.975e6), ('B', 162.025e6))
+flag = (0, 1, 1, 1, 1, 1, 1, 0)
+sync_bits = (0, 1) * 8 + flag           # end of the training sequence (24 bits) and start flag
+crc_residue = 0x1D0F        # CRC-16/CCITT of a frame with its (complemented) FCS, bit order of the air interface
+
+
+def pattern_positions(bits, pattern):
+    """
+    :param bits: uint8 array of shape (rows, n)
+    :param pattern: tuple of bits
+    :return: row and column arrays of the starts of the pattern
+    """
+    n = bits.shape[1] - len(pattern) + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    match = np.ones((bits.shape[0], n), dtype=bool)
+    for j, bit in enumerate(pattern):
+        match &= bits[:, j:j + n] == bit
+    return np.nonzero(match)
+
+
+def destuff(bits):
+    """
+    :param bits: uint8 array of the frame bits between start and end flag
+    :return: bits without the zeros inserted after five ones, None if the bits contain six ones (abort)
+    """
+    index = np.arange(len(bits))
+    last_zero = np.maximum.accumulate(np.where(bits == 0, index, -1))
+    ones = index - last_zero                # length of the run of ones up to each bit, 0 at zeros
+    if len(bits) and ones.max() >= 6:
+        return None
+    stuffed = np.zeros(len(bits), dtype=bool)
+    stuffed[1:] = (bits[1:] == 0) & (ones[:-1] == 5)
+    return bits[~stuffed]
+
+
+def stuff(bits):
+    """
+    :param bits: frame bits (data and FCS)
+    :return: bits with a zero after every five consecutive ones
+    """
+    stuffed = []
+    ones = 0
+    for bit in bits:
+        stuffed.append(bit)
+        ones = ones + 1 if bit else 0
+        if ones == 5:
+            stuffed.append(0)
+            ones = 0
+    return np.array(stuffed, dtype=np.uint8)
+
+
+def crc_x25(data):
+    """
+    :param data: bytes
+    :return: CRC-16/X.25 (HDLC FCS) of the bytes
+    """
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+    return crc ^ 0xFFFF
+
+
+def payload_to_bits(payload, fill_bits=0):
+    """
+    :param payload: 6-bit ASCII payload of an AIVDM sentence
+    :return: uint8 array of the message bits
+    """
+    values = np.frombuffer(payload.encode('ascii'), dtype=np.uint8).astype(np.int16) - 48
+    values[values > 40] -= 8
+    bits = np.unpackbits(values.astype(np.uint8)[:, None], axis=1)[:, 2:].ravel()
+    return bits[:len(bits) - fill_bits]
+
+
+def bits_to_payload(bits):
+    """
+    :param bits: uint8 array of the message bits
+    :return: 6-bit ASCII payload and number of fill bits
+    """
+    fill_bits = -len(bits) % 6
+    values = np.concatenate([bits, np.zeros(fill_bits, dtype=np.uint8)]).reshape(-1, 6) @ (32, 16, 8, 4, 2, 1)
+    values = values + 48
+    values[values > 87] += 8
+    return values.astype(np.uint8).tobytes().decode('ascii'), fill_bits
+
+
+def nmea_sentences(payload, fill_bits, channel, sequence=None, max_payload=60):
+    """
+    :return: list of !AIVDM sentences as bytes, several fragments for long payloads
+    """
+    fragments = [payload[i:i + max_payload] for i in range(0, len(payload), max_payload)] or ['']
+    sequence = '' if len(fragments) == 1 or sequence is None else str(sequence)
+    sentences = []
+    for number, fragment in enumerate(fragments, 1):
+        fill = fill_bits if number == len(fragments) else 0
+        body = f'AIVDM,{len(fragments)},{number},{sequence},{channel},{fragment},{fill}'
+        checksum = 0
+        for char in body.encode('ascii'):
+            checksum ^= char
+        sentences.append(f'!{body}*{checksum:02X}'.encode('ascii'))
+    return sentences
+
+
+def valid_sentence(sentence):
+    """
+    :param sentence: !AIVDM sentence as bytes
+    :return: True if the checksum and the 6-bit payload are valid
+    """
+    body, _, checksum = sentence.partition(b'*')
+    fields = body.split(b',')
+    if len(fields) != 7 or not fields[6].isdigit():
+        return False
+    value = 0
+    for char in body[1:]:
+        value ^= char
+    payload = np.frombuffer(fields[5], dtype=np.uint8)
+    return checksum[:2] == f'{value:02X}'.encode() and bool(np.all(((payload >= 48) & (payload <= 87)) |
+                                                                   ((payload >= 96) & (payload <= 119))))
+
+
+def nrzi_levels(bits):
+    """
+    :param bits: data bits
+    :return: levels (0/1) on air, starting with level 0 before the first bit (NRZI: 0 = change)
+    """
+    return np.concatenate([[0], np.cumsum(np.asarray(bits) == 0) % 2]).astype(np.uint8)
+
+
+def moving_average(x, n):
+    """
+    :return: centered moving average of length n, edges averaged over the available samples
+    """
+    total = np.concatenate(([0.0], np.cumsum(x, dtype=np.float64)))
+    index = np.arange(len(x))
+    low = np.clip(index - n // 2, 0, len(x))
+    high = np.clip(index - n // 2 + n, 0, len(x))
+    return ((total[high] - total[low]) / np.maximum(high - low, 1)).astype(np.float32)
+
+
+class AISDemodulator:
+    """
+        Streaming AIS demodulator of both channels. process() takes consecutive blocks of IQ samples and returns
+        the !AIVDM sentences of the packets found so far.
+    """
+    def __init__(self, sample_rate=2.048e6, center_freq=162.0e6, decimation=None, taps_per_phase=8, cutoff=6e3,
+                 channel_taps=81, phases=8, max_bits=1100, sync_threshold=0.6):
+        """
+        :param sample_rate: IQ samples per second
+        :param center_freq: tuning frequency of the SDR in Hz, both channels have to be within the sample rate
+        :param decimation: input samples per channel sample, None: about 64 kS/s per channel
+        :param taps_per_phase: FIR length of the decimating filter in multiples of decimation
+        :param cutoff: channel filter cutoff in Hz
+        :param channel_taps: FIR length of the channel filter at the channel rate
+        :param phases: sampling phases per symbol for the clock recovery
+        :param max_bits: longest frame (data and FCS, stuffed) in bits
+        :param sync_threshold: correlation coefficient (0 to 1) with training sequence and start flag of a packet
+        """
+        self.sample_rate = sample_rate
+        self.decimation = decimation or max(int(round(sample_rate / 64000)), 1)
+        self.channel_rate = sample_rate / self.decimation
+        self.sps = self.channel_rate / baud_rate                    # samples per symbol
+        if self.sps < 3:
+            raise ValueError(f'{self.channel_rate:.0f} S/s per channel is too low for {baud_rate} baud')
+        self.names = [name for name, _ in channels]
+        offsets = np.array([frequency - center_freq for _, frequency in channels])
+        if np.any(np.abs(offsets) + cutoff > sample_rate / 2):
+            raise ValueError(f'AIS channels are not within {sample_rate / 1e6} MS/s around {center_freq / 1e6} MHz')
+
+        # decimating band-pass per channel, twice the cutoff: the 2 MS/s filter is short and its transition wide
+        # polyphase: z[n] = sum_j rows[n - j] @ weights[j], rows of decimation input samples
+        d = self.decimation
+        bandpass = band_pass(offsets, 2 * cutoff, sample_rate, taps_per_phase * d)
+        self.weights = np.stack([bandpass[:, j * d:(j + 1) * d][:, ::-1].T
+                                 for j in range(taps_per_phase)]).astype(np.complex64)
+        # channel filter at the channel rate, where a sharp filter is cheap
+        self.channel_filter = band_pass(offsets, cutoff, self.channel_rate, channel_taps).astype(np.complex64)
+        self.filter_history = np.zeros((len(channels), channel_taps - 1), dtype=np.complex64)
+        # rotation per channel sample that takes the discriminator from the band-pass to baseband
+        self.rotation = np.exp(-2j * np.pi * offsets * d / sample_rate).astype(np.complex64)
+
+        self.phases = phases
+        self.max_bits = max_bits
+        self.sync_threshold = sync_threshold
+        levels = nrzi_levels(sync_bits) * 2.0 - 1.0
+        self.sync_levels = levels.astype(np.float32)
+        self.sync_template = (levels - levels.mean()).astype(np.float32)
+        self.smooth = max(int(round(0.75 * self.sps)), 1)
+        self.guard = int(np.ceil(2 * self.sps)) + self.smooth
+        self.history_samples = self.guard + int(np.ceil((max_bits + 48) * self.sps))
+
+        self.rows = np.zeros((taps_per_phase - 1, d), dtype=np.complex64)     # last input rows of the filter
+        self.pending = np.zeros(0, dtype=np.complex64)                          # input samples of a partial row
+        self.last = np.zeros(len(channels), dtype=np.complex64)                # last filtered sample per channel
+        self.frequency = np.zeros((len(channels), 0), dtype=np.float32)        # discriminator history
+        self.end = 0                            # channel samples processed (absolute index of the buffer end)
+        self.emitted_until = 0                  # frames ending before this channel sample are reported
+        self.recent = {}                        # (channel, payload) -> end of the last report, across phases
+        self.decoded = {name: [] for name in self.names}    # (first, last) channel sample of the frames found
+        self.sequence = 0
+        self.samples = 0
+        self.frames = 0
+        self.crc_errors = 0
+        self.channel_frames = dict.fromkeys(self.names, 0)
+
+    def process(self, samples):
+        """
+        :param samples: block of IQ samples, complex or raw uint8 interleaved I/Q (rtl_sdr .cu8)
+        :return: list of !AIVDM sentences as bytes
+        """
+        samples = to_complex(samples)
+        self.samples += len(samples)
+        if len(self.pending):
+            samples = np.concatenate([self.pending, samples])
+        d = self.decimation
+        count = len(samples) // d
+        self.pending = samples[count * d:].copy()
+        if count == 0:
+            return []
+
+        rows = np.concatenate([self.rows, samples[:count * d].reshape(count, d)])
+        taps_per_phase = len(self.weights)
+        filtered = rows[taps_per_phase - 1:] @ self.weights[0]
+        for j in range(1, taps_per_phase):
+            filtered += rows[taps_per_phase - 1 - j:len(rows) - j] @ self.weights[j]
+        self.rows = rows[len(rows) - (taps_per_phase - 1):]
+        filtered = np.concatenate([self.filter_history, filtered.T], axis=1)
+        self.filter_history = filtered[:, filtered.shape[1] - self.filter_history.shape[1]:]
+        filtered = np.stack([np.convolve(signal, taps, mode='valid')
+                             for signal, taps in zip(filtered, self.channel_filter)], axis=1)
+
+        # FM discriminator: phase step per channel sample
+        previous = np.concatenate([self.last[None, :], filtered[:-1]])
+        self.last = filtered[-1].copy()
+        frequency = np.angle(filtered * np.conj(previous) * self.rotation).astype(np.float32).T
+
+        self.frequency = np.concatenate([self.frequency, frequency], axis=1)
+        self.end += count
+        start = self.end - self.frequency.shape[1]
+        sentences = []
+        for channel, signal in zip(self.names, self.frequency):
+            sentences.extend(self.frames_of(channel, signal, start))
+        self.emitted_until = max(self.end - self.guard, self.emitted_until)
+        self.frequency = self.frequency[:, -self.history_samples:]
+        self.recent = {key: end for key, end in self.recent.items() if end > self.end - self.history_samples}
+        self.decoded = {name: [(first, last) for first, last in frames if last > self.end - self.history_samples]
+                        for name, frames in self.decoded.items()}
+        return sentences
+
+    def frames_of(self, channel, signal, start):
+        """
+        :param channel: 'A' or 'B'
+        :param signal: discriminator output of the channel
+        :param start: absolute index of the first sample of signal
+        :return: list of !AIVDM sentences of the frames that end in this block
+        """
+        signal = moving_average(signal, self.smooth)
+        offsets = np.arange(self.phases) * self.sps / self.phases
+        symbols = int((len(signal) - 2 - offsets[-1]) // self.sps) + 1
+        n = len(self.sync_template)
+        if symbols < n + 2:
+            return []
+        times = offsets[:, None] + np.arange(symbols)[None, :] * self.sps
+        index = times.astype(np.intp)
+        fraction = (times - index).astype(np.float32)
+        values = signal[index] * (1 - fraction) + signal[index + 1] * fraction
+
+        # correlation coefficient of every window of n symbols with the levels of training sequence and start flag
+        windows = sliding_window_view(values, n, axis=1)
+        correlation = windows @ self.sync_template
+        total = np.cumsum(np.pad(values, ((0, 0), (1, 0))), axis=1, dtype=np.float64)
+        squares = np.cumsum(np.pad(values.astype(np.float64) ** 2, ((0, 0), (1, 0))), axis=1)
+        variance = (squares[:, n:] - squares[:, :-n]) - (total[:, n:] - total[:, :-n]) ** 2 / n
+        energy = self.sync_template @ self.sync_template
+        score = np.abs(correlation) / np.sqrt(np.maximum(variance, 1e-12) * energy)
+        # local maxima over +-3 symbols above the threshold
+        padded = np.pad(score, ((0, 0), (3, 3)))
+        peaks = score
+        for shift in (0, 1, 2, 4, 5, 6):
+            peaks = np.maximum(peaks, padded[:, shift:shift + score.shape[1]])
+        rows, columns = np.nonzero((score > self.sync_threshold) & (score >= peaks))
+
+        # frequency offset: least squares fit of offset + amplitude * levels to the window of every candidate
+        amplitude = correlation[rows, columns] / energy
+        offset = (total[rows, columns + n] - total[rows, columns]) / n - amplitude * self.sync_levels.mean()
+        # start flag sliced at that offset, and not within a frame found before
+        flag_levels = values[rows[:, None], columns[:, None] + np.arange(n - 1 - len(flag), n)] > offset[:, None]
+        found = (flag_levels[:, 1:] == flag_levels[:, :-1]).astype(np.uint8)
+        candidate_start = start + offsets[rows] + columns * self.sps
+        valid = (found == flag).all(axis=1)
+        for first, last in self.decoded[channel]:
+            valid &= (candidate_start < first) | (candidate_start >= last)
+        valid = np.flatnonzero(valid)
+
+        sentences = []
+        for candidate in valid[np.argsort(-score[rows[valid], columns[valid]], kind='stable')]:
+            phase, position = rows[candidate], columns[candidate]
+            if any(first <= candidate_start[candidate] < last for first, last in self.decoded[channel]):
+                continue
+            levels = values[phase, position:position + n + self.max_bits + len(flag)] > offset[candidate]
+            bits = (levels[1:] == levels[:-1]).astype(np.uint8)      # NRZI: no change = 1
+            data_start = n - 1
+            ends = pattern_positions(bits[None, data_start + 56:], flag)[1] + data_start + 56
+            for end in ends[:4]:
+                # last bit of the end flag
+                frame_end = start + offsets[phase] + (position + end + len(flag)) * self.sps
+                if not self.emitted_until <= frame_end < self.end - self.guard:
+                    break
+                message = self.check_frame(bits[data_start:end])
+                if message is None:
+                    continue
+                # other phases and positions of this packet are skipped, in this block and the next ones
+                self.decoded[channel].append((candidate_start[candidate] - 4 * self.sps, frame_end))
+                key = (channel, message.tobytes())
+                if frame_end - self.recent.get(key, -np.inf) > 8 * self.sps:
+                    payload, fill_bits = bits_to_payload(message)
+                    sentences.append((frame_end, nmea_sentences(payload, fill_bits, channel, self.sequence)))
+                    self.sequence = (self.sequence + 1) % 10
+                    self.frames += 1
+                    self.channel_frames[channel] += 1
+                self.recent[key] = frame_end
+                break
+        return [sentence for _, fragments in sorted(sentences, key=lambda item: item[0]) for sentence in fragments]
+
+    def check_frame(self, bits):
+        """
+        :param bits: bits between start and end flag
+        :return: message bits if the frame has a valid FCS, otherwise None
+        """
+        data = destuff(bits)
+        if data is None or len(data) % 8 or len(data) < 56:
+            return None
+        if binascii.crc_hqx(np.packbits(data).tobytes(), 0xFFFF) != crc_residue:
+            self.crc_errors += 1
+            return None
+        return data[:-16].reshape(-1, 8)[:, ::-1].ravel()           # bytes are sent LSB first
+
+    def counters(self):
+        return {'samples': self.samples, 'frames': self.frames, 'crc_errors': self.crc_errors,
+                'channels': dict(self.channel_frames)}
+
+
+def band_pass(offsets, cutoff, sample_rate, taps):
+    """
+    :param offsets: center frequencies in Hz
+    :return: complex FIR taps (offsets x taps): Hamming windowed low-pass shifted to the offsets
+    """
+    k = np.arange(taps) - (taps - 1) / 2
+    lowpass = np.sinc(2 * cutoff / sample_rate * k) * np.hamming(taps)
+    lowpass /= lowpass.sum()
+    return lowpass[None, :] * np.exp(2j * np.pi * np.asarray(offsets)[:, None] * np.arange(taps)[None, :] / sample_rate)
+
+
+def to_complex(samples):
+    """
+    :param samples: complex IQ samples or raw uint8 interleaved I/Q (rtl_sdr .cu8)
+    :return: complex64 array
+    """
+    samples = np.asarray(samples)
+    if samples.dtype == np.uint8:
+        samples = samples[:len(samples) // 2 * 2].astype(np.float32)
+        samples -= 127.5
+        samples *= 1 / 127.5
+        return samples.view(np.complex64)
+    return samples.astype(np.complex64, copy=False)
+
+
+def frame_bits(message):
+    """
+    :param message: message bits (uint8 array), padded to whole bytes
+    :return: NRZI symbols (0/1) of the HDLC frame on air: training sequence, start flag, stuffed data and FCS, end flag
+    """
+    message = np.concatenate([message, np.zeros(-len(message) % 8, dtype=np.uint8)])
+    octets = np.packbits(message).tobytes()
+    fcs = crc_x25(octets)
+    data = np.unpackbits(np.frombuffer(octets + bytes((fcs & 0xFF, fcs >> 8)), dtype=np.uint8), bitorder='little')
+    bits = np.concatenate([np.tile(np.array((0, 1), dtype=np.uint8), 12), np.array(flag, dtype=np.uint8), stuff(data),
+                           np.array(flag, dtype=np.uint8), np.zeros(8, dtype=np.uint8)])
+    levels = np.cumsum(bits == 0) % 2                                # NRZI: 0 = change
+    return levels.astype(np.uint8)
+
+
+def modulate(levels, sample_rate, offset, bt=0.4):
+    """
+    :param levels: NRZI symbols of a frame
+    :param sample_rate: IQ samples per second
+    :param offset: channel frequency relative to the tuning frequency in Hz
+    :param bt: bandwidth-time product of the Gaussian filter
+    :return: complex64 GMSK signal of the frame (modulation index 0.5)
+    """
+    sps = sample_rate / baud_rate
+    count = int(len(levels) * sps)
+    nrz = np.where(levels[(np.arange(count) / sps).astype(np.intp)] == 1, 1.0, -1.0)
+    sigma = np.sqrt(np.log(2)) / (2 * np.pi * bt) * sps
+    t = np.arange(-int(2 * sps), int(2 * sps) + 1)
+    gaussian = np.exp(-t ** 2 / (2 * sigma ** 2))
+    frequency = np.convolve(nrz, gaussian / gaussian.sum(), mode='same') * baud_rate / 4 + offset
+    phase = 2 * np.pi * np.cumsum(frequency) / sample_rate
+    return np.exp(1j * phase).astype(np.complex64)
+
+
+def synthesize(sentences, sample_rate=2.048e6, center_freq=162.0e6, snr_db=20.0, gap=0.01, seed=0,
+               frequency_error=0.0):
+    """
+    :param sentences: single-fragment !AIVDM sentences (str or bytes) to transmit, alternating on channel A and B
+    :param snr_db: signal to noise ratio in the channel bandwidth (25 kHz)
+    :param gap: seconds of noise between packets
+    :param frequency_error: frequency error of the receiver in Hz (e.g., 500 Hz = 3 ppm at 162 MHz)
+    :return: complex64 IQ samples
+    """
+    rng = np.random.default_rng(seed)
+    parts = []
+    for i, sentence in enumerate(sentences):
+        if isinstance(sentence, bytes):
+            sentence = sentence.decode('ascii')
+        fields = sentence.split('*')[0].split(',')
+        levels = frame_bits(payload_to_bits(fields[5], int(fields[6])))
+        offset = channels[i % len(channels)][1] - center_freq + frequency_error
+        parts.append(np.zeros(int(gap * sample_rate), dtype=np.complex64))
+        parts.append(modulate(levels, sample_rate, offset))
+    parts.append(np.zeros(int(gap * sample_rate), dtype=np.complex64))
+    signal = np.concatenate(parts) * 0.5
+    noise_power = 0.25 / 10 ** (snr_db / 10) * sample_rate / 25e3
+    noise = rng.normal(scale=np.sqrt(noise_power / 2), size=(len(signal), 2)).astype(np.float32).view(np.complex64)
+    samples = signal + noise[:, 0]
+    return samples * np.float32(0.3 / np.sqrt(np.mean(np.abs(samples) ** 2)))     # within [-1, 1] for .cu8
+
+
+def to_cu8(samples):
+    """
+    :return: uint8 interleaved I/Q (rtl_sdr format) of complex samples in [-1, 1]
+    """
+    interleaved = np.asarray(samples, dtype=np.complex64).view(np.float32)
+    return np.clip(np.round(interleaved * 127.5 + 127.5), 0, 255).astype(np.uint8)
+
+
+def iq_blocks(path, block_size=256 * 1024):
+    """
+    :param path: IQ file, .cu8 (rtl_sdr uint8 I/Q) or .cf32/.cfile (complex64)
+    :param block_size: IQ samples per block
+    :return: iterator of sample blocks (uint8 I/Q or complex64)
+    """
+    raw = path.endswith('.cu8') or path.endswith('.bin')
+    item = 2 if raw else 8
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(block_size * item)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype=np.uint8 if raw else np.complex64)
+
+
+if __name__ == "__main__":
+
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Demodulate AIS packets of an IQ file (.cu8 or .cf32)")
+    parser.add_argument("file", help="IQ file")
+    parser.add_argument("-s", "--sample-rate", type=float, default=2.048e6, help="IQ samples per second")
+    parser.add_argument("-f", "--center-freq", type=float, default=162.0e6, help="tuning frequency in Hz")
+    parser.add_argument("--synthesize", action="store_true",
+                        help="write a test file of the single-fragment sentences in benchmark_corpus.nmea instead")
+    parser.add_argument("-n", type=int, default=200, help="number of sentences with --synthesize")
+    parser.add_argument("--snr", type=float, default=20.0, help="signal to noise ratio in dB with --synthesize")
+
+    args = parser.parse_args()
+
+    if args.synthesize:
+        with open('benchmark_corpus.nmea', 'rb') as f:
+            corpus = [line.strip() for line in f if line.startswith(b'!AIVDM,1,1,') and valid_sentence(line.strip())]
+        corpus = corpus[:args.n]
+        samples = synthesize(corpus, args.sample_rate, args.center_freq, args.snr)
+        data = to_cu8(samples) if args.file.endswith('.cu8') else samples
+        data.tofile(args.file)
+        print(f'{len(corpus)} sentences, {len(samples) / args.sample_rate:.1f} s of IQ samples written to {args.file}')
+    else:
+        demodulator = AISDemodulator(args.sample_rate, args.center_freq)
+        elapsed = 0.0
+        for block in iq_blocks(args.file):
+            start = time.perf_counter()
+            sentences = demodulator.process(block)
+            elapsed += time.perf_counter() - start
+            for sentence in sentences:
+                print(sentence.decode('ascii'))
+        duration = demodulator.samples / args.sample_rate
+        print(f'{demodulator.counters()}; {duration:.1f} s of samples in {elapsed:.2f} s '
+              f'({duration / max(elapsed, 1e-9):.1f} x real time)')
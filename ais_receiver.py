@@ -0,0 +1,530 @@
+import errno
+import os
+import select
+import socket       # socket programming library
+import sys
+import time
+from collections import OrderedDict
+
+from ais_decoder import decode_position
+from capture import SOURCE_AIS, MAX_PAYLOAD
+
+"""
+     Receive layer for the SDRangel UDP feed.
+
+     SDRangel sends the NMEA sentences of both AIS demodulators (channel A and B) to the same UDP port.
+     Bursts are absorbed by the kernel socket buffer only, so the buffer is enlarged (SO_RCVBUF) and every
+     wakeup drains the pending datagrams (at most max_datagrams, the rest at the next wakeup, so a flood cannot
+     starve the collision tests) in non-blocking mode before anything is decoded.
+     A datagram may carry several NMEA sentences separated by line breaks.
+
+     store_sentence() decodes one sentence and stores position reports in a TargetStore. Position reports are
+     decoded by the table-driven decoder of ais_decoder.py, other message types are rejected by their first payload
+     character; pyais decodes what that decoder leaves (e.g., multi-fragment sentences). pyais is imported on the
+     first such sentence, since importing it takes a while (e.g., on a Raspberry Pi).
+
+     On Linux the kernel drop counter of the socket is read from /proc/net/udp, so datagrams dropped because
+     the socket buffer was full are counted instead of getting lost silently.
+
+     Several feeds (UDPReceiver, TCPReceiver for network AIS feeds) are merged by FeedMerger. The same report
+     often arrives more than once (both SDRangel channels, a second receiver, a network feed), so sentences seen
+     within a short window are dropped by DuplicateFilter before they are decoded.
+"""
+
+
+supported_msg_types = (1, 2, 3, 18, 19)     # AIS message types that are position reports
+# connect_ex() results of a non-blocking connection attempt that is still in progress (WSAEWOULDBLOCK on Windows)
+connect_in_progress = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, getattr(errno, 'WSAEWOULDBLOCK', 10035))
+
+
+def store_sentence(targets, data, timestamp=None):
+    """
+    :param targets: TargetStore
+    :param data: one NMEA AIS sentence (!AIVDM/!AIVDO) as bytes
+    :param timestamp: receive time in seconds since the epoch, now if None
+    :return: mmsi of the updated vessel or None if the message is not a supported position report
+
+    Raises pyais exceptions for invalid NMEA messages.
+    """
+    return store_decoded(targets, decode_sentence(data), timestamp)
+
+
+def decode_sentence(data):
+    """
+    :param data: one NMEA AIS sentence (!AIVDM/!AIVDO) as bytes
+    :return: decoded message with the attributes msg_type, mmsi, lat, lon, speed, course, heading, accuracy and
+             turn for position reports (only msg_type for other message types)
+
+    Single-fragment sentences are decoded by ais_decoder.decode_position, everything else by pyais.
+    Raises pyais exceptions for invalid NMEA messages.
+    """
+    decoded = decode_position(data)
+    if decoded is not None:
+        return decoded
+
+    from pyais import decode        # https://pypi.org/project/pyais/, imported on first use
+
+    msg = data.decode(encoding='latin1').replace("\n", "").replace("\r", "")
+    return decode(msg)              # pyais decode message function
+
+
+def store_decoded(targets, decoded, timestamp=None):
+    """
+    :param targets: TargetStore
+    :param decoded: decoded pyais message
+    :param timestamp: receive time in seconds since the epoch, now if None
+    :return: mmsi of the updated vessel or None if the message is not a supported position report
+    """
+    if decoded.msg_type in supported_msg_types:
+        # print('Position report class A or class B')
+        # use the Maritime Mobile Service Identity (MMSI) number of the vessel or base station as key
+        targets.upsert(decoded.mmsi, decoded.lat, decoded.lon, decoded.speed, decoded.course,
+                       decoded.heading, decoded.accuracy, time.time() if timestamp is None else timestamp,
+                       decoded.msg_type, getattr(decoded, 'turn', -128))     # class B reports have no rate of turn
+        return decoded.mmsi
+    return None
+
+
+def split_sentences(data):
+    """
+    :param data: datagram as bytes
+    :return: list of NMEA sentences (bytes without line breaks)
+    """
+    return [line.strip() for line in data.splitlines() if line.strip()]
+
+
+def sentence_key(sentence):
+    """
+    :param sentence: NMEA AIS sentence as bytes, e.g., b'!AIVDM,1,1,,A,13u?etPv2;0n:dDPwUM1U1Cb069D,0*24'
+    :return: hash of fragment count, fragment number, payload and fill bits
+
+    Talker, sequential message id, radio channel and checksum are left out, so the same report received
+    on channel A and B or by another receiver has the same key.
+    """
+    fields = sentence.split(b',')
+    if len(fields) < 7:
+        return hash(sentence)
+    return hash((fields[1], fields[2], fields[5], fields[6][:1]))
+
+
+class DuplicateFilter:
+    """
+        Bounded seen-set of sentence keys with time-based eviction.
+        E.g., dedup = DuplicateFilter(window=2.0); if not dedup.is_duplicate(sentence): decode(sentence)
+    """
+    def __init__(self, window=2.0, max_size=65536):
+        """
+        :param window: seconds in which a repeated sentence is a duplicate
+        :param max_size: maximum number of keys, the oldest keys are evicted first
+        """
+        self.window = window
+        self.max_size = max_size
+        self.seen = OrderedDict()      # key -> time first seen, oldest first
+
+    def __len__(self):
+        return len(self.seen)
+
+    def is_duplicate(self, sentence, now=None):
+        """
+        :param sentence: NMEA AIS sentence as bytes
+        :param now: receive time in seconds, time.monotonic() if None (must not go backwards)
+        :return: True if the same sentence was seen within window seconds
+        """
+        if now is None:
+            now = time.monotonic()
+        self.evict(now)
+
+        key = sentence_key(sentence)
+        if key in self.seen:
+            return True
+        self.seen[key] = now
+        if len(self.seen) > self.max_size:
+            self.seen.popitem(last=False)
+        return False
+
+    def evict(self, now):
+        seen = self.seen
+        while seen:
+            key, first_seen = next(iter(seen.items()))
+            if now - first_seen <= self.window:
+                break
+            del seen[key]
+
+
+class UDPReceiver:
+    """
+        Non-blocking UDP receiver with counters.
+        E.g., receiver = UDPReceiver(sock); sentences = receiver.receive(timeout=1.0)
+        Counters: datagrams, sentences, bytes, wakeups and kernel drops (None if the platform can't tell)
+    """
+    def __init__(self, sock, rcvbuf=4 * 1024 * 1024, bufsize=4096, recorder=None, name=None, max_datagrams=1024):
+        """
+        :param sock: bound UDP socket
+        :param rcvbuf: requested kernel receive buffer in bytes (Linux caps it at net.core.rmem_max)
+        :param bufsize: maximum datagram size in bytes
+        :param recorder: optional capture.CaptureWriter, every datagram is recorded
+        :param name: name of the feed in counters, 'udp:<address>:<port>' if None
+        :param max_datagrams: datagrams read per wakeup at most, the rest stays in the socket buffer
+        """
+        self.sock = sock
+        self.name = name or 'udp:{}:{}'.format(*sock.getsockname()[:2])
+        self.bufsize = bufsize
+        self.max_datagrams = max_datagrams
+        self.recorder = recorder
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        except OSError as e:
+            print('Could not set socket receive buffer: {}'.format(e))
+        self.rcvbuf = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        self.sock.setblocking(False)
+
+        self.inode = os.fstat(self.sock.fileno()).st_ino     # to find the socket in /proc/net/udp
+
+        self.datagrams = 0
+        self.sentences = 0
+        self.bytes = 0
+        self.wakeups = 0
+
+    def handle(self, data):
+        """
+        :param data: received datagram
+        :return: list of NMEA sentences of the datagram
+
+        Counts the datagram. Also used for datagrams that are received elsewhere (e.g., asyncio protocol).
+        """
+        if self.recorder is not None:
+            self.recorder.write(SOURCE_AIS, data)
+        sentences = split_sentences(data)
+        self.datagrams += 1
+        self.bytes += len(data)
+        self.sentences += len(sentences)
+        return sentences
+
+    def drain(self):
+        """
+        :return: list of NMEA sentences of the datagrams pending in the socket buffer, at most max_datagrams;
+                 the socket stays readable if more are pending, so the next wakeup continues right away
+        """
+        sentences = []
+        for _ in range(self.max_datagrams):
+            try:
+                data, address = self.sock.recvfrom(self.bufsize)
+            except (BlockingIOError, InterruptedError):
+                break
+            sentences.extend(self.handle(data))
+        return sentences
+
+    def wait(self, timeout):
+        """
+        :param timeout: seconds to wait, None waits forever
+        :return: True if there is data to read
+        """
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        return bool(readable)
+
+    def receive(self, timeout):
+        """
+        :param timeout: seconds to wait for the first datagram, None waits forever
+        :return: list of NMEA sentences, empty if nothing arrived within timeout
+        """
+        if not self.wait(timeout):
+            return []
+        self.wakeups += 1
+        return self.drain()
+
+    def kernel_drops(self):
+        """
+        :return: datagrams dropped by the kernel since the socket was opened, None if the platform can't tell
+        """
+        if not sys.platform.startswith('linux'):
+            return None
+        for path in ('/proc/net/udp', '/proc/net/udp6'):
+            try:
+                with open(path) as f:
+                    next(f)                             # header
+                    for line in f:
+                        fields = line.split()
+                        # columns: sl local_address rem_address st tx_queue:rx_queue tr:tm->when retrnsmt uid
+                        #          timeout inode ref pointer drops
+                        if int(fields[9]) == self.inode:
+                            return int(fields[12])
+            except (OSError, IndexError, ValueError):
+                continue
+        return None
+
+    def counters(self):
+        return {'datagrams': self.datagrams, 'sentences': self.sentences, 'bytes': self.bytes,
+                'wakeups': self.wakeups, 'kernel_drops': self.kernel_drops(), 'rcvbuf': self.rcvbuf}
+
+
+class TCPReceiver:
+    """
+        Client of a network AIS feed that sends NMEA sentences over TCP (e.g., AIS-catcher, rtl-ais or an AIS
+        sharing service). Connecting and reading never block: a connection attempt is started by connect() and completed
+        by finish_connect() when the socket becomes writable, and reopened reconnect_after seconds after it was lost.
+        E.g., receiver = TCPReceiver(('192.168.1.10', 10110)); sentences = receiver.receive(timeout=1.0)
+    """
+    def __init__(self, address, bufsize=65536, reconnect_after=5.0, connect_timeout=5.0, recorder=None, name=None):
+        """
+        :param address: (host, port) of the feed
+        :param bufsize: bytes per read
+        :param reconnect_after: seconds to wait before the next connection attempt
+        :param connect_timeout: seconds to wait for a connection
+        :param recorder: optional capture.CaptureWriter, every complete sentence is recorded as a record of its own
+        :param name: name of the feed in counters, 'tcp:<host>:<port>' if None
+        """
+        self.address = tuple(address)
+        self.bufsize = bufsize
+        self.reconnect_after = reconnect_after
+        self.connect_timeout = connect_timeout
+        self.recorder = recorder
+        self.name = name or 'tcp:{}:{}'.format(*self.address)
+        self.sock = None
+        self.connecting = None          # socket of a connection attempt in progress
+        self.connect_started = 0.0
+        self.buffer = b''               # incomplete last line of the previous read
+        self.next_connect = 0.0
+
+        self.reads = 0
+        self.sentences = 0
+        self.bytes = 0
+        self.wakeups = 0
+        self.connects = 0
+        self.disconnects = 0
+
+    def connect(self):
+        """
+        :return: True if connected; starts a connection attempt if the reconnect time has come, which is completed
+                 by finish_connect() when self.connecting becomes writable
+        """
+        if self.sock is not None:
+            return True
+        now = time.monotonic()
+        if self.connecting is not None:
+            if now - self.connect_started > self.connect_timeout:
+                self.connect_failed('timed out')
+            return False
+        if now < self.next_connect:
+            return False
+        try:
+            family, kind, proto, _, address = socket.getaddrinfo(*self.address, type=socket.SOCK_STREAM)[0]
+            self.connecting = socket.socket(family, kind, proto)
+        except OSError as e:
+            self.connect_failed(e)
+            return False
+        self.connecting.setblocking(False)
+        self.connect_started = now
+        error = self.connecting.connect_ex(address)
+        if error == 0:
+            return self.finish_connect()
+        if error not in connect_in_progress:
+            self.connect_failed(os.strerror(error))
+        return False
+
+    def finish_connect(self):
+        """
+        Checks the result of the connection attempt once its socket is writable (or reported an error).
+        :return: True if connected
+        """
+        error = self.connecting.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            self.connect_failed(os.strerror(error))
+            return False
+        self.sock, self.connecting = self.connecting, None
+        self.buffer = b''
+        self.connects += 1
+        return True
+
+    def connect_failed(self, error):
+        print('Could not connect to {}: {}'.format(self.name, error))
+        if self.connecting is not None:
+            self.connecting.close()
+            self.connecting = None
+        self.next_connect = time.monotonic() + self.reconnect_after
+
+    def next_attempt(self):
+        """
+        :return: time.monotonic() of the next connection attempt or of the timeout of the attempt in progress
+        """
+        if self.connecting is not None:
+            return self.connect_started + self.connect_timeout
+        return self.next_connect
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if self.connecting is not None:
+            self.connecting.close()
+            self.connecting = None
+
+    def disconnect(self):
+        print('Connection to {} lost.'.format(self.name))
+        self.close()
+        self.disconnects += 1
+        self.next_connect = time.monotonic() + self.reconnect_after
+
+    def handle(self, data):
+        """
+        :param data: received bytes
+        :return: list of the complete NMEA sentences, an incomplete last line is kept for the next read
+        """
+        lines = (self.buffer + data).split(b'\n')
+        self.buffer = lines.pop()
+        sentences = [line.strip() for line in lines if line.strip()]
+        if self.recorder is not None and sentences:
+            # a read can hold more than a record fits, so one record per sentence; a line too long for a record
+            # is no NMEA sentence (at most 82 characters) and is not recorded
+            timestamp = time.time()
+            for sentence in sentences:
+                if len(sentence) <= MAX_PAYLOAD:
+                    self.recorder.write(SOURCE_AIS, sentence, timestamp)
+        self.reads += 1
+        self.bytes += len(data)
+        self.sentences += len(sentences)
+        return sentences
+
+    def drain(self):
+        """
+        :return: list of NMEA sentences of all data that is pending on the connection
+        """
+        sentences = []
+        while self.sock is not None:
+            try:
+                data = self.sock.recv(self.bufsize)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                print('Socket error: {}'.format(e))
+                self.disconnect()
+                break
+            if not data:
+                self.disconnect()
+                break
+            sentences.extend(self.handle(data))
+        return sentences
+
+    def wait(self, timeout):
+        """
+        :param timeout: seconds to wait, None waits forever
+        :return: True if there is data to read, False if not or not connected
+        """
+        if not self.connect():
+            wait = max(self.next_attempt() - time.monotonic(), 0)
+            wait = wait if timeout is None else min(timeout, wait)
+            if self.connecting is not None:
+                _, writable, failed = select.select([], [self.connecting], [self.connecting], wait)
+                if writable or failed:
+                    self.finish_connect()
+            elif wait:
+                time.sleep(wait)
+            return False
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        return bool(readable)
+
+    def receive(self, timeout):
+        """
+        :param timeout: seconds to wait for data, None waits forever
+        :return: list of NMEA sentences, empty if nothing arrived within timeout
+        """
+        if not self.wait(timeout):
+            return []
+        self.wakeups += 1
+        return self.drain()
+
+    def counters(self):
+        return {'reads': self.reads, 'sentences': self.sentences, 'bytes': self.bytes, 'wakeups': self.wakeups,
+                'connected': self.sock is not None, 'connects': self.connects, 'disconnects': self.disconnects}
+
+
+class FeedMerger:
+    """
+        Receives from any number of feeds (UDPReceiver, TCPReceiver) and drops duplicate sentences before decoding.
+        E.g., receiver = FeedMerger([UDPReceiver(sock), TCPReceiver(('192.168.1.10', 10110))])
+              sentences = receiver.receive(timeout=1.0)
+        Counters per feed: unique and duplicate sentences, plus the counters of the feed itself.
+    """
+    def __init__(self, feeds, window=2.0, max_seen=65536):
+        """
+        :param feeds: list of receivers with sock, name, drain(), connect() (TCP only) and counters()
+        :param window: seconds in which a repeated sentence is a duplicate, 0 = keep duplicates
+        :param max_seen: maximum number of remembered sentences
+        """
+        self.feeds = list(feeds)
+        self.dedup = DuplicateFilter(window, max_seen) if window else None
+        self.received = None            # time.perf_counter() of the last wakeup
+        self.unique_sentences = {feed.name: 0 for feed in self.feeds}
+        self.duplicates = {feed.name: 0 for feed in self.feeds}
+
+    def unique(self, feed, sentences, now=None):
+        """
+        :param feed: receiver the sentences came from
+        :param sentences: list of NMEA sentences
+        :param now: receive time in seconds, time.monotonic() if None
+        :return: list of the sentences that were not seen within the window
+        """
+        if self.dedup is None:
+            self.unique_sentences[feed.name] += len(sentences)
+            return sentences
+        if now is None:
+            now = time.monotonic()
+        unique = [sentence for sentence in sentences if not self.dedup.is_duplicate(sentence, now)]
+        self.unique_sentences[feed.name] += len(unique)
+        self.duplicates[feed.name] += len(sentences) - len(unique)
+        return unique
+
+    def receive(self, timeout):
+        """
+        :param timeout: seconds to wait for the first data, None waits forever
+        :return: list of unique NMEA sentences of all feeds, empty if nothing arrived within timeout
+        """
+        socks = {}
+        connecting = {}                 # connection attempts in progress, complete when writable
+        for feed in self.feeds:
+            if isinstance(feed, TCPReceiver):
+                feed.connect()
+                if feed.connecting is not None:
+                    connecting[feed.connecting] = feed
+            if feed.sock is not None:
+                socks[feed.sock] = feed
+
+        disconnected = [feed for feed in self.feeds if feed.sock is None]
+        if disconnected:
+            # wake up for the next connection attempt or connect timeout
+            next_attempt = min(feed.next_attempt() for feed in disconnected) - time.monotonic()
+            timeout = max(next_attempt, 0.1) if timeout is None else min(timeout, max(next_attempt, 0.1))
+        if not socks and not connecting:
+            if timeout:
+                time.sleep(timeout)
+            return []
+
+        # failed connection attempts are reported in the exceptional set on Windows
+        readable, writable, failed = select.select(list(socks), list(connecting), list(connecting), timeout)
+        self.received = time.perf_counter()
+        for sock in set(writable) | set(failed):
+            connecting[sock].finish_connect()
+        sentences = []
+        for sock in readable:
+            feed = socks[sock]
+            feed.wakeups += 1
+            sentences.extend(self.unique(feed, feed.drain()))
+        return sentences
+
+    def close(self):
+        for feed in self.feeds:
+            if isinstance(feed, TCPReceiver):
+                feed.close()
+            elif feed.sock is not None:
+                feed.sock.close()
+
+    def counters(self):
+        feeds = {}
+        for feed in self.feeds:
+            feeds[feed.name] = dict(feed.counters(), unique=self.unique_sentences[feed.name],
+                                    duplicates=self.duplicates[feed.name])
+        unique = sum(self.unique_sentences.values())
+        duplicates = sum(self.duplicates.values())
+        total = unique + duplicates
+        return {'feeds': feeds, 'unique': unique, 'duplicates': duplicates,
+                'duplicate_rate': duplicates / total if total else 0.0,
+                'seen': len(self.dedup) if self.dedup is not None else 0}
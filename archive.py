@@ -0,0 +1,194 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+
+"""
+     SQLite archive of the position reports and the cpa/tcpa results of every full collision test.
+
+     Reports and results are queued by the receive loop and written by a background thread in one transaction per
+     batch, so a slow disk never blocks the ingest. The database is in WAL mode, so it can be queried (e.g., with the
+     sqlite3 shell) while it is written.
+
+     Tables (times in seconds since the epoch):
+          positions: time, mmsi, lat, lon, speed, course, heading, accuracy, msg_type, turn
+          cpa:       time, mmsi, cpa (Nm), tcpa (min), collision, own_lat, own_lon, own_speed, own_heading
+     Both tables are indexed by mmsi and time, e.g., all vessels that came closer than 0.2 Nm in the last 24 hours:
+          python archive.py run.db --hours 24 --cpa 0.2
+"""
+
+schema = """
+CREATE TABLE IF NOT EXISTS positions (time REAL NOT NULL, mmsi INTEGER NOT NULL, lat REAL, lon REAL, speed REAL,
+                                      course REAL, heading REAL, accuracy INTEGER, msg_type INTEGER, turn REAL);
+CREATE INDEX IF NOT EXISTS positions_mmsi_time ON positions (mmsi, time);
+CREATE INDEX IF NOT EXISTS positions_time ON positions (time);
+CREATE TABLE IF NOT EXISTS cpa (time REAL NOT NULL, mmsi INTEGER NOT NULL, cpa REAL, tcpa REAL, collision INTEGER,
+                                own_lat REAL, own_lon REAL, own_speed REAL, own_heading REAL);
+CREATE INDEX IF NOT EXISTS cpa_mmsi_time ON cpa (mmsi, time);
+CREATE INDEX IF NOT EXISTS cpa_time ON cpa (time);
+"""
+
+
+def connect(path):
+    """
+    :return: sqlite3 connection in WAL mode with the archive tables
+    """
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')     # WAL: a crash may lose the last batches, never corrupts
+    connection.executescript(schema)
+    return connection
+
+
+class Archive(threading.Thread):
+    """
+        Background writer of the archive database.
+        E.g., archive = Archive('run.db'); archive.start(); archive.position(targets, mmsi);
+              archive.sweep(time.time(), own_ship, all_cpa); ...; archive.close()
+    """
+    def __init__(self, path, flush_interval=1.0, batch_size=5000, max_pending=1000000):
+        """
+        :param path: database file, created if needed
+        :param flush_interval: seconds between writes of the queued rows
+        :param batch_size: queued rows that wake up the writer before flush_interval
+        :param max_pending: queued rows beyond which new rows are dropped (e.g., disk full), 0 = no limit
+        """
+        super().__init__(name='Archive', daemon=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        connect(path).close()       # create the tables now, so errors show up at start
+        self.positions = deque()
+        self.results = deque()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def pending(self):
+        return len(self.positions) + len(self.results)
+
+    def queue(self, rows, row):
+        if self.max_pending and self.pending() >= self.max_pending:
+            self.dropped += 1
+            return
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.wakeup.set()
+
+    def position(self, targets, mmsi):
+        """
+        Queues the position report of a vessel.
+        :param targets: TargetStore
+        :param mmsi: vessel with a new position report
+        """
+        row = targets.rows[mmsi]
+        self.queue(self.positions, (float(targets.timestamp[row]), mmsi, float(targets.lat[row]),
+                                    float(targets.lon[row]), float(targets.speed[row]), float(targets.course[row]),
+                                    float(targets.heading[row]), int(targets.accuracy[row]),
+                                    int(targets.msg_type[row]), float(targets.turn[row])))
+
+    def sweep(self, timestamp, objectA, all_cpa):
+        """
+        Queues the results of a full collision test.
+        :param timestamp: time of the collision test in seconds
+        :param objectA: own ship as arpaocalc Ship instance
+        :param all_cpa: dataframe of collision_sweep
+        """
+        if len(all_cpa.index) == 0:
+            return
+        own_ship = (float(objectA.position[0]), float(objectA.position[1]), float(objectA.speed),
+                    float(objectA.heading))
+        for mmsi, cpa, tcpa, collision in zip(all_cpa.index.tolist(), all_cpa['cpa (Nm)'].tolist(),
+                                              all_cpa['tcpa (min)'].tolist(), all_cpa['collision'].tolist()):
+            self.queue(self.results, (timestamp, mmsi, cpa, tcpa, int(collision)) + own_ship)
+
+    def run(self):
+        connection = connect(self.path)
+        try:
+            while not self.stop_event.is_set():
+                self.wakeup.wait(self.flush_interval)
+                self.wakeup.clear()
+                self.write(connection)
+            self.write(connection)
+        finally:
+            connection.close()
+
+    def write(self, connection):
+        positions = drain(self.positions)
+        results = drain(self.results)
+        if not positions and not results:
+            return
+        try:
+            with connection:        # one transaction per batch
+                connection.executemany('INSERT INTO positions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', positions)
+                connection.executemany('INSERT INTO cpa VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', results)
+        except sqlite3.Error as e:
+            print('Archive error: {}'.format(e))
+            self.dropped += len(positions) + len(results)
+            return
+        self.written += len(positions) + len(results)
+        self.batches += 1
+
+    def close(self):
+        """
+        Writes the queued rows and stops the writer.
+        """
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.is_alive():
+            self.join()
+
+    def counters(self):
+        return {'written': self.written, 'batches': self.batches, 'pending': self.pending(), 'dropped': self.dropped}
+
+
+def drain(rows):
+    """
+    :return: list of the rows taken from the left of the deque (appended by other threads meanwhile stay queued)
+    """
+    batch = []
+    for _ in range(len(rows)):
+        batch.append(rows.popleft())
+    return batch
+
+
+def near_misses(path, since, max_cpa=None):
+    """
+    :param path: archive database
+    :param since: start time in seconds since the epoch
+    :param max_cpa: cpa in nautical miles, None = results with collision warning
+    :return: list of (mmsi, closest cpa, tcpa at the closest cpa, time of the closest cpa, number of results)
+
+    cpa is stored signed (negative: closest point astern), so distances are compared by ABS(cpa).
+    """
+    connection = connect(path)
+    try:
+        # +mmsi: range search of the time index instead of a scan of the mmsi index for the grouping
+        condition = 'collision = 1' if max_cpa is None else 'ABS(cpa) <= ?'
+        parameters = (since,) if max_cpa is None else (since, max_cpa)
+        return connection.execute(f'SELECT mmsi, MIN(ABS(cpa)), tcpa, time, COUNT(*) FROM cpa WHERE time >= ? '
+                                  f'AND {condition} GROUP BY +mmsi ORDER BY MIN(ABS(cpa))', parameters).fetchall()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Near misses in an archive database")
+    parser.add_argument("file", help="archive database")
+    parser.add_argument("--hours", type=float, default=24, help="hours back from now")
+    parser.add_argument("--cpa", type=float, default=None,
+                        help="cpa in nautical miles, default: results with collision warning")
+
+    args = parser.parse_args()
+
+    rows = near_misses(args.file, time.time() - args.hours * 3600, args.cpa)
+    print(f'{len(rows)} vessels in the last {args.hours:g} hours')
+    for mmsi, cpa, tcpa, timestamp, count in rows:
+        print(f'  MMSI {mmsi}: cpa {cpa:.3f} Nm, tcpa {tcpa:.1f} min at '
+              f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))} ({count} results)')
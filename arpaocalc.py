@@ -22,6 +22,8 @@ import math
 from math import sin,cos,asin,acos,sqrt,atan2,radians,pi,degrees
 from numbers import Number
 
+import numpy as np
+
 
 class Ship:
     def __init__(self, position, speed, heading):
@@ -309,6 +311,379 @@ def calculate_cross_path_position(pointA, bearing1, pointB, bearing2):
     return( round(degrees(lat3),5),round(degrees(lon3),5))
 
 
+def ARPA_calculations_batch(objectA, lats, lons, speeds, headings, flat_range=None):
+
+    # Vectorized ARPA_calculations of one own ship (objectA) against many targets.
+    # Targets are given as array-likes of latitude, longitude (decimal degrees), speed (knots) and heading (degrees).
+    # Returns a dict of NumPy arrays: 'cpa' (nautical miles, negative astern), 'tcpa' (minutes)
+    # and 'sign' (+1 CPA position ahead, -1 astern the ship's beam).
+    # Follows the same branches as ARPA_calculations, results match to within float rounding.
+    #
+    # flat_range (nautical miles): targets closer than flat_range use the closed-form local tangent plane
+    # solution (calculate_cpa_flat_batch) instead of the spherical one, targets further away stay spherical.
+    # Error bound of |cpa| (not of the signed cpa), 100000 random targets at latitudes up to 70 degrees
+    # (see flat_cpa_error in benchmark.py): the 99th percentile of the difference between the flat and the
+    # spherical |cpa| is below 0.01 Nm up to 2 Nm range, 0.025 Nm up to 5 Nm and 0.05 Nm up to 10 Nm,
+    # the 99.9th percentile below 0.025, 0.05 and 0.1 Nm. It is no maximum: single targets differ by more.
+    # The sign can flip (about 0.2% of the targets, error 2 x |cpa|) where the CPA position lies near own
+    # ship's beam, e.g., a target at its closest approach now: flat -1.544 with tcpa 0.03 min, spherical
+    # +1.544 ("going away", tcpa 0). The collision flag and the near miss ranking of the archive use |cpa|,
+    # the cpa stored in the archive keeps the sign.
+    # The spherical path (like ARPA_calculations) returns about 10818 Nm for some nearly parallel tracks,
+    # those are left out of the percentiles.
+
+    if isinstance(objectA, Ship) == False:
+        raise NameError('This function is only usable with Ship instances')
+
+    latB = np.asarray(lats, dtype=float)
+    lonB = np.asarray(lons, dtype=float)
+    objectB_speed = np.asarray(speeds, dtype=float)
+    vectorB_angle = np.asarray(headings, dtype=float)
+
+    latA = float(objectA.position[0])
+    lonA = float(objectA.position[1])
+    objectA_speed = objectA.speed
+    vectorA_angle = objectA.heading
+
+    cpa = np.zeros(latB.shape)
+    tcpa = np.zeros(latB.shape)
+    signe = np.ones(latB.shape, dtype=np.int8)
+
+    if latB.size == 0:
+        return {'cpa': cpa, 'tcpa': tcpa, 'sign': signe}
+
+    distance = calculate_distance_batch(latA, lonA, latB, lonB)
+
+    #Same branches and same order as in ARPA_calculations
+    at_minimum = ((objectA_speed == objectB_speed) & (vectorA_angle == vectorB_angle)) | ((objectA_speed <= 0.001) & (objectB_speed <= 0.001))
+    same_position = ~at_minimum & (latA == latB) & (lonA == lonB)
+    moving = ~(at_minimum | same_position)
+
+    cpa[at_minimum] = np.round(distance[at_minimum], 2)
+
+    flat = np.zeros(latB.shape, dtype=bool)
+    if flat_range is not None:
+        flat = moving & (distance <= flat_range)
+
+    for idx, calculate_cpa_batch in ((np.nonzero(flat)[0], calculate_cpa_flat_batch),
+                                     (np.nonzero(moving & ~flat)[0], calculate_cpa_spherical_batch)):
+        if idx.size == 0:
+            continue
+        cpa[idx], tcpa[idx], signe[idx] = calculate_cpa_batch(latA, lonA, objectA_speed, vectorA_angle,
+                                                              latB[idx], lonB[idx], objectB_speed[idx],
+                                                              vectorB_angle[idx], distance[idx])
+
+    return {'cpa': cpa, 'tcpa': tcpa, 'sign': signe}
+
+
+def calculate_cpa_spherical_batch(latA, lonA, objectA_speed, vectorA_angle, latB, lonB, objectB_speed, vectorB_angle, distance):
+
+    #Spherical CPA of moving targets as in ARPA_calculations ("going away" and crossing branches)
+    #Returns (cpa, tcpa, sign) arrays
+
+    cpa = np.zeros(latB.shape)
+    tcpa = np.zeros(latB.shape)
+    signe = np.ones(latB.shape, dtype=np.int8)
+
+    #Calculation of relative object datas from object B to object A (see calculate_relative_vector)
+    latB2, lonB2 = calculate_future_position_batch(latB, lonB, objectB_speed, vectorB_angle)
+    latA2, lonA2 = calculate_future_position((latA, lonA), objectA_speed, vectorA_angle)
+    vectorA_angle_opp = calculate_bearing((latA2, lonA2), (latA, lonA))
+    latA3, lonA3 = calculate_future_position_batch(latB2, lonB2, objectA_speed, vectorA_angle_opp)
+
+    vectorB_angle_relativ = calculate_bearing_batch(latB, lonB, latA3, lonA3)
+    objectB_speed_relative = calculate_distance_batch(latB, lonB, latA3, lonA3)
+
+    #Check if the objects are already at their minimum CPA (see check_ship_going_away)
+    latBn, lonBn = calculate_future_position_batch(latB, lonB, 0.0001*objectB_speed_relative, vectorB_angle_relativ)
+    going_away = ~(calculate_distance_batch(latA, lonA, latBn, lonBn) < distance)
+
+    cpa[going_away] = np.round(distance[going_away], 3)
+
+    idx = np.nonzero(~going_away)[0]
+    if idx.size == 0:
+        return cpa, tcpa, signe
+
+    #Calculation of the angle of the perpendicular line to the relative vector (r_ppl_a), see calculate_cp_position
+    dlonAR = (lonB2[idx] - lonB[idx]) - (lonA2 - lonA)
+    dlatAR = (latB2[idx] - latB[idx]) - (latA2 - latA)
+
+    same_quadrant = ((dlonAR > 0) & (dlatAR > 0)) | ((dlonAR < 0) & (dlatAR < 0))
+    r_ppl_a = np.where(same_quadrant, (vectorB_angle_relativ[idx] - 90) % 360, (vectorB_angle_relativ[idx] + 90) % 360)
+
+    latcp, loncp = calculate_cross_path_position_batch(latA, lonA, r_ppl_a, latB[idx], lonB[idx], vectorB_angle_relativ[idx])
+
+    #Is the CPA position ahead or astern the ship's beam ? (see calculate_CPA_sign)
+    a = vectorA_angle - calculate_bearing_batch(latA, lonA, latcp, loncp)
+    CPA_point_relative_bearing = np.where(a > 0, 360 - a, -a)
+    signe[idx] = np.where((CPA_point_relative_bearing > 90) & (CPA_point_relative_bearing < 270), -1, 1)
+
+    cpa[idx] = np.round(calculate_distance_batch(latA, lonA, latcp, loncp) * signe[idx], 3)
+    tcpa[idx] = (calculate_distance_batch(latB[idx], lonB[idx], latcp, loncp) / objectB_speed_relative[idx])*60.0
+
+    return cpa, tcpa, signe
+
+
+def calculate_cpa_flat_batch(latA, lonA, objectA_speed, vectorA_angle, latB, lonB, objectB_speed, vectorB_angle, distance):
+
+    #Closed-form CPA of moving targets in a local east-north plane around object A
+    #Relative position p and relative velocity v of object B: tcpa = -p.v / v.v, cpa = |p + v*tcpa|
+    #Returns (cpa, tcpa, sign) arrays like calculate_cpa_spherical_batch
+
+    earth_radius = 6378.137/1.852       #nautical miles, same as calculate_distance
+
+    #Equirectangular projection with the mean latitude of both objects
+    mean_lat = np.radians((latA + latB) / 2.)
+    dlon = (np.subtract(lonB, lonA) + 180) % 360 - 180
+    px = earth_radius * np.radians(dlon) * np.cos(mean_lat)
+    py = earth_radius * np.radians(np.subtract(latB, latA))
+
+    headingA = radians(vectorA_angle)
+    headingB = np.radians(vectorB_angle)
+    vx = objectB_speed*np.sin(headingB) - objectA_speed*sin(headingA)
+    vy = objectB_speed*np.cos(headingB) - objectA_speed*cos(headingA)
+
+    closing = -(px*vx + py*vy)
+    v2 = vx*vx + vy*vy
+
+    cpa = np.round(distance, 3)                 #"going away": already at the minimum CPA
+    tcpa = np.zeros(latB.shape)
+    signe = np.ones(latB.shape, dtype=np.int8)
+
+    idx = np.nonzero((closing > 0) & (v2 > 0))[0]
+    if idx.size == 0:
+        return cpa, tcpa, signe
+
+    t = closing[idx] / v2[idx]                  #hours
+    cpx = px[idx] + vx[idx]*t
+    cpy = py[idx] + vy[idx]*t
+
+    #CPA position astern the ship's beam if it is behind the perpendicular to the heading of object A
+    signe[idx] = np.where(cpx*sin(headingA) + cpy*cos(headingA) < 0, -1, 1)
+
+    cpa[idx] = np.round(np.hypot(cpx, cpy) * signe[idx], 3)
+    tcpa[idx] = t*60.0
+
+    return cpa, tcpa, signe
+
+
+def calculate_cpa_pairs_batch(latA, lonA, objectA_speed, vectorA_angle, latB, lonB, objectB_speed, vectorB_angle, horizon=None):
+
+    #Closed-form CPA of many pairs of objects (element by element, e.g., target to target) in a local east-north plane
+    #around each pair, same projection as calculate_cpa_flat_batch. No own ship: the CPA is not signed.
+    #horizon (minutes): the closest approach within the next horizon minutes, the CPA at the horizon if later
+    #Returns (cpa, tcpa) arrays, "going away" pairs have their current distance and tcpa 0
+
+    earth_radius = 6378.137/1.852       #nautical miles, same as calculate_distance
+
+    mean_lat = np.radians((np.asarray(latA) + np.asarray(latB)) / 2.)
+    dlon = (np.subtract(lonB, lonA) + 180) % 360 - 180
+    px = earth_radius * np.radians(dlon) * np.cos(mean_lat)
+    py = earth_radius * np.radians(np.subtract(latB, latA))
+
+    headingA = np.radians(vectorA_angle)
+    headingB = np.radians(vectorB_angle)
+    vx = objectB_speed*np.sin(headingB) - objectA_speed*np.sin(headingA)
+    vy = objectB_speed*np.cos(headingB) - objectA_speed*np.cos(headingA)
+
+    closing = -(px*vx + py*vy)
+    v2 = vx*vx + vy*vy
+
+    t = np.zeros(px.shape)              #hours
+    idx = (closing > 0) & (v2 > 0)
+    t[idx] = closing[idx] / v2[idx]
+    if horizon is not None:
+        t = np.minimum(t, horizon/60.0)
+
+    cpa = np.round(np.hypot(px + vx*t, py + vy*t), 3)
+    return cpa, t*60.0
+
+
+def ARPA_calculations_curved_batch(objectA, lats, lons, speeds, headings, turns, horizon=30.0, step=0.5):
+
+    # Curved-path CPA of one own ship (objectA, straight course) against many targets that turn at a constant
+    # rate of turn (degrees per minute, AIS 'turn' field, see turn_rate_batch).
+    # Every target path is predicted over horizon minutes in steps of step minutes in a local east-north plane
+    # around objectA (one array of targets x time steps), the CPA is the minimum separation. The minimum is refined
+    # with a parabola through the squared distances of the neighbouring steps (exact for straight paths).
+    # A CPA beyond horizon is reported at horizon.
+    # Returns a dict of NumPy arrays like ARPA_calculations_batch: 'cpa' (nautical miles, negative astern),
+    # 'tcpa' (minutes) and 'sign' (+1 CPA position ahead, -1 astern the ship's beam).
+
+    if isinstance(objectA, Ship) == False:
+        raise NameError('This function is only usable with Ship instances')
+
+    latB = np.asarray(lats, dtype=float)
+    lonB = np.asarray(lons, dtype=float)
+    objectB_speed = np.asarray(speeds, dtype=float) / 60.0             #nautical miles per minute
+    headingB = np.radians(np.asarray(headings, dtype=float))
+    turnB = np.radians(turn_rate_batch(turns))                          #radians per minute
+
+    latA = float(objectA.position[0])
+    lonA = float(objectA.position[1])
+    objectA_speed = objectA.speed / 60.0
+    headingA = radians(objectA.heading)
+
+    earth_radius = 6378.137/1.852       #nautical miles, same as calculate_distance
+    dlon = (lonB - lonA + 180) % 360 - 180
+    px = earth_radius * np.radians(dlon) * cos(radians(latA))
+    py = earth_radius * np.radians(latB - latA)
+
+    t = np.arange(0.0, horizon + step / 2, step)                        #minutes, time steps
+    w = turnB[:, None]
+    angle = headingB[:, None] + w*t
+    straight = np.abs(w) < 1e-9
+    safe_w = np.where(straight, 1.0, w)
+    speedB = objectB_speed[:, None]
+
+    #position of B relative to the start position of A: arc for turning targets, line for the others
+    bx = px[:, None] + np.where(straight, speedB*t*np.sin(headingB[:, None]),
+                                speedB/safe_w*(np.cos(headingB[:, None]) - np.cos(angle)))
+    by = py[:, None] + np.where(straight, speedB*t*np.cos(headingB[:, None]),
+                                speedB/safe_w*(np.sin(angle) - np.sin(headingB[:, None])))
+    dx = bx - objectA_speed*t*sin(headingA)
+    dy = by - objectA_speed*t*cos(headingA)
+    d2 = dx*dx + dy*dy
+
+    rows = np.arange(latB.size)
+    i = np.argmin(d2, axis=1)
+    tcpa = t[i]
+    cpa2 = d2[rows, i]
+    cpx = dx[rows, i]
+    cpy = dy[rows, i]
+
+    #parabola through the squared distances of the steps around the minimum (the first or last three steps if the
+    #minimum is at the start or end), kept where it is below the minimum of the steps
+    if t.size >= 3:
+        k = np.clip(i, 1, t.size - 2)
+        a = d2[rows, k - 1]
+        b = d2[rows, k]
+        c = d2[rows, k + 1]
+        curvature = a - 2*b + c
+        u = np.where(curvature > 0, (a - c) / (2*np.where(curvature > 0, curvature, 1.0)), 0.0)
+        u = np.clip(u, -1.0, 1.0)
+        refined2 = b - (a - c)*u/4
+        better = (curvature > 0) & (refined2 < cpa2)
+        if better.any():
+            r = rows[better]
+            k = k[better]
+            u = u[better]
+            tcpa[better] = t[k] + u*step
+            cpa2[better] = np.maximum(refined2[better], 0.0)
+            #linear interpolation of the CPA position for the sign
+            j = np.where(u < 0, k - 1, k + 1)
+            cpx[better] = dx[r, k] + np.abs(u)*(dx[r, j] - dx[r, k])
+            cpy[better] = dy[r, k] + np.abs(u)*(dy[r, j] - dy[r, k])
+
+    #CPA position astern the ship's beam if it is behind the perpendicular to the heading of object A
+    signe = np.where(cpx*sin(headingA) + cpy*cos(headingA) < 0, -1, 1).astype(np.int8)
+    signe[tcpa == 0] = 1
+    cpa = np.round(np.sqrt(cpa2) * signe, 3)
+
+    return {'cpa': cpa, 'tcpa': tcpa, 'sign': signe}
+
+
+def turn_rate_batch(turns):
+
+    # AIS rate of turn (pyais 'turn', degrees per minute) to degrees per minute for the path prediction:
+    # -128 = no turn information available -> 0, +-127 = turning at more than 5 degrees per 30 s without
+    # turn indicator -> +-10, others are limited to +-720
+
+    turns = np.asarray(turns, dtype=float)
+    rate = np.where(np.abs(turns) == 127, np.sign(turns) * 10.0, turns)
+    rate = np.where(turns == -128, 0.0, rate)
+    return np.clip(np.nan_to_num(rate), -720.0, 720.0)
+
+
+def calculate_distance_batch(latA, lonA, latB, lonB):
+
+    #Vectorized calculate_distance, with Haversine formulae
+
+    lat1 = np.radians(latA)
+    lon1 = np.radians(lonA)
+    lat2 = np.radians(latB)
+    lon2 = np.radians(lonB)
+
+    dlon = lon2-lon1
+    dlat = lat2-lat1
+
+    a = np.sin(dlat/2.)**2 + np.cos(lat1)*np.cos(lat2)*np.sin(dlon/2.)**2
+    c = 2*np.arcsin(np.sqrt(a))
+
+    return 6378.137*c/1.852
+
+
+def calculate_bearing_batch(latA, lonA, latB, lonB):
+
+    #Vectorized calculate_bearing, compass bearing from point A to point B
+
+    lat1 = np.radians(latA)
+    lat2 = np.radians(latB)
+
+    diffLong = np.radians(np.subtract(lonB, lonA))
+
+    x = np.sin(diffLong) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - (np.sin(lat1) * np.cos(lat2) * np.cos(diffLong))
+
+    initial_bearing = np.degrees(np.arctan2(x, y))
+
+    return (initial_bearing + 360) % 360
+
+
+def calculate_future_position_batch(lat, lon, object_speed, vector_angle):
+
+    #Vectorized calculate_future_position, returns (lat, lon) arrays
+
+    object_speed = np.multiply(object_speed, 1.852)
+
+    lat1 = np.radians(lat)
+    lon1 = np.radians(lon)
+    vector_angle = np.radians(vector_angle)
+
+    lat2 = np.arcsin(np.sin(lat1)*np.cos(object_speed/6378.137)+np.cos(lat1)*np.sin(object_speed/6378.137)*np.cos(vector_angle))
+    lon2 = lon1 + np.arctan2(np.sin(vector_angle)*np.sin(object_speed/6378.137)*np.cos(lat1), np.cos(object_speed/6378.137)-np.sin(lat1)*np.sin(lat2))
+
+    return (np.round(np.degrees(lat2), 7), np.round(np.degrees(lon2), 7))
+
+
+def calculate_cross_path_position_batch(latA, lonA, bearing1, latB, lonB, bearing2):
+
+    #Vectorized calculate_cross_path_position, returns (lat, lon) arrays
+    #Degenerate geometries give NaN where calculate_cross_path_position raises a math domain error
+
+    lat1 = np.radians(latA)
+    lon1 = np.radians(lonA)
+    lat2 = np.radians(latB)
+    lon2 = np.radians(lonB)
+    bearing1 = np.radians(bearing1)
+    bearing2 = np.radians(bearing2)
+
+    dlon = lon2-lon1
+    dlat = lat2-lat1
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = 2*np.arcsin(np.sqrt(np.sin(dlat/2)**2+np.cos(lat1)*np.cos(lat2)*np.sin(dlon/2)**2))
+
+        ta = np.arccos((np.sin(lat2)-np.sin(lat1)*np.cos(r))/(np.sin(r)*np.cos(lat1)))
+        tb = np.arccos((np.sin(lat1)-np.sin(lat2)*np.cos(r))/(np.sin(r)*np.cos(lat2)))
+
+        east = np.sin(dlon) > 0
+        t12 = np.where(east, ta, 2*pi-ta)
+        t21 = np.where(east, 2*pi-tb, tb)
+
+        a1 = (bearing1-t12 +pi) % (2*pi)-pi
+        a2 = (t21- bearing2+pi) % (2*pi)-pi
+
+        a3 = np.arccos(-np.cos(a1)*np.cos(a2)+np.sin(a1)*np.sin(a2)*np.cos(r))
+
+        y = np.arctan2(np.sin(r)*np.sin(a1)*np.sin(a2), np.cos(a2)+np.cos(a1)*np.cos(a3))
+        lat3 = np.arcsin(np.sin(lat1)*np.cos(y)+np.cos(lat1)*np.sin(y)*np.cos(bearing1))
+        dlon13 = np.arctan2(np.sin(bearing1)*np.sin(y)*np.cos(lat1), np.cos(y)-np.sin(lat1)*np.sin(lat3))
+        lon3 = (lon1 + dlon13 + pi) % (2*pi) - pi
+
+    return (np.round(np.degrees(lat3), 5), np.round(np.degrees(lon3), 5))
+
+
 def dms_to_dd(degrees, minutes=0, seconds=0):
     
     if degrees >= 0:
@@ -0,0 +1,342 @@
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from arpaocalc import Ship, ARPA_calculations, ARPA_calculations_batch, ARPA_calculations_curved_batch, \
+    calculate_distance, calculate_future_position, calculate_future_position_batch, calculate_cross_path_position
+from ais_decoder import decode_positions
+from ais_receiver import store_sentence
+from ais_demodulator import AISDemodulator, synthesize, to_cu8, valid_sentence
+from shore_station import close_pairs
+from target_store import TargetStore
+
+"""
+     Micro-benchmarks for the collision hot path (arpaocalc) and the AIS decode-and-store path.
+
+     Ship geometries are randomized with a fixed seed: targets within 20 nautical miles of own ship,
+     speeds 0 to 25 knots, any heading. The decode-and-store benchmark replays the fixed corpus of
+     AIVDM sentences in benchmark_corpus.nmea (position reports, other message types and broken sentences),
+     decode_positions the batch decoder of ais_decoder.py on the same corpus.
+     The demodulator benchmark runs 2.048 MS/s of IQ samples (.cu8) synthesized from the valid corpus sentences,
+     real time needs per_op_us below 0.49 (microseconds per IQ sample). The sensitivity sweep counts the packets
+     the demodulator recovers from 200 corpus sentences at several signal to noise ratios (25 kHz) with a receiver
+     frequency error of 500 Hz; --compare also reports fewer packets than in the baseline as a regression.
+     The shore-station benchmark finds the closest pairs of all the random ships (per_op_us per vessel).
+     The flat cpa check compares ARPA_calculations_batch with flat_range against the spherical path on 100000
+     random targets (0.1 to 10 nautical miles, latitudes up to 70 degrees) and reports a percentile of the |cpa|
+     difference above flat_cpa_bound as a regression (the bound stated in arpaocalc.py).
+
+     Results are written as JSON, e.g.:
+          python benchmark.py -o baseline.json
+          python benchmark.py --compare baseline.json --threshold 1.2     # exit code 1 if a benchmark is 20% slower
+"""
+
+corpus_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_corpus.nmea')
+
+
+def random_geometries(n, seed=0):
+    """
+    :param n: number of targets
+    :param seed: random seed
+    :return: own ship (Ship) and list of target ships around it
+    """
+    rng = random.Random(seed)
+    own_ship = Ship((54.32, 10.15), 6.0, 45.0)
+    ships = []
+    for i in range(n):
+        distance = rng.uniform(0.1, 20.0)
+        lat, lon = calculate_future_position(own_ship.position, distance, rng.uniform(0, 360))
+        ships.append(Ship((lat, lon), rng.uniform(0, 25), rng.uniform(0, 360)))
+    return own_ship, ships
+
+
+def load_corpus(path=corpus_file):
+    with open(path, 'rb') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def measure(name, function, n, repeat):
+    """
+    :param name: benchmark name
+    :param function: function without arguments that runs n operations
+    :param n: operations per call of function
+    :param repeat: number of timed calls
+    :return: dict with timing results in seconds
+    """
+    function()                                      # warm up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {'name': name, 'n': n, 'repeat': repeat, 'best_s': best, 'median_s': statistics.median(times),
+            'per_op_us': best / n * 1e6, 'ops_per_s': n / best if best > 0 else None}
+
+
+def demodulator_sensitivity(sentences, snrs=(20, 10, 8, 6), frequency_error=500.0, block_size=256 * 1024):
+    """
+    :param sentences: single-fragment !AIVDM sentences
+    :param snrs: signal to noise ratios in dB
+    :return: list of dicts with snr_db, sent and recovered (distinct payloads demodulated)
+    """
+    payloads = {sentence.split(b',')[5] for sentence in sentences}
+    results = []
+    for snr in snrs:
+        iq = to_cu8(synthesize(sentences, snr_db=snr, frequency_error=frequency_error))
+        demodulator = AISDemodulator()
+        received = set()
+        for i in range(0, len(iq), 2 * block_size):
+            received.update(sentence.split(b',')[5] for sentence in demodulator.process(iq[i:i + 2 * block_size]))
+        results.append({'snr_db': snr, 'frequency_error_hz': frequency_error, 'sent': len(payloads),
+                        'recovered': len(payloads & received)})
+    return results
+
+
+# nautical miles range: (99th, 99.9th percentile) of the |cpa| difference of the flat and the spherical path
+flat_cpa_bound = {2: (0.01, 0.025), 5: (0.025, 0.05), 10: (0.05, 0.1)}
+
+
+def flat_cpa_error(own_ships=100, targets=1000, seed=0):
+    """
+    :param own_ships: number of random own ships (latitudes up to 70 degrees)
+    :param targets: random targets per own ship, 0.1 to 10 nautical miles away
+    :return: list of dicts with range_nm, p99_nm and p999_nm of the |cpa| difference of the vessels within range_nm,
+             and one dict with the fraction of sign flips and the number of degenerate spherical results
+    """
+    rng = np.random.default_rng(seed)
+    distances, spherical, flat = [], [], []
+    for _ in range(own_ships):
+        own_ship = Ship((rng.uniform(-70, 70), rng.uniform(-180, 180)), rng.uniform(0, 25), rng.uniform(0, 360))
+        distance = rng.uniform(0.1, 10.0, targets)
+        lats, lons = calculate_future_position_batch(np.full(targets, own_ship.position[0]),
+                                                     np.full(targets, own_ship.position[1]),
+                                                     distance, rng.uniform(0, 360, targets))
+        speeds = rng.uniform(0, 25, targets)
+        headings = rng.uniform(0, 360, targets)
+        distances.append(distance)
+        spherical.append(ARPA_calculations_batch(own_ship, lats, lons, speeds, headings)['cpa'])
+        flat.append(ARPA_calculations_batch(own_ship, lats, lons, speeds, headings, flat_range=10)['cpa'])
+    distance, spherical, flat = np.concatenate(distances), np.concatenate(spherical), np.concatenate(flat)
+
+    # the spherical path (like ARPA_calculations) returns about 10818 Nm for some nearly parallel tracks
+    valid = np.abs(spherical) < 1000
+    error = np.abs(np.abs(spherical) - np.abs(flat))
+    results = []
+    for range_nm in flat_cpa_bound:
+        within = valid & (distance <= range_nm)
+        p99, p999 = np.percentile(error[within], [99, 99.9])
+        results.append({'range_nm': range_nm, 'p99_nm': float(p99), 'p999_nm': float(p999)})
+    flips = valid & (np.sign(spherical) * np.sign(flat) < 0)
+    results.append({'sign_flips': float(flips.mean()), 'degenerate': int((~valid).sum()), 'n': len(distance)})
+    return results
+
+
+def check_flat_cpa(errors):
+    """
+    :param errors: flat_cpa_error() results
+    :return: list of names of the ranges whose percentiles exceed flat_cpa_bound
+    """
+    regressions = []
+    for result in errors:
+        if 'range_nm' not in result:
+            continue
+        p99, p999 = flat_cpa_bound[result['range_nm']]
+        if result['p99_nm'] > p99 or result['p999_nm'] > p999:
+            regressions.append(f'flat_cpa_error_{result["range_nm"]}nm')
+    return regressions
+
+
+def run_benchmarks(n=1000, repeat=5, seed=0):
+    """
+    :param n: number of random ship geometries
+    :param repeat: number of timed runs per benchmark
+    :param seed: random seed of the geometries
+    :return: list of result dicts
+    """
+    own_ship, ships = random_geometries(n, seed)
+    pointA = own_ship.position
+    points = [ship.position for ship in ships]
+
+    # cross path inputs that have a solution (degenerate geometries raise a math domain error)
+    rng = random.Random(seed)
+    cross_paths = []
+    for point in points:
+        bearings = (rng.uniform(0, 360), rng.uniform(0, 360))
+        try:
+            calculate_cross_path_position(pointA, bearings[0], point, bearings[1])
+        except ValueError:
+            continue
+        cross_paths.append((point, bearings))
+
+    lats = np.array([ship.position[0] for ship in ships])
+    lons = np.array([ship.position[1] for ship in ships])
+    speeds = np.array([ship.speed for ship in ships])
+    headings = np.array([ship.heading for ship in ships])
+    turns = np.array([rng.uniform(-30, 30) for _ in ships])       # degrees per minute
+
+    def distance():
+        for point in points:
+            calculate_distance(pointA, point)
+
+    def future_position():
+        for ship in ships:
+            calculate_future_position(ship.position, ship.speed, ship.heading)
+
+    def cross_path_position():
+        for point, (bearing1, bearing2) in cross_paths:
+            calculate_cross_path_position(pointA, bearing1, point, bearing2)
+
+    def arpa():
+        for ship in ships:
+            ARPA_calculations(own_ship, ship)
+
+    def arpa_batch():
+        ARPA_calculations_batch(own_ship, lats, lons, speeds, headings)
+
+    def arpa_batch_flat():
+        ARPA_calculations_batch(own_ship, lats, lons, speeds, headings, flat_range=20)
+
+    def arpa_curved():
+        ARPA_calculations_curved_batch(own_ship, lats, lons, speeds, headings, turns)
+
+    fleet = TargetStore(capacity=len(ships))
+    for i, ship in enumerate(ships):
+        fleet.upsert(i, ship.position[0], ship.position[1], ship.speed, ship.heading, ship.heading, True, 0.0)
+
+    def shore_station():
+        close_pairs(fleet)
+
+    corpus = load_corpus()
+
+    def decode_and_store():
+        targets = TargetStore()
+        for sentence in corpus:
+            try:
+                store_sentence(targets, sentence, timestamp=0.0)
+            except Exception:
+                pass                                # broken sentences are part of the corpus
+
+    def decode_batch():
+        decode_positions(corpus)
+
+    iq = to_cu8(synthesize([sentence for sentence in corpus if sentence.startswith(b'!AIVDM,1,1,') and
+                            valid_sentence(sentence)][:40]))
+
+    def demodulate():
+        AISDemodulator().process(iq)
+
+    def import_collision_detection():
+        # new interpreter: startup of the collision detection without the lazily imported modules
+        subprocess.run([sys.executable, '-c', 'import collision_detection'], check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    return [
+        measure('calculate_distance', distance, len(points), repeat),
+        measure('calculate_future_position', future_position, len(ships), repeat),
+        measure('calculate_cross_path_position', cross_path_position, len(cross_paths), repeat),
+        measure('ARPA_calculations', arpa, len(ships), repeat),
+        measure('ARPA_calculations_batch', arpa_batch, len(ships), repeat),
+        measure('ARPA_calculations_batch_flat', arpa_batch_flat, len(ships), repeat),
+        measure('ARPA_calculations_curved_batch', arpa_curved, len(ships), repeat),
+        measure('shore_station_close_pairs', shore_station, len(ships), repeat),
+        measure('decode_and_store', decode_and_store, len(corpus), repeat),
+        measure('decode_positions', decode_batch, len(corpus), repeat),
+        measure('ais_demodulator', demodulate, len(iq) // 2, repeat),
+        measure('import_collision_detection', import_collision_detection, 1, repeat),
+    ]
+
+
+def compare_sensitivity(sensitivity, baseline):
+    """
+    :param sensitivity: list of demodulator_sensitivity() results
+    :param baseline: list of demodulator_sensitivity() results of an earlier run
+    :return: list of names of the signal to noise ratios with fewer recovered packets
+    """
+    previous = {result['snr_db']: result for result in baseline}
+    regressions = []
+    for result in sensitivity:
+        before = previous.get(result['snr_db'])
+        if before is None:
+            continue
+        result['baseline_recovered'] = before['recovered']
+        if result['recovered'] < before['recovered']:
+            regressions.append(f'ais_demodulator_sensitivity_{result["snr_db"]:g}dB')
+    return regressions
+
+
+def compare(results, baseline, threshold):
+    """
+    :param results: list of result dicts
+    :param baseline: list of result dicts of an earlier run
+    :param threshold: allowed slowdown factor of per_op_us, e.g., 1.2
+    :return: list of names of the benchmarks that regressed
+    """
+    previous = {result['name']: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        result['baseline_per_op_us'] = before['per_op_us']
+        result['ratio'] = result['per_op_us'] / before['per_op_us']
+        if result['ratio'] > threshold:
+            regressions.append(result['name'])
+    return regressions
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmarks of arpaocalc and the AIS decode-and-store path")
+    parser.add_argument("-n", type=int, default=1000, help="number of random ship geometries")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="random seed of the ship geometries")
+    parser.add_argument("-o", "--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2, help="allowed slowdown factor with --compare")
+
+    args = parser.parse_args()
+
+    report = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'n': args.n,
+        'seed': args.seed,
+        'results': run_benchmarks(args.n, args.repeat, args.seed),
+        'sensitivity': demodulator_sensitivity([sentence for sentence in load_corpus()
+                                                if sentence.startswith(b'!AIVDM,1,1,') and
+                                                valid_sentence(sentence)][:200]),
+        'flat_cpa': flat_cpa_error(seed=args.seed),
+    }
+
+    regressions = check_flat_cpa(report['flat_cpa'])
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions += compare(report['results'], baseline['results'], args.threshold)
+        regressions += compare_sensitivity(report['sensitivity'], baseline.get('sensitivity', []))
+        report['regressions'] = regressions
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if regressions:
+        print(f'Regressions (slower than {args.threshold}x baseline, fewer demodulated packets or flat cpa error '
+              f'above the bound): {regressions}',
+              file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,223 @@
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+"""
+     Capture file for AIS datagrams and gps sentences, to record a run and replay it without SDR and gps dongle.
+
+     Capture file (append-only, e.g., 'run.aiscap'):
+          header: b'AISCAP01'
+          records: timestamp (float64, receive time in seconds since the epoch), source (uint8, SOURCE_AIS or
+                   SOURCE_GPS), length (uint16), followed by length bytes of payload (raw datagram or gps line)
+     Sidecar time index ('run.aiscap.idx'): (timestamp float64, offset uint64) of the first record of every second,
+     so a replay can seek to any time without reading the file from the start.
+
+     The replay memory-maps the capture file, so seeking and scanning read no more than the records returned;
+     every payload is copied out of the map as bytes (the receive path splits and decodes bytes). Replay speed:
+     1 = real time, N = N times faster, None or 0 = as fast as possible.
+"""
+
+SOURCE_AIS = 0
+SOURCE_GPS = 1
+MAX_PAYLOAD = 0xFFFF                            # the length field is uint16
+
+magic = b'AISCAP01'
+record_header = struct.Struct('<dBH')           # timestamp, source, length
+index_entry = struct.Struct('<dQ')              # timestamp, offset
+index_dtype = np.dtype([('timestamp', '<f8'), ('offset', '<u8')])
+
+
+class CaptureWriter:
+    """
+        Appends records to a capture file and its time index. Thread-safe: the gps reader thread and the receive
+        loop may write at the same time, each record is written whole under a lock.
+        E.g., recorder = CaptureWriter('run.aiscap'); recorder.write(SOURCE_AIS, datagram)
+    """
+    def __init__(self, path, index_interval=1.0):
+        """
+        :param path: capture file, appended to if it exists
+        :param index_interval: seconds between index entries
+        """
+        self.path = path
+        self.index_interval = index_interval
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(magic)
+        self.index = open(path + '.idx', 'ab')
+        self.next_index = None
+        self.records = 0
+        self.lock = threading.Lock()
+
+    def write(self, source, data, timestamp=None):
+        """
+        :param source: SOURCE_AIS or SOURCE_GPS
+        :param data: payload as bytes (at most MAX_PAYLOAD bytes)
+        :param timestamp: receive time in seconds since the epoch, now if None
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        header = record_header.pack(timestamp, source, len(data))
+        with self.lock:
+            if self.next_index is None or timestamp >= self.next_index:
+                self.index.write(index_entry.pack(timestamp, self.file.tell()))
+                self.next_index = timestamp + self.index_interval
+            self.file.write(header)
+            self.file.write(data)
+            self.records += 1
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+            self.index.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.flush()
+            self.index.flush()
+            self.file.close()
+            self.index.close()
+
+
+class CaptureReader:
+    """
+        Memory-mapped reader of a capture file.
+        E.g., for timestamp, source, data in CaptureReader('run.aiscap').replay(speed=10): ...
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size < len(magic):
+            raise ValueError(f'{path} is not a capture file')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(magic)] != magic:
+            raise ValueError(f'{path} is not a capture file')
+        self.index = self.load_index()
+
+    def load_index(self):
+        """
+        :return: structured array of (timestamp, offset), rebuilt from the records if the index file is missing
+        """
+        try:
+            index = np.fromfile(self.path + '.idx', dtype=index_dtype)
+        except (OSError, ValueError):
+            index = None
+        if index is None or len(index) == 0 or index['offset'][-1] >= self.size:
+            index = self.build_index()
+        return index
+
+    def build_index(self, interval=1.0):
+        entries = []
+        next_index = None
+        for offset, timestamp, source, data in self.scan(len(magic)):
+            if next_index is None or timestamp >= next_index:
+                entries.append((timestamp, offset))
+                next_index = timestamp + interval
+        return np.array(entries, dtype=index_dtype)
+
+    def scan(self, offset):
+        """
+        :param offset: byte offset of a record
+        :return: iterator of (offset, timestamp, source, payload as a bytes copy), stops at an incomplete last record
+        """
+        while offset + record_header.size <= self.size:
+            timestamp, source, length = record_header.unpack_from(self.map, offset)
+            start = offset + record_header.size
+            if start + length > self.size:
+                break                                   # last record was not written completely
+            yield offset, timestamp, source, self.map[start:start + length]
+            offset = start + length
+
+    def seek(self, timestamp):
+        """
+        :param timestamp: seconds since the epoch
+        :return: byte offset of the last indexed record at or before timestamp
+        """
+        if len(self.index) == 0:
+            return len(magic)
+        i = int(np.searchsorted(self.index['timestamp'], timestamp, side='right')) - 1
+        return int(self.index['offset'][max(i, 0)])
+
+    def records(self, start=None, end=None):
+        """
+        :param start: first timestamp to return, from the beginning if None
+        :param end: last timestamp to return, to the end if None
+        :return: iterator of (timestamp, source, payload)
+        """
+        offset = len(magic) if start is None else self.seek(start)
+        for offset, timestamp, source, data in self.scan(offset):
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp > end:
+                break
+            yield timestamp, source, data
+
+    def replay(self, speed=1.0, start=None, end=None):
+        """
+        :param speed: 1 = real time, N = N times faster, None or 0 = as fast as possible
+        :return: iterator of (timestamp, source, payload), paced by the recorded timestamps
+        """
+        first = None
+        for timestamp, source, data in self.records(start, end):
+            if speed:
+                if first is None:
+                    first = timestamp
+                    wall_start = time.monotonic()
+                delay = wall_start + (timestamp - first) / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield timestamp, source, data
+
+    def info(self):
+        """
+        :return: dict with the number of records per source, first and last timestamp
+        """
+        counts = {SOURCE_AIS: 0, SOURCE_GPS: 0}
+        first = last = None
+        for offset, timestamp, source, data in self.scan(len(magic)):
+            counts[source] = counts.get(source, 0) + 1
+            if first is None:
+                first = timestamp
+            last = timestamp
+        return {'ais_records': counts[SOURCE_AIS], 'gps_records': counts[SOURCE_GPS], 'first': first, 'last': last,
+                'duration_s': None if first is None else last - first, 'index_entries': len(self.index)}
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class ReplayClock:
+    """
+        Clock that returns the timestamp of the record that is replayed, used instead of time.time in a replay.
+    """
+    def __init__(self, timestamp=0.0):
+        self.timestamp = timestamp
+
+    def __call__(self):
+        return self.timestamp
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AIS/NMEA capture file tool")
+    parser.add_argument("file", help="capture file")
+    parser.add_argument("--dump", action="store_true", help="print the records")
+    parser.add_argument("--reindex", action="store_true", help="rebuild the time index file")
+
+    args = parser.parse_args()
+
+    reader = CaptureReader(args.file)
+    if args.reindex:
+        reader.index = reader.build_index()
+        reader.index.tofile(args.file + '.idx')
+    if args.dump:
+        for timestamp, source, data in reader.records():
+            print(f'{timestamp:.3f} {"AIS" if source == SOURCE_AIS else "GPS"} {bytes(data)!r}')
+    print(reader.info())
@@ -1,19 +1,28 @@
-import pynmea2
-from pyais import *         # https://pypi.org/project/pyais/
+import time
+started = time.perf_counter()   # start of the import, startup phases are measured from here
 import socket       # socket programming library
 import serial       # install pyserial
-import pandas as pd
+import numpy as np
 import sys
-from arpaocalc import Ship, ARPA_calculations   # math functions to calculate cpa & tcpa
-import time
+import threading
+import importlib
+from arpaocalc import Ship, ARPA_calculations_batch, ARPA_calculations_curved_batch   # math functions to calculate cpa & tcpa
+from target_store import TargetStore, TTLPolicy
+from spatial_index import GridIndex
+import metrics
+from gps_reader import SerialGPS, GPSReader
+from ais_receiver import UDPReceiver, TCPReceiver, FeedMerger, DuplicateFilter, decode_sentence, store_decoded, \
+    split_sentences
+from capture import CaptureWriter, CaptureReader, ReplayClock, SOURCE_GPS
 import signal
+import asyncio
 
 """
      First configure SDRAngle settings for RTLSDR-USB to receive AIS messages
      Adjust GPS port path 
      Start this ship collision avoidance script 
           Script connects to SDRAngel through UDP
-          Saves receiving AIVDM messages in dataframe 
+          Saves receiving AIVDM position reports in a target store (one entry per MMSI)
           Collects position(lat,lon), speed and heading of own ship and other vessels
           Calculates the closest time of approach (cpa) and time to closest time of approach (tcpa) of own ship to other targets
           Sends a signal if there is a possible collision
@@ -37,172 +46,477 @@ import signal
     STDMA (Self Organized Time Division Multiple Access) technique ensures that report from one AIS station fits into one of 
     2250 time slots of 26.6 milliseconds established every 60 seconds on each frequency. 
     Therefore, this script listens to socket for 60 seconds before calculating the closest points of approach.
+
+    Run with: python collision_detection.py [--min-distance METERS]
+    Importing this module has no side effects (no gps, socket, GPIO or prompt), so the stages can be used as a library:
+          store_sentences() decodes AIS sentences into the target store (targets), calculate_cpa() and
+          collision_sweep() check them against own ship, give_warning() and remove_warning() drive the alert.
+    setup() opens gps, feeds and the optional outputs of the settings below, close() releases them, main() runs the loop.
+    Shore-station mode (--shore-station) has no gps: pair_sweep() reports the closest approaches between all vessels.
+    pyais, pynmea2 and pandas are imported on first use (preloaded in the background by main()).
 """
 
-dataframe = pd.DataFrame()      # to store AIS incoming messages
+targets = TargetStore(index=GridIndex(cell_size=0.1))     # to store the latest AIS position report of each vessel
 seconds_to_listen = 60          # to receive AIS messages for 60s before running collision test
+streaming_mode = False          # True: check each position report immediately and run a full collision test every sweep_interval
+sweep_interval = 60             # seconds between full collision tests (and gps reads) in streaming mode
+asyncio_mode = False            # True: receive AIS and gps data in one asyncio event loop (see run_async)
+gps_stale_after = 5             # seconds after which the own ship gps fix is reported as stale
+udp_receive_buffer = 4 * 1024 * 1024    # bytes of kernel socket buffer to absorb AIS bursts (Linux caps at net.core.rmem_max)
+udp_feeds = [('localhost', 5005)]       # (ip address, port) of UDP feeds according to settings in SDRangle
+tcp_feeds = []                  # (host, port) of network AIS feeds, e.g., [('192.168.1.10', 10110)]
+dedup_window = 2                # seconds in which a repeated sentence (e.g., of another feed) is dropped, 0 = keep all
 min_distance = 0.2159827        # minimum distance in nautical mile;     0.00108 Nm = 2m         0.2159827 Nm = 400m
+range_gate = True               # True: only check vessels that could reach min_distance within gate_horizon
+gate_speed = 40                 # assumed maximum speed of other vessels in knots for the range gate
+gate_horizon = 30               # minutes ahead for the range gate
+fast_cpa = False                # True: closed-form flat cpa for vessels within flat_range, spherical cpa beyond
+flat_range = 5                  # nautical miles, see ARPA_calculations_batch for the error bound
+curved_cpa = False              # True: predict curved paths of turning vessels (class A rate of turn) instead of straight lines
+curved_horizon = 30             # minutes ahead for the curved path prediction
+curved_step = 0.5               # minutes between the predicted positions of the curved paths
+cpa_cache_size = 0              # vessels whose cpa is reused while their and own ship's state stay within the tolerances below (see cpa_cache.py), 0 = no cache
+cache_position_tolerance = 0.01 # nautical miles
+cache_speed_tolerance = 0.1     # knots
+cache_heading_tolerance = 1     # degrees
+sweep_processes = 0             # worker processes for the collision test of very large target sets (see sweep_pool.py), 0 = no pool
+record_file = None              # e.g., 'run.aiscap': record AIS datagrams and gps sentences (see capture.py)
+replay_file = None              # e.g., 'run.aiscap': replay a capture file instead of using SDR and gps dongle
+replay_speed = 1                # 1 = real time, N = N times faster, 0 = as fast as possible
+replay_start = None             # timestamp (seconds since the epoch) to start the replay, None = from the start
+clock = time.time               # receive time of messages, the capture time in a replay
+target_ttl = TTLPolicy()        # seconds without position report before a vessel is removed (by AIS class and speed), None = keep all
+dead_reckoning = True           # True: move vessels from the time of their last report to the time of the own ship gps fix
+own_ship_time = None            # time of the own ship gps fix of get_own_ship
+trace_file = None               # e.g., 'trace.bin': latency of every position report from receive to collision check (see tracing.py)
+profile_dir = None              # e.g., 'profiles': cProfile of every cycle between full collision tests (python -m pstats)
+metrics_port = None             # e.g., 9108: counters and latency histograms in Prometheus format on http://localhost:9108/metrics
+track_depth = 0                 # past position reports kept per vessel (see track_history.py), 0 = no tracks
+track_targets = 4096            # vessels with a track, memory is track_depth * track_targets * 36 bytes
+track_file = None               # e.g., 'tracks.npz' or 'tracks.parquet': tracks of all vessels written at exit
+archive_file = None             # e.g., 'ais.db': position reports and cpa results in a SQLite database (see archive.py)
+shore_station = False           # True: no own ship, report the closest pairs of all vessels every seconds_to_listen (see shore_station.py)
+shore_top_k = 10                # closest pairs reported per check in shore-station mode
+shore_max_cpa = 1.0             # nautical miles, pairs that do not come closer within shore_horizon are not reported
+shore_horizon = 30              # minutes ahead in shore-station mode
 led_pin = 11
 
-if sys.platform.startswith('win32'):
-    # Windows-specific code here...
-    import winsound
-    platform = 'w'
-    print('Platform = Windows')
-    port = 'COM6'  # connect to gps: adjust path to gps usb device port. For my setup on Windows it's port COM6
-    # valid_signals = signal.valid_signals()
-    # print(f'Valid signals are: {valid_signals}')
-    # signal_insert_number = signal.SIGBREAK     # press STRG + fn to insert a new minimum distance
-elif sys.platform.startswith('linux'):
-    # Linux-specific code here...
-    import RPi.GPIO as GPIO                 # library to control raspberry pi LED
-    # TODO: RPi.GPIO unsuitable for real-time or timing critical applications
-    platform = 'l'
-    print('Platform = Linux')
-    port = '/dev/ttyACM0'  # connect to gps: adjust path to gps usb device port
-    GPIO.setmode(GPIO.BOARD)
-    GPIO.setup(led_pin, GPIO.OUT)
-    GPIO.output(led_pin, False)  # turn off LED on Raspberry Pi
-    # valid_signals = signal.valid_signals()
-    # print(f'Valid signals are: {valid_signals}')
-    # signal_insert_number = signal.SIGBREAK does it exist? or signal.SIGTSTP (CRTL + Z)
-else:
-    print('Operating system is not supported.')
-    sys.exit()
+# runtime state, set by setup_platform() and setup(); None until then
+platform = None                 # 'w': Windows (beep), 'l': Linux (LED on Raspberry Pi), None: warnings are printed only
+port = None                     # path of the gps usb device port
+MyGPS = None
+MyGPSFix = None
+receiver = None
+recorder = None
+sweep_pool = None
+cpa_cache = None
+tracer = None
+profiler = None
+archive = None
+metrics_server = None
+all_cpa = None                  # dataframe of the latest full collision test
+startup = {}                    # startup phase -> seconds since started
+
+
+def setup_platform():
+    """
+    Selects the gps port and the collision warning of the operating system, sets up the LED on Linux.
+    """
+    global platform
+    global port
+    global winsound
+    global GPIO
+    if sys.platform.startswith('win32'):
+        # Windows-specific code here...
+        import winsound
+        platform = 'w'
+        print('Platform = Windows')
+        port = 'COM6'  # connect to gps: adjust path to gps usb device port. For my setup on Windows it's port COM6
+        # valid_signals = signal.valid_signals()
+        # print(f'Valid signals are: {valid_signals}')
+        # signal_insert_number = signal.SIGBREAK     # press STRG + fn to insert a new minimum distance
+    elif sys.platform.startswith('linux'):
+        # Linux-specific code here...
+        import RPi.GPIO as GPIO                 # library to control raspberry pi LED
+        # TODO: RPi.GPIO unsuitable for real-time or timing critical applications
+        platform = 'l'
+        print('Platform = Linux')
+        port = '/dev/ttyACM0'  # connect to gps: adjust path to gps usb device port
+        GPIO.setmode(GPIO.BOARD)
+        GPIO.setup(led_pin, GPIO.OUT)
+        GPIO.output(led_pin, False)  # turn off LED on Raspberry Pi
+        # valid_signals = signal.valid_signals()
+        # print(f'Valid signals are: {valid_signals}')
+        # signal_insert_number = signal.SIGBREAK does it exist? or signal.SIGTSTP (CRTL + Z)
+    else:
+        print('Operating system is not supported.')
+        sys.exit()
 
 
-def convert_pos_to_dd(lat, lat_dir, lon, lon_dir):
+def preload(*modules):
     """
-    :param lat: has the format 'DDMM.MMMMM' string
-    :param lat_dir: 'N' or 'S' (North/South)
-    :param lon: has the format 'DDDMM.MMMMM' string
-    :param lon_dir: 'E' or 'W' (East/West)
-    :return: lat, lon in decimal degrees using the formula: decimal = degrees + minutes / 60.0 + seconds / 3600.0
+    :param modules: names of modules to import in a background thread, e.g., while waiting for the user or the gps
+    :return: the thread
     """
+    def run():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                print('Preload of {} failed: {}'.format(module, e))
 
-    direction = {'N': 1, 'S': -1, 'E': 1, 'W': -1}
-    try:
-        lat_degrees = int(lat[:2])
-        lat_minutes = float(lat[2:])
+    thread = threading.Thread(target=run, name='Preload', daemon=True)
+    thread.start()
+    return thread
 
-        lat_decimal = (lat_degrees + lat_minutes / 60.0) * direction[lat_dir]
-        lat_decimal = round(lat_decimal, 5)
 
-        lon_degrees = int(lon[:3])
-        lon_minutes = float(lon[3:])
+def startup_phase(phase):
+    """
+    :param phase: name of the startup phase, e.g., 'first_report'
+    Records the seconds from the import of this module to the phase, the first time only.
+    """
+    if phase not in startup:
+        startup[phase] = time.perf_counter() - started
+        metrics.startup_seconds.set(startup[phase], phase=phase)
 
-        lon_decimal = (lon_degrees + lon_minutes / 60.0) * direction[lon_dir]
-        lon_decimal = round(lon_decimal, 5)
 
-        # print(f' lat_decimal: {lat_decimal}, lon_decimal: {lon_decimal}')
+def store_sentences(sentences, received=None):
+    """
+    :param sentences: list of NMEA AIS sentences as bytes
+    :param received: time.perf_counter() when the sentences were received, for the receive to decode latency
+    :return: set of mmsi of the updated vessels
+    """
+    updated = set()
+    for sentence in sentences:
+        if tracer is not None and received is None:
+            received = time.perf_counter()
+        decode_start = time.perf_counter()
+        try:
+            decoded = decode_sentence(sentence)
+        except Exception as e:
+            metrics.decode_failures.inc(cause=type(e).__name__)
+            print('Pyais error. Invalid NMEA message.')
+            continue
+        decoded_at = time.perf_counter()
+        if received is not None:
+            metrics.receive_to_decode.observe(decoded_at - received)
 
-        return lat_decimal, lon_decimal
+        mmsi = store_decoded(targets, decoded, clock())
+        if mmsi is None:
+            metrics.unsupported_messages.inc(msg_type=decoded.msg_type)
+            continue
+        stored_at = time.perf_counter()
+        metrics.decode_to_store.observe(stored_at - decoded_at)
+        metrics.position_reports.inc()
+        if tracer is not None:
+            tracer.stored(mmsi, received, decode_start, decoded_at, stored_at)
+        if archive is not None:
+            archive.position(targets, mmsi)
+        if 'first_report' not in startup:
+            startup_phase('first_report')
+            print('Startup: ' + ', '.join(f'{phase} {seconds:.3f} s' for phase, seconds in startup.items()))
+        updated.add(mmsi)
+    return updated
 
-    except:
-        print(f'Arguments (lat: {lat} of type {type(lat)} and lon: {lon}) of type {type(lon)} are not valid.')
-        print(f'Arguments (lon_dir: {lat_dir} of type {type(lat_dir)} and lon: {lon_dir}) of type {type(lon_dir)}')
-        return None, None
 
+def socket_reader(seconds):
+    """
+    :param seconds: seconds to listen to UDP socket
+    :return: none
 
-class SerialGPS:
+    Function to receive NMEA AIS sentences (!AIVDM/!AIVDO) from SDRAngle via UDP socket.
+    In SDRAnge enable UDP via '127.0.0.1 : 5005' and select Format: 'NMEA'
+    Stores incoming ship data in global target store.
     """
-        Serial GPS class. To connect to usb device find out the port and baud rate of your device.
-        My gps device: NL-8012U (NaviLock)
-        E.g., port path: '/dev/ttyUSB0' on Linux or 'COM6' on Windows
-        E.g., typical baud rates: 75, 110, 300, 1200, 2400, 4800, 9600, 19200, 38400, 57600 and 115200 bit/s
+    global receiver
+    t_end = time.time() + seconds
+
+    while time.time() < t_end:                      # run for a defined amount of seconds
+        try:
+            # receive all pending AIS NMEA sentences
+            sentences = receiver.receive(timeout=max(t_end - time.time(), 0))
+        except KeyboardInterrupt:
+            # TODO: Windows Socket.recv() does not raise KeyboardInterrupt for SIGINT;
+            #  improve exit handling see https://github.com/codypiersall/pynng/issues/49
+            break
+        store_sentences(sentences, receiver.received)
+
+
+def stream_reader(interval):
     """
-    def __init__(self, port, baudrate):
-        self.port = serial.Serial(port, baudrate)
-        if not self.port.isOpen():
-            self.port.open()
+    :param interval: seconds between full collision tests
+    :return: none
 
-    def port_open(self):
-        if not self.port.isOpen():
-            self.port.open()
-            print('Serial port is open.')
+    Streaming alternative to socket_reader: every position report updates its target and is checked against
+    the latest own ship position right away, so a warning is given as soon as a dangerous report arrives.
+    Every interval seconds all targets are checked.
+    """
+    global receiver
+    global all_cpa
+    objectA = None
+    next_sweep = time.monotonic()
 
-    def port_close(self):
-        self.port.close()
-        print('Serial port is closed.')
+    while True:
+        if time.monotonic() >= next_sweep:
+            objectA = get_own_ship()
+            all_cpa = collision_sweep(objectA, targets)
+            print_sweep(all_cpa)
+            update_warning(all_cpa)
+            print('')
+            next_sweep = time.monotonic() + interval
+
+        # wake up for new datagrams or the next full collision test
+        sentences = receiver.receive(timeout=max(next_sweep - time.monotonic(), 0))
+        updated = store_sentences(sentences, receiver.received)
+
+        if updated and objectA is not None and check_updated(updated):
+            give_warning()
 
-    def serial_reader(self):
-        while True:
-            try:
-                data = self.port.readline()
-                msg = data.decode(encoding='latin1').replace("\n", "").replace("\r", "")
-                if (msg.startswith("$GNRMC")):
-                    gnrmc = pynmea2.parse(msg)
-                    # print(repr(gnrmc))
-
-                    if gnrmc.spd_over_grnd is None:               # if speed is not defined set speed to zero
-                        speed = 0.0000
-                    else:
-                        speed = float(gnrmc.spd_over_grnd)      # TODO: serial gps speed is greater 0.1 without moving
-
-                    if gnrmc.true_course is None:                 # if course is not defined set course to zero
-                        course = 0.0000
-                    else:
-                        course = float(gnrmc.true_course)
-
-                    lat, lon = convert_pos_to_dd(gnrmc.lat, gnrmc.lat_dir, gnrmc.lon, gnrmc.lon_dir)
-
-                    if lat is None:
-                        print(f'Input lat = {gnrmc.lat}; lon = {gnrmc.lon} are not valid for convert_pos_to_dd()')
-                        continue
-                    else:
-                        return {'lat': lat, 'lon': lon, 'speed': speed, 'course': course}
 
+def check_updated(updated):
+    """
+    :param updated: set of mmsi of updated vessels
+    :return: True if an updated vessel is on collision course, the caller gives the warning
+
+    Checks only the updated vessels against the latest own ship position and updates their rows of all_cpa.
+    """
+    global all_cpa
+    objectA = get_own_ship(timeout=0, verbose=False)
+    if objectA is None or all_cpa is None or 'collision' not in all_cpa.columns:
+        return False
+
+    results = calculate_cpa(objectA, targets, rows=[targets.rows[mmsi] for mmsi in updated if mmsi in targets])
+    # vessels the range gate left out are not in a full collision test either, drop their previous results
+    gated = all_cpa.index.intersection(list(updated.difference(results['mmsi'].tolist())))
+    if len(gated):
+        all_cpa = all_cpa.drop(gated)
+    for i, mmsi in enumerate(results['mmsi']):
+        all_cpa.loc[mmsi, ['cpa (Nm)', 'tcpa (min)', 'collision']] = \
+            [results['cpa'][i], results['tcpa'][i], results['collision'][i]]
+
+    return 1 in results['collision']
+
+
+def replay_reader(path, speed, interval):
+    """
+    :param path: capture file (see capture.py)
+    :param speed: 1 = real time, N = N times faster, 0 = as fast as possible
+    :param interval: seconds (capture time) between full collision tests
+    :return: none
+
+    Feeds a recorded run through the same pipeline as stream_reader and reports how many sentences per second
+    the decode-and-store and collision stages sustain.
+    """
+    global all_cpa
+    global clock
+    reader = CaptureReader(path)
+    print(f'Replaying {path}: {reader.info()}')
+    clock = ReplayClock()
+    dedup = DuplicateFilter(dedup_window) if dedup_window else None
+    duplicates = 0
+    objectA = None
+    next_sweep = None
+    sentences = 0
+    decode_time = 0.0
+    collision_time = 0.0
+    start = time.perf_counter()
+
+    for timestamp, source, data in reader.replay(speed=speed, start=replay_start):
+        clock.timestamp = timestamp
+        if source == SOURCE_GPS:
+            MyGPSFix.update(data, received=timestamp)
+            continue
+
+        t0 = time.perf_counter()
+        batch = split_sentences(data)
+        sentences += len(batch)
+        if dedup is not None:
+            unique = [sentence for sentence in batch if not dedup.is_duplicate(sentence, timestamp)]
+            duplicates += len(batch) - len(unique)
+            batch = unique
+        updated = store_sentences(batch, t0)
+        t1 = time.perf_counter()
+
+        if shore_station:
+            if next_sweep is None or timestamp >= next_sweep:
+                all_cpa = pair_sweep(targets)
+                print_sweep(all_cpa)
+                update_warning(all_cpa)
+                print('')
+                next_sweep = timestamp + interval
+        elif next_sweep is None or timestamp >= next_sweep:
+            objectA = get_own_ship(timeout=0)
+            if objectA is not None:
+                all_cpa = collision_sweep(objectA, targets)
+                print_sweep(all_cpa)
+                update_warning(all_cpa)
+                print('')
+                next_sweep = timestamp + interval
+        elif updated and check_updated(updated):
+            give_warning()
+
+        decode_time += t1 - t0
+        collision_time += time.perf_counter() - t1
+
+    elapsed = time.perf_counter() - start
+    reader.close()
+    print(f'Replay finished: {sentences} sentences in {elapsed:.2f} s ({sentences / max(elapsed, 1e-9):.0f} sentences/s); '
+          f'decode and store {decode_time:.2f} s ({sentences / max(decode_time, 1e-9):.0f} sentences/s), '
+          f'collision tests {collision_time:.2f} s; {duplicates} duplicates dropped')
+
+
+class AISProtocol(asyncio.DatagramProtocol):
+    """
+        asyncio datagram protocol for a UDP feed (e.g., SDRangel).
+        Every datagram is decoded and stored right away (duplicates of other feeds are dropped), the mmsi of
+        updated vessels is put into a queue for the collision task.
+    """
+    def __init__(self, updates, feed):
+        self.updates = updates
+        self.feed = feed
+
+    def datagram_received(self, data, addr):
+        received = time.perf_counter()
+        for mmsi in store_sentences(receiver.unique(self.feed, self.feed.handle(data)), received):
+            self.updates.put_nowait(mmsi)
+
+    def error_received(self, exc):
+        print('Socket error: {}'.format(exc))
+
+
+async def async_tcp_reader(feed, updates):
+    """
+    :param feed: TCPReceiver
+    :param updates: asyncio queue with the mmsi of updated vessels
+
+    Receives from a network AIS feed in a worker thread (including reconnects), the sentences are stored in the
+    event loop.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        sentences = await loop.run_in_executor(None, feed.receive, 1.0)
+        for mmsi in store_sentences(receiver.unique(feed, sentences), time.perf_counter()):
+            updates.put_nowait(mmsi)
+
+
+async def async_gps_reader():
+    """
+    Reads the serial gps without blocking the event loop and feeds every line into the own ship fix (MyGPSFix).
+    On Linux the serial port is watched by the event loop, otherwise readline() runs in a worker thread.
+    """
+    global MyGPS
+    loop = asyncio.get_running_loop()
+
+    if platform == 'l':
+        lines = asyncio.Queue()
+        buffer = bytearray()
+        MyGPS.port.timeout = 0          # non-blocking reads
+
+        def on_readable():
+            try:
+                buffer.extend(MyGPS.port.read(MyGPS.port.in_waiting or 1))
             except serial.SerialException as e:
                 print('Device error: {}'.format(e))
-                break
-            except pynmea2.ParseError as e:
-                print('Parse error: {}'.format(e))
-                continue
+                loop.remove_reader(MyGPS.port.fileno())
+                return
+            while b'\n' in buffer:
+                line, _, rest = buffer.partition(b'\n')
+                buffer[:] = rest
+                lines.put_nowait(bytes(line))
+
+        loop.add_reader(MyGPS.port.fileno(), on_readable)
+        read_line = lines.get
+    else:
+        def read_line():
+            return loop.run_in_executor(None, MyGPS.port.readline)
 
+    while True:
+        line = await read_line()
+        MyGPSFix.update(line)
 
-def socket_reader(seconds):
+
+async def async_collision_task(updates, interval):
     """
-    :param seconds: seconds to listen to UDP socket
-    :return: none
+    :param updates: asyncio queue with the mmsi of updated vessels
+    :param interval: seconds between full collision tests
 
-    Function to receive NMEA AIS sentences (!AIVDM/!AIVDO) from SDRAngle via UDP socket.
-    In SDRAnge enable UDP via '127.0.0.1 : 5005' and select Format: 'NMEA'
-    Stores incoming ship data in global dataframe.
+    Checks updated vessels against the latest own ship position as they arrive and all vessels every interval seconds.
+    Warnings run in a worker thread, so a beep on Windows does not stall the receivers.
     """
-    global dataframe
-    global sock
-    t_end = time.time() + seconds
-    supported_msg_types = [1, 2, 3, 18, 19]         # AIS message types that are position reports
+    global all_cpa
+    loop = asyncio.get_running_loop()
+    next_sweep = loop.time()
+
+    while True:
+        if loop.time() >= next_sweep and MyGPSFix.latest() is not None:
+            all_cpa = collision_sweep(get_own_ship(timeout=0), targets)
+            print_sweep(all_cpa)
+            await loop.run_in_executor(None, update_warning, all_cpa)
+            print('')
+            next_sweep = loop.time() + interval
 
-    while time.time() < t_end:                      # run for a defined amount of seconds
         try:
-            # receive AIS NMEA sentences
-            data, address = sock.recvfrom(1024)     # reserve bits for data
-            # print(f'Data: {data}; Address: {address}')
-            msg = data.decode(encoding='latin1').replace("\n", "").replace("\r", "")
-            decoded = decode(msg)           # pyais decode message function
-            data_dict = decoded.asdict()
+            mmsi = await asyncio.wait_for(updates.get(), timeout=max(next_sweep - loop.time(), 0.1))
+        except asyncio.TimeoutError:
+            continue
 
-            df = pd.DataFrame(data_dict, index=[0])
-            df.set_index('mmsi', inplace=True)  # use the Maritime Mobile Service Identity (MMSI) number of the vessel or base station as index
+        # check all vessels that were updated since the last check in one batch
+        updated = {mmsi}
+        while not updates.empty():
+            updated.add(updates.get_nowait())
+        if check_updated(updated):
+            await loop.run_in_executor(None, give_warning)
 
-            if decoded.msg_type in supported_msg_types:
-                # print('Position report class A or class B')
 
-                if not len(dataframe.index) == 0:  # if not dataframe.empty
-                    if decoded.mmsi in dataframe.index:  # check if ship is already in dataframe
-                        # print('Ship is already in database. Delete old ship entry.')
-                        dataframe = dataframe.drop(decoded.mmsi)
+async def run_async(interval):
+    """
+    :param interval: seconds between full collision tests
 
-                dataframe = pd.concat([dataframe, df])  # append dataframe with new ship entry
+    asyncio entry point: the AIS feeds, the serial gps and the collision test run as tasks of one event loop,
+    so all inputs are drained as soon as data arrives.
+    """
+    loop = asyncio.get_running_loop()
+    updates = asyncio.Queue()
+
+    transports = []
+    tasks = [async_gps_reader(), async_collision_task(updates, interval)]
+    for feed in receiver.feeds:
+        if isinstance(feed, UDPReceiver):
+            transport, protocol = await loop.create_datagram_endpoint(lambda feed=feed: AISProtocol(updates, feed),
+                                                                      sock=feed.sock)
+            transports.append(transport)
+        else:
+            tasks.append(async_tcp_reader(feed, updates))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for transport in transports:
+            transport.close()
 
-        except KeyboardInterrupt:
-            # TODO: Windows Socket.recv() does not raise KeyboardInterrupt for SIGINT;
-            #  improve exit handling see https://github.com/codypiersall/pynng/issues/49
-            break
-        except:
-            print('Pyais error. Invalid NMEA message.')
-            continue
+
+def get_own_ship(timeout=None, verbose=True):
+    """
+    :param timeout: seconds to wait for the first gps fix, None waits forever
+    :param verbose: print the own ship position and stale fix warnings
+    :return: own ship as arpaocalc Ship instance with the latest position, speed and course of the gps,
+             None if there is no fix within timeout
+    """
+    global MyGPSFix
+    global own_ship_time
+    fix = MyGPSFix.wait_for_fix(timeout)
+    if fix is None:
+        return None
+    own_ship_time = fix.received
+
+    if verbose:
+        age = MyGPSFix.fix_age(clock())
+        print(f'Own ship position data: {fix._asdict()}; fix age = {age:.1f} s')
+        if MyGPSFix.is_stale(clock()):
+            print(f'Warning: gps fix is stale! Last {fix.source} position is {age:.1f} seconds old '
+                  f'(stale after {MyGPSFix.stale_after} seconds).')
+
+    # Ship(position(latitude and longitude in decimal degrees), Speed in knots, heading in degrees)
+    return Ship((fix.lat, fix.lon), fix.speed, fix.course)
 
 
 def check_collision(cpa, tcpa):
@@ -222,9 +536,201 @@ def check_collision(cpa, tcpa):
         return 0
 
 
+def calculate_cpa(objectA, targets, rows=None):
+    """
+    :param objectA: own ship as arpaocalc Ship instance
+    :param targets: TargetStore with the position reports of other vessels
+    :param rows: row numbers of the vessels to check, all vessels if None
+    :return: dict of arrays 'mmsi', 'cpa' (Nm), 'tcpa' (min) and 'collision' (1 or 0)
+
+    Calculates cpa and tcpa of own ship to the targets at once with ARPA_calculations_batch.
+    With range_gate only vessels within gate_radius of own ship are checked.
+    With dead_reckoning the vessels are moved to the time of the own ship gps fix first.
+    """
+    global min_distance              # minimum distance to other vessels in nautical mile
+
+    candidates = targets.mmsi[rows] if tracer is not None and rows is not None else None
+    if range_gate:
+        # the index holds the reported positions: a vessel may have moved up to gate_speed times the age of the
+        # oldest report since then (e.g., 2 Nm for a class B report of 180 s at 40 kn), so the radius is widened by it
+        rows = targets.within(objectA.position[0], objectA.position[1],
+                              gate_radius(objectA, report_age(targets, rows)), rows=rows)
+
+    columns = targets.view()
+    if rows is not None:
+        columns = {name: column[rows] for name, column in columns.items()}
+    if dead_reckoning and own_ship_time is not None:
+        columns['lat'], columns['lon'] = targets.dead_reckon(own_ship_time, rows)
+
+    # heading: 511 = N/A, otherwise heading: 0 to 359 degrees. NOTE: This is mostly the case! course N/A = 360°
+    # TODO: Program execution when course is also not available? E.g., no collision check?
+    heading = np.where(columns['heading'] == 511, columns['course'], columns['heading'])
+
+    if cpa_cache is None:
+        results = cpa_batch(objectA, columns['lat'], columns['lon'], columns['speed'], heading, columns['turn'])
+    else:
+        # only vessels whose state (or own ship's) changed beyond the tolerances are calculated
+        keys = cpa_cache.key(objectA, columns['lat'], columns['lon'], columns['speed'], heading, columns['turn'])
+        hit, results = cpa_cache.lookup(columns['mmsi'], keys)
+        miss = np.flatnonzero(~hit)
+        if miss.size:
+            calculated = cpa_batch(objectA, columns['lat'][miss], columns['lon'][miss], columns['speed'][miss],
+                                   heading[miss], columns['turn'][miss])
+            for name in ('cpa', 'tcpa', 'sign'):
+                results[name][miss] = calculated[name]
+            cpa_cache.store(columns['mmsi'][miss], keys[miss], calculated['cpa'], calculated['tcpa'],
+                            calculated['sign'])
+
+    # if you also want a warning if a ship is getting close astern your ship, otherwise 0 <= cpa < min_distance
+    collision = (np.abs(results['cpa']) < min_distance).astype(int)
+    for mmsi, tcpa in zip(columns['mmsi'][collision == 1], results['tcpa'][collision == 1]):
+        print('MMSI', mmsi, ': collision detected in ', tcpa, 'minutes.')
+
+    if tracer is not None:
+        tracer.evaluated(columns['mmsi'], collision, candidates)
+
+    return {'mmsi': columns['mmsi'].copy(), 'cpa': results['cpa'], 'tcpa': results['tcpa'], 'collision': collision}
+
+
+def cpa_batch(objectA, lats, lons, speeds, headings, turns):
+    """
+    :param objectA: own ship as arpaocalc Ship instance
+    :return: dict of arrays 'cpa' (Nm), 'tcpa' (min) and 'sign' of the targets, with the method of the settings
+    """
+    # ARPA_calculations_batch returns the CPA (closest point of approach) nautical miles and
+    # TCPA (time to closest point of approach) in minutes for every target
+    if curved_cpa:
+        # minimum separation along the predicted curved paths, straight for vessels that do not turn
+        return ARPA_calculations_curved_batch(objectA, lats, lons, speeds, headings, turns, horizon=curved_horizon,
+                                              step=curved_step)
+    if sweep_pool is not None:
+        # sharded on the worker processes
+        return sweep_pool.calculate(objectA, lats, lons, speeds, headings, flat_range=flat_range if fast_cpa else None)
+    return ARPA_calculations_batch(objectA, lats, lons, speeds, headings, flat_range=flat_range if fast_cpa else None)
+
+
+def gate_radius(objectA, age=0.0):
+    """
+    :param objectA: own ship as arpaocalc Ship instance
+    :param age: seconds since the oldest position report of the checked vessels
+    :return: range in nautical miles around the reported positions from which a vessel at gate_speed can reach
+             min_distance within gate_horizon
+    """
+    return min_distance + (objectA.speed + gate_speed) * gate_horizon / 60.0 + gate_speed * age / 3600.0
+
+
+def report_age(targets, rows=None):
+    """
+    :param targets: TargetStore with the position reports of other vessels
+    :param rows: row numbers of the vessels, all vessels if None
+    :return: seconds from the oldest position report to the own ship fix (to now without dead_reckoning), 0 if none
+    """
+    if rows is None:
+        timestamps = targets.timestamp[:targets.size]
+    else:
+        timestamps = targets.timestamp[np.asarray(rows, dtype=np.intp)]
+    if timestamps.size == 0:
+        return 0.0
+    at = own_ship_time if dead_reckoning and own_ship_time is not None else clock()
+    return max(float(at - timestamps.min()), 0.0)
+
+
+def collision_sweep(objectA, targets):
+    """
+    :param objectA: own ship as arpaocalc Ship instance
+    :param targets: TargetStore with the position reports of other vessels
+    :return: dataframe indexed by mmsi with columns 'cpa (Nm)', 'tcpa (min)' and 'collision'
+
+    Removes vessels without position report within target_ttl first (also from the cpa cache).
+    """
+    import pandas as pd     # imported on first use (see preload)
+
+    start = time.perf_counter()
+    if target_ttl is not None:
+        expired = targets.expire(clock(), target_ttl)
+        if cpa_cache is not None and expired:
+            cpa_cache.remove(expired)
+
+    if len(targets) == 0:
+        sweep = pd.DataFrame(columns=['cpa (Nm)', 'tcpa (min)', 'collision'])
+    else:
+        results = calculate_cpa(objectA, targets)
+        metrics.sweep_seconds.observe(time.perf_counter() - start)
+        sweep = pd.DataFrame({'cpa (Nm)': results['cpa'], 'tcpa (min)': results['tcpa'],
+                              'collision': results['collision']}, index=pd.Index(results['mmsi'], name='mmsi'))
+        if archive is not None:
+            archive.sweep(clock(), objectA, sweep)
+
+    if tracer is not None:
+        tracer.flush()
+    if profiler is not None:
+        profiler.next_cycle()
+    return sweep
+
+
+def pair_sweep(targets):
+    """
+    :param targets: TargetStore with the position reports of the vessels
+    :return: dataframe indexed by mmsi a and mmsi b of the shore_top_k closest pairs with columns 'cpa (Nm)',
+             'tcpa (min)', 'distance (Nm)' and 'collision'
+
+    Shore-station mode: all vessels against each other instead of against own ship (see shore_station.py).
+    Removes vessels without position report within target_ttl first.
+    """
+    import pandas as pd     # imported on first use (see preload)
+    from shore_station import close_pairs
+
+    start = time.perf_counter()
+    if target_ttl is not None:
+        targets.expire(clock(), target_ttl)
+
+    pairs = close_pairs(targets, now=clock() if dead_reckoning else None, k=shore_top_k, max_cpa=shore_max_cpa,
+                        horizon=shore_horizon)
+    metrics.sweep_seconds.observe(time.perf_counter() - start)
+    collision = (pairs['cpa'] < min_distance).astype(int)
+    for mmsi_a, mmsi_b, tcpa in zip(pairs['mmsi_a'][collision == 1], pairs['mmsi_b'][collision == 1],
+                                    pairs['tcpa'][collision == 1]):
+        print('MMSI', mmsi_a, 'and MMSI', mmsi_b, ': collision detected in ', tcpa, 'minutes.')
+    print(f'Shore station: {pairs["candidates"]} candidate pairs of {len(targets)} vessels checked.')
+
+    if profiler is not None:
+        profiler.next_cycle()
+    return pd.DataFrame({'cpa (Nm)': pairs['cpa'], 'tcpa (min)': pairs['tcpa'], 'distance (Nm)': pairs['distance'],
+                         'collision': collision},
+                        index=pd.MultiIndex.from_arrays([pairs['mmsi_a'], pairs['mmsi_b']], names=['mmsi a', 'mmsi b']))
+
+
+def print_sweep(all_cpa):
+    """
+    :param all_cpa: dataframe of collision_sweep
+    :return: none
+    """
+    print(all_cpa)
+    if range_gate and not shore_station:
+        print(f'Range gate: {len(all_cpa.index)} of {len(targets)} vessels within reach in {gate_horizon} minutes.')
+    if target_ttl is not None:
+        print(f'Vessels removed without position report: {targets.evictions}')
+    if cpa_cache is not None:
+        print(f'CPA cache: {cpa_cache.counters()}')
+    if receiver is not None:
+        print(f'Receiver: {receiver.counters()}')
+
+
+def update_warning(all_cpa):
+    """
+    :param all_cpa: dataframe of collision_sweep
+    :return: none
+    """
+    if 1 in all_cpa['collision'].values:
+        give_warning()
+    else:
+        remove_warning()
+
+
 def give_warning():
     global platform
     print('Collision warning!')
+    metrics.collision_warnings.inc()
     if platform == 'l':
         GPIO.output(led_pin, True)  # turn on LED on Raspberry Pi
     elif platform == 'w':
@@ -240,14 +746,15 @@ def remove_warning():
         return
 
 
-def set_min_distance():
-    # Let the user define the minimum distance to other vessels
+def set_min_distance(value=None):
+    # Let the user define the minimum distance to other vessels (in meters, asked if value is None)
     # print('Signal handler called with signal', signum)
     global min_distance
     while True:
-        value = input("Set the minimum allowed distance to other vessels before getting a collision warning."
-                      "\nPlease enter a number in meters:\n")
-        value = value.replace(',', '.')
+        if value is None:
+            value = input("Set the minimum allowed distance to other vessels before getting a collision warning."
+                          "\nPlease enter a number in meters:\n")
+        value = str(value).replace(',', '.')
         try:
             value = float(value)
             min_distance = abs(value) * 5.399568e-4
@@ -256,89 +763,211 @@ def set_min_distance():
         except:
             print(f'Error: Your minimum distance: "{value}" of type {type(value)} is not a valid number. '
                   f'Please try again.')
+            value = None
+
 
+def start_sweep_pool():
+    """
+    Starts the worker processes of the collision test if sweep_processes is set. The workers are forked, so this has
+    to run before any other thread is started (e.g., by preload() or setup()): a fork while another thread holds the
+    import lock can deadlock the workers.
+    """
+    global sweep_pool
+    if sweep_processes and sweep_pool is None:
+        from sweep_pool import SweepPool
+        sweep_pool = SweepPool(sweep_processes)
+        sweep_pool.start()
 
-# connect to gps: adjust path to gps usb device port. For my setup on Windows it's port COM6
-MyGPS = SerialGPS(port, 9600)
 
-# create UDP socket/ server
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-server_address = ('localhost', 5005)                    # define ip address and a port according to settings in SDRangle
-print(f'Starting up on {server_address[0]} port {server_address[1]}')
-sock.bind(server_address)
+def setup():
+    """
+    Opens the gps and the AIS feeds (or the replay file) and starts the optional outputs of the settings above.
+    """
+    global cpa_cache, recorder, MyGPS, MyGPSFix, receiver, tracer, profiler, archive, metrics_server
+
+    # no-op if main() already started the sweep pool before its preload thread
+    start_sweep_pool()
+
+    # opt-in reuse of the cpa of vessels whose situation did not change
+    if cpa_cache_size:
+        from cpa_cache import CPACache
+        cpa_cache = CPACache(cpa_cache_size, position_tolerance=cache_position_tolerance,
+                             speed_tolerance=cache_speed_tolerance, heading_tolerance=cache_heading_tolerance)
+
+    # record AIS datagrams and gps sentences to a capture file
+    recorder = CaptureWriter(record_file) if record_file else None
+
+    if replay_file is None:
+        if not shore_station:
+            # connect to gps: adjust path to gps usb device port. For my setup on Windows it's port COM6
+            MyGPS = SerialGPS(port, 9600)
+            # latest own ship fix, read in a background thread (in asyncio mode fed by async_gps_reader)
+            MyGPSFix = GPSReader(MyGPS.port, stale_after=gps_stale_after, recorder=recorder)
+            if not asyncio_mode:
+                MyGPSFix.start()
+
+        feeds = []
+        for server_address in udp_feeds:
+            # create UDP socket/ server
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            print(f'Starting up on {server_address[0]} port {server_address[1]}')
+            sock.bind(server_address)
+            # non-blocking receiver with large socket buffer, drains all pending datagrams per wakeup
+            feeds.append(UDPReceiver(sock, rcvbuf=udp_receive_buffer, recorder=recorder))
+        for server_address in tcp_feeds:
+            feeds.append(TCPReceiver(server_address, recorder=recorder))
+        # all feeds in one receiver, duplicate sentences are dropped before decoding
+        receiver = FeedMerger(feeds, window=dedup_window)
+    else:
+        # replay: the capture file feeds own ship fix and AIS sentences, no gps and no socket
+        MyGPS = None
+        receiver = None
+        MyGPSFix = GPSReader(None, stale_after=gps_stale_after)
+
+    # opt-in latency trace and per-cycle profiles
+    if trace_file or profile_dir:
+        from tracing import Tracer, CycleProfiler
+        tracer = Tracer(trace_file) if trace_file else None
+        profiler = CycleProfiler(profile_dir) if profile_dir else None
+
+    # opt-in track of every vessel, filled by the target store
+    if track_depth:
+        from track_history import TrackHistory
+        targets.history = TrackHistory(depth=track_depth, max_targets=track_targets)
+
+    # opt-in archive database, written by a background thread
+    if archive_file:
+        from archive import Archive
+        archive = Archive(archive_file)
+        archive.start()
+
+    # metrics of the target store and the feeds are read when scraped
+    metrics.register_store(targets)
+    if receiver is not None:
+        metrics.register_receiver(receiver)
+    if cpa_cache is not None:
+        metrics.register_cache(cpa_cache)
+    metrics_server = metrics.MetricsServer(port=metrics_port) if metrics_port else None
+    if metrics_server is not None:
+        print(f'Metrics on http://localhost:{metrics_port}/metrics')
+        metrics_server.start()
+
+
+def close():
+    """
+    Stops the gps reader and closes everything opened by setup().
+    """
+    if MyGPSFix is not None:
+        MyGPSFix.stop()
+    if MyGPS is not None:
+        MyGPS.port_close()
+    if receiver is not None:
+        receiver.close()
+    if recorder is not None:
+        recorder.close()
+    if sweep_pool is not None:
+        sweep_pool.close()
+    if metrics_server is not None:
+        metrics_server.stop()
+    if tracer is not None:
+        tracer.close()
+    if profiler is not None:
+        profiler.stop()
+    if archive is not None:
+        archive.close()
+    if targets.history is not None and track_file:
+        targets.history.save(track_file)
+        print(f'Tracks of {len(targets.history)} vessels written to {track_file}')
 
 
 def exit_handler(signum, frame):
-    global MyGPS
-    global sock
     print('Exit signal handler called with signal', signum)
-    MyGPS.port_close()
-    sock.close()
+    close()
     sys.exit()
 
 
-# register signal handler 'SIGINT'(Interrupt Signal = CTRL + C, on Windows CTRL + F2) to exit the program
-signal.signal(signal.SIGINT, exit_handler)
-# register signal handler 'SIGBREAK'(Interrupt Signal = CTRL + C, on Windows [FN] +[B]) to change the minimum distance during runtime
-# signal.signal(signal_insert_number, set_min_distance)
+def main(argv=None):
+    """
+    :param argv: command line arguments, sys.argv[1:] if None
+    Runs the collision detection until CTRL + C.
+    """
+    global all_cpa, shore_station
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Collision warnings from AIS position reports and the own ship gps")
+    parser.add_argument("--min-distance", type=float,
+                        help="minimum distance to other vessels in meters, asked at the start if not given")
+    parser.add_argument("--shore-station", action="store_true",
+                        help="no own ship: report the closest approaches between all vessels")
+    args = parser.parse_args(argv)
+    shore_station = shore_station or args.shore_station
+
+    # fork the sweep workers first, the preload thread must not be running during the fork
+    start_sweep_pool()
+    # heavy imports of the decoders and the dataframes run while the user is asked and the inputs are opened
+    preload('pyais', 'pynmea2', 'pandas')
+    setup_platform()
+
+    # register signal handler 'SIGINT'(Interrupt Signal = CTRL + C, on Windows CTRL + F2) to exit the program
+    signal.signal(signal.SIGINT, exit_handler)
+    # register signal handler 'SIGBREAK'(Interrupt Signal = CTRL + C, on Windows [FN] +[B]) to change the minimum distance during runtime
+    # signal.signal(signal_insert_number, set_min_distance)
 
-# create a dataframe to store all closest points of approach
-all_cpa = pd.DataFrame()
+    # Let the user define the minimum distance to other vessels
+    set_min_distance(args.min_distance)
+    startup_phase('min_distance')
 
-# Let the user define the minimum distance to other vessels
-set_min_distance()
+    setup()
+    startup_phase('setup')
 
-try:
+    if profiler is not None:
+        profiler.start()
 
-    while True:
-        # receive AIS messages
-        print(f'Collecting ship position reports for {seconds_to_listen} seconds.')
-        socket_reader(seconds_to_listen)
+    try:
 
-        # get own ship position from serial gps
-        pos_GPS = MyGPS.serial_reader()
-        print(f'Own ship position data: {pos_GPS}')
+        if replay_file is not None:
+            replay_reader(replay_file, replay_speed, sweep_interval)
+            exit_handler(None, None)
 
-        # Ship(position(longitude and latitude in decimal degrees), Speed in knots, heading in degrees)
-        objectA = Ship((pos_GPS['lon'], pos_GPS['lat']), pos_GPS['speed'], pos_GPS['course'])
+        if shore_station:
+            while True:
+                print(f'Collecting ship position reports for {seconds_to_listen} seconds.')
+                socket_reader(seconds_to_listen)
+                all_cpa = pair_sweep(targets)
+                print_sweep(all_cpa)
+                update_warning(all_cpa)
+                print('')
 
-        for i, row in dataframe.iterrows():     # for each vessel in the dataframe check collision
-            print('MMSI', i, ';', 'lat =', row['lat'], ';', 'lon =', row['lon'], ';', 'accuracy =', row['accuracy'], ';'
-                  , 'speed =', row['speed'], ';', 'course =', row['course'], ';', 'heading =', row['heading'])
+        if asyncio_mode:
+            print(f'Running asyncio event loop, full collision test every {sweep_interval} seconds.')
+            asyncio.run(run_async(sweep_interval))
 
-            if (row['heading'] == 511):     # hading: 511 = N/A, otherwise heading: 0 to 359 degrees
-                heading = row['course']     # NOTE: This is mostly the case! course N/A = 360°
-                # TODO: Program execution when course is also not available? E.g., no collision check?
-                # print('heading not available, set heading to course =', row['course'])
-            else:
-                heading = row['heading']
+        if streaming_mode:
+            print(f'Streaming ship position reports, full collision test every {sweep_interval} seconds.')
+            stream_reader(sweep_interval)
 
-            objectB = Ship((row['lon'], row['lat']), row['speed'], heading)
+        while True:
+            # receive AIS messages
+            print(f'Collecting ship position reports for {seconds_to_listen} seconds.')
+            socket_reader(seconds_to_listen)
 
-            # ARPA_calculations returns the CPA (closest point of approach) nautical miles and
-            # TCPA (time to closest point of approach) in minutes
-            results = ARPA_calculations(objectA, objectB)
+            objectA = get_own_ship()
 
-            collision = check_collision(results['cpa'], results['tcpa'])
+            # store all closest points of approach
+            all_cpa = collision_sweep(objectA, targets)
 
-            row_data = {'cpa (Nm)': results['cpa'], 'tcpa (min)': results['tcpa'], 'collision': collision}
+            print_sweep(all_cpa)
 
-            if (len(all_cpa.index) != 0) and (i in all_cpa.index):     # check if the ship already exists in dataframe
-                all_cpa.loc[i] = row_data
-                # print('Vessel entry already exists. Values updated.')
-            else:
-                row_dataframe = pd.DataFrame(data=row_data, columns=['cpa (Nm)', 'tcpa (min)', 'collision'], index=[i])
-                all_cpa = pd.concat([all_cpa, row_dataframe])  # append dataframe with new ship entry
+            update_warning(all_cpa)
 
-        print(all_cpa)
+            print('')
+
+    except KeyboardInterrupt:
+        print('KeyboardInterrupt. Program exit.')
+        exit_handler(None, None)
 
-        if 1 in all_cpa.collision.values:
-            give_warning()
-        else:
-            remove_warning()
 
-        print('')
+startup_phase('import')
 
-except KeyboardInterrupt:
-    print('KeyboardInterrupt. Program exit.')
-    exit_handler(None, None)
+if __name__ == "__main__":
+    main()
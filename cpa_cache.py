@@ -0,0 +1,138 @@
+import numpy as np
+
+"""
+     Cache of the cpa/tcpa of every vessel, so a full collision test only recalculates vessels whose situation changed.
+
+     The key of a result is the quantized state of the vessel and of own ship when it was calculated: position in
+     steps of position_tolerance nautical miles, speed in steps of speed_tolerance knots, heading in steps of
+     heading_tolerance degrees and rate of turn in steps of turn_tolerance degrees per minute. A vessel that sent no
+     new report (or the same report again) while own ship kept its course and speed within the tolerances gets its
+     previous result back; all others are calculated and stored.
+
+     Entries are kept in NumPy arrays sorted by MMSI, so a whole sweep is looked up and stored at once
+     (np.searchsorted) instead of one dict lookup per vessel. When more than max_size vessels are cached, the
+     entries used longest ago are removed (LRU).
+"""
+
+key_fields = ('own_lat', 'own_lon', 'own_speed', 'own_heading', 'lat', 'lon', 'speed', 'heading', 'turn')
+
+
+class CPACache:
+    """
+        LRU cache of cpa, tcpa and sign per MMSI, keyed by the quantized state of own ship and vessel.
+        E.g., hit, results = cache.lookup(mmsi, key); ...calculate ~hit...; cache.store(mmsi[~hit], key[~hit], ...)
+    """
+    def __init__(self, max_size=4096, position_tolerance=0.01, speed_tolerance=0.1, heading_tolerance=1.0,
+                 turn_tolerance=1.0):
+        """
+        :param max_size: vessels kept in the cache
+        :param position_tolerance: nautical miles (0.01 Nm = 18.5 m)
+        :param speed_tolerance: knots
+        :param heading_tolerance: degrees
+        :param turn_tolerance: degrees per minute
+        """
+        self.max_size = max_size
+        # steps of lat, lon (degrees), speed, heading, in the order of key_fields
+        position_step = position_tolerance / 60.0
+        self.steps = np.array([position_step, position_step, speed_tolerance, heading_tolerance] * 2 +
+                              [turn_tolerance])
+        self.mmsi = np.zeros(0, dtype=np.int64)
+        self.keys = np.zeros((0, len(key_fields)), dtype=np.int64)
+        self.cpa = np.zeros(0)
+        self.tcpa = np.zeros(0)
+        self.sign = np.zeros(0, dtype=np.int8)
+        self.used = np.zeros(0, dtype=np.int64)         # sweep number of the last lookup or store
+        self.sweep = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.mmsi)
+
+    def key(self, objectA, lats, lons, speeds, headings, turns):
+        """
+        :param objectA: own ship as arpaocalc Ship instance
+        :return: int64 array (vessels x key_fields) of the quantized states
+        """
+        own = np.array([objectA.position[0], objectA.position[1], objectA.speed, objectA.heading], dtype=float)
+        state = np.column_stack([np.broadcast_to(own, (len(lats), 4)), lats, lons, speeds, headings, turns])
+        return np.floor(state / self.steps).astype(np.int64)
+
+    def find(self, mmsi):
+        """
+        :return: array of the cache positions of the vessels, -1 if not cached
+        """
+        position = np.searchsorted(self.mmsi, mmsi)
+        found = position < len(self.mmsi)
+        found[found] = self.mmsi[position[found]] == mmsi[found]
+        return np.where(found, position, -1)
+
+    def lookup(self, mmsi, keys):
+        """
+        :param mmsi: array of mmsi of the vessels
+        :param keys: quantized states of the vessels (key())
+        :return: boolean array hit per vessel and dict of arrays 'cpa', 'tcpa', 'sign' (valid where hit)
+        """
+        self.sweep += 1
+        mmsi = np.asarray(mmsi, dtype=np.int64)
+        position = self.find(mmsi)
+        hit = position >= 0
+        hit[hit] = (self.keys[position[hit]] == keys[hit]).all(axis=1)
+        cached = position[hit]
+        self.used[cached] = self.sweep
+
+        results = {'cpa': np.zeros(len(mmsi)), 'tcpa': np.zeros(len(mmsi)), 'sign': np.ones(len(mmsi), dtype=np.int8)}
+        results['cpa'][hit] = self.cpa[cached]
+        results['tcpa'][hit] = self.tcpa[cached]
+        results['sign'][hit] = self.sign[cached]
+        self.hits += int(hit.sum())
+        self.misses += len(mmsi) - int(hit.sum())
+        return hit, results
+
+    def store(self, mmsi, keys, cpa, tcpa, sign):
+        """
+        Stores (or replaces) the results of the vessels, then removes the least recently used beyond max_size.
+        """
+        mmsi = np.asarray(mmsi, dtype=np.int64)
+        position = self.find(mmsi)
+        known = position >= 0
+        updated = position[known]
+        self.keys[updated] = keys[known]
+        self.cpa[updated] = cpa[known]
+        self.tcpa[updated] = tcpa[known]
+        self.sign[updated] = sign[known]
+        self.used[updated] = self.sweep
+
+        new = ~known
+        if new.any():
+            mmsi_new, first = np.unique(mmsi[new], return_index=True)
+            new = np.flatnonzero(new)[first]
+            self.mmsi = np.concatenate([self.mmsi, mmsi_new])
+            self.keys = np.concatenate([self.keys, keys[new]])
+            self.cpa = np.concatenate([self.cpa, cpa[new]])
+            self.tcpa = np.concatenate([self.tcpa, tcpa[new]])
+            self.sign = np.concatenate([self.sign, sign[new]])
+            self.used = np.concatenate([self.used, np.full(len(new), self.sweep)])
+
+            keep = np.arange(len(self.mmsi))
+            if len(keep) > self.max_size:
+                keep = np.argpartition(-self.used, self.max_size - 1)[:self.max_size]
+                self.evictions += len(self.mmsi) - self.max_size
+            self.select(keep[np.argsort(self.mmsi[keep])])
+
+    def remove(self, mmsi):
+        """
+        :param mmsi: array of mmsi of vessels to drop (e.g., expired from the target store)
+        """
+        position = self.find(np.asarray(mmsi, dtype=np.int64))
+        keep = np.ones(len(self.mmsi), dtype=bool)
+        keep[position[position >= 0]] = False
+        self.select(np.flatnonzero(keep))
+
+    def select(self, positions):
+        for name in ('mmsi', 'keys', 'cpa', 'tcpa', 'sign', 'used'):
+            setattr(self, name, getattr(self, name)[positions])
+
+    def counters(self):
+        return {'size': len(self), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
@@ -0,0 +1,276 @@
+import serial       # install pyserial
+import threading
+import time
+from collections import namedtuple
+
+from capture import SOURCE_GPS
+
+"""
+     Own ship position from a serial gps device (NMEA 0183 sentences decoded with pynmea2).
+
+     SerialGPS.serial_reader() blocks until the next $GNRMC sentence.
+     GPSReader reads the serial port in a background thread and keeps the latest fix, so the collision
+     check never waits for the gps:
+          RMC (Recommended Minimum Specific GNSS Data): position, speed and course
+          GGA (Global Positioning System Fix Data): position, used as fallback if no RMC is received
+          VTG (Course Over Ground and Ground Speed): speed and course, used as fallback if no RMC is received
+     Every fix carries its receive time, a fix older than stale_after seconds is reported as stale.
+     pynmea2 is imported with the first sentence.
+"""
+
+# latest own ship fix: position in decimal degrees, speed in knots, course in degrees,
+# source sentence type and receive time of the position in seconds since the epoch
+OwnShipFix = namedtuple('OwnShipFix', ['lat', 'lon', 'speed', 'course', 'source', 'received'])
+
+
+def convert_pos_to_dd(lat, lat_dir, lon, lon_dir):
+    """
+    :param lat: has the format 'DDMM.MMMMM' string
+    :param lat_dir: 'N' or 'S' (North/South)
+    :param lon: has the format 'DDDMM.MMMMM' string
+    :param lon_dir: 'E' or 'W' (East/West)
+    :return: lat, lon in decimal degrees using the formula: decimal = degrees + minutes / 60.0 + seconds / 3600.0
+    """
+
+    direction = {'N': 1, 'S': -1, 'E': 1, 'W': -1}
+    try:
+        lat_degrees = int(lat[:2])
+        lat_minutes = float(lat[2:])
+
+        lat_decimal = (lat_degrees + lat_minutes / 60.0) * direction[lat_dir]
+        lat_decimal = round(lat_decimal, 5)
+
+        lon_degrees = int(lon[:3])
+        lon_minutes = float(lon[3:])
+
+        lon_decimal = (lon_degrees + lon_minutes / 60.0) * direction[lon_dir]
+        lon_decimal = round(lon_decimal, 5)
+
+        # print(f' lat_decimal: {lat_decimal}, lon_decimal: {lon_decimal}')
+
+        return lat_decimal, lon_decimal
+
+    except:
+        print(f'Arguments (lat: {lat} of type {type(lat)} and lon: {lon}) of type {type(lon)} are not valid.')
+        print(f'Arguments (lon_dir: {lat_dir} of type {type(lat_dir)} and lon: {lon_dir}) of type {type(lon_dir)}')
+        return None, None
+
+
+class SerialGPS:
+    """
+        Serial GPS class. To connect to usb device find out the port and baud rate of your device.
+        My gps device: NL-8012U (NaviLock)
+        E.g., port path: '/dev/ttyUSB0' on Linux or 'COM6' on Windows
+        E.g., typical baud rates: 75, 110, 300, 1200, 2400, 4800, 9600, 19200, 38400, 57600 and 115200 bit/s
+    """
+    def __init__(self, port, baudrate):
+        self.port = serial.Serial(port, baudrate)
+        if not self.port.isOpen():
+            self.port.open()
+
+    def port_open(self):
+        if not self.port.isOpen():
+            self.port.open()
+            print('Serial port is open.')
+
+    def port_close(self):
+        self.port.close()
+        print('Serial port is closed.')
+
+    def serial_reader(self):
+        import pynmea2      # imported on first use
+
+        while True:
+            try:
+                data = self.port.readline()
+                pos_GPS = self.parse_sentence(data)
+                if pos_GPS is not None:
+                    return pos_GPS
+
+            except serial.SerialException as e:
+                print('Device error: {}'.format(e))
+                break
+            except pynmea2.ParseError as e:
+                print('Parse error: {}'.format(e))
+                continue
+
+    @staticmethod
+    def parse_sentence(data):
+        """
+        :param data: one line read from the serial gps
+        :return: dict with lat, lon, speed and course of a valid $GNRMC sentence, otherwise None
+        """
+        import pynmea2      # imported on first use
+
+        msg = data.decode(encoding='latin1').replace("\n", "").replace("\r", "")
+        if (msg.startswith("$GNRMC")):
+            gnrmc = pynmea2.parse(msg)
+            # print(repr(gnrmc))
+
+            if gnrmc.spd_over_grnd is None:               # if speed is not defined set speed to zero
+                speed = 0.0000
+            else:
+                speed = float(gnrmc.spd_over_grnd)      # TODO: serial gps speed is greater 0.1 without moving
+
+            if gnrmc.true_course is None:                 # if course is not defined set course to zero
+                course = 0.0000
+            else:
+                course = float(gnrmc.true_course)
+
+            lat, lon = convert_pos_to_dd(gnrmc.lat, gnrmc.lat_dir, gnrmc.lon, gnrmc.lon_dir)
+
+            if lat is None:
+                print(f'Input lat = {gnrmc.lat}; lon = {gnrmc.lon} are not valid for convert_pos_to_dd()')
+            else:
+                return {'lat': lat, 'lon': lon, 'speed': speed, 'course': course}
+        return None
+
+
+class GPSReader(threading.Thread):
+    """
+        Background gps reader. Keeps the latest own ship fix of a serial port.
+        E.g., reader = GPSReader(SerialGPS('/dev/ttyACM0', 9600).port); reader.start(); fix = reader.latest()
+        update() can also be fed with lines from another reader (e.g., the asyncio runtime) without starting the thread.
+    """
+    sentence_types = ('RMC', 'GGA', 'VTG')
+
+    def __init__(self, port, stale_after=5.0, fallback_after=2.0, recorder=None):
+        """
+        :param port: open serial port (pyserial Serial) of the gps, None if only fed by update()
+        :param stale_after: seconds after which a fix is reported as stale
+        :param fallback_after: seconds without RMC sentence before GGA/VTG sentences are used
+        :param recorder: optional capture.CaptureWriter, every line is recorded
+        """
+        super().__init__(name='GPSReader', daemon=True)
+        self.port = port
+        self.stale_after = stale_after
+        self.fallback_after = fallback_after
+        self.recorder = recorder
+        self.lock = threading.Lock()
+        self.first_fix = threading.Event()
+        self.stop_event = threading.Event()
+        self.fix = None
+        self.last_rmc = None
+        self.sentences = 0
+        self.parse_errors = 0
+
+    def run(self):
+        self.port.timeout = 1.0     # wake up regularly to check stop()
+        while not self.stop_event.is_set():
+            try:
+                data = self.port.readline()
+            except serial.SerialException as e:
+                print('Device error: {}'.format(e))
+                break
+            if data:
+                self.update(data)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def update(self, data, received=None):
+        """
+        :param data: one line read from the serial gps
+        :param received: receive time in seconds since the epoch, now if None
+        :return: updated fix or None if the line did not change the fix
+        """
+        if received is None:
+            received = time.time()
+        if self.recorder is not None:
+            self.recorder.write(SOURCE_GPS, data, received)
+
+        msg = data.decode(encoding='latin1').replace("\n", "").replace("\r", "")
+        sentence_type = msg[3:6]        # e.g., '$GNRMC' -> 'RMC', any talker (GP, GN, GL, ...)
+        if not msg.startswith('$') or sentence_type not in self.sentence_types:
+            return None
+
+        import pynmea2      # imported on first use
+
+        try:
+            sentence = pynmea2.parse(msg)
+        except pynmea2.ParseError as e:
+            print('Parse error: {}'.format(e))
+            self.parse_errors += 1
+            return None
+
+        self.sentences += 1
+
+        with self.lock:
+            if sentence_type == 'RMC':
+                fix = self.parse_rmc(sentence, received)
+                if fix is not None:
+                    self.last_rmc = received
+            elif self.last_rmc is not None and received - self.last_rmc < self.fallback_after:
+                return None             # RMC is received, GGA and VTG are only fallbacks
+            elif sentence_type == 'GGA':
+                fix = self.parse_gga(sentence, received)
+            else:
+                fix = self.parse_vtg(sentence)
+
+            if fix is None:
+                return None
+            self.fix = fix              # replace the whole record, readers never see a half updated fix
+
+        self.first_fix.set()
+        return fix
+
+    def parse_rmc(self, rmc, received):
+        if rmc.status != 'A':           # A = valid, V = void
+            return None
+
+        lat, lon = convert_pos_to_dd(rmc.lat, rmc.lat_dir, rmc.lon, rmc.lon_dir)
+        if lat is None:
+            return None
+
+        speed = 0.0 if rmc.spd_over_grnd is None else float(rmc.spd_over_grnd)  # if not defined set to zero
+        course = 0.0 if rmc.true_course is None else float(rmc.true_course)
+        return OwnShipFix(lat, lon, speed, course, 'RMC', received)
+
+    def parse_gga(self, gga, received):
+        if not gga.gps_qual:            # 0 = fix not available
+            return None
+
+        lat, lon = convert_pos_to_dd(gga.lat, gga.lat_dir, gga.lon, gga.lon_dir)
+        if lat is None:
+            return None
+
+        # GGA has no speed and course, keep the last known values
+        speed = 0.0 if self.fix is None else self.fix.speed
+        course = 0.0 if self.fix is None else self.fix.course
+        return OwnShipFix(lat, lon, speed, course, 'GGA', received)
+
+    def parse_vtg(self, vtg):
+        if self.fix is None:            # VTG has no position
+            return None
+
+        speed = 0.0 if vtg.spd_over_grnd_kts is None else float(vtg.spd_over_grnd_kts)
+        course = 0.0 if vtg.true_track is None else float(vtg.true_track)
+        # the receive time stays the time of the position
+        return self.fix._replace(speed=speed, course=course)
+
+    def latest(self):
+        """
+        :return: latest OwnShipFix or None if there was no valid fix yet
+        """
+        return self.fix
+
+    def wait_for_fix(self, timeout=None):
+        """
+        :param timeout: seconds to wait for the first fix, None waits forever
+        :return: latest OwnShipFix or None if there is no fix within timeout
+        """
+        self.first_fix.wait(timeout)
+        return self.fix
+
+    def fix_age(self, now=None):
+        """
+        :return: age of the latest fix in seconds or None if there was no fix yet
+        """
+        fix = self.fix
+        if fix is None:
+            return None
+        return (time.time() if now is None else now) - fix.received
+
+    def is_stale(self, now=None):
+        age = self.fix_age(now)
+        return age is None or age > self.stale_after
@@ -0,0 +1,283 @@
+import bisect
+import threading
+
+"""
+     Counters, gauges and latency histograms of the receive, decode and collision stages, exposed in the
+     Prometheus text format (https://prometheus.io/docs/instrumenting/exposition_formats/) on a local HTTP port.
+
+     The stage metrics below are updated by collision_detection.py. Values that other objects already count
+     (e.g., feed counters of the receiver, vessels in the target store) are registered with a function and read
+     when the metrics are scraped.
+
+     E.g., MetricsServer(port=9108).start(), then: curl http://localhost:9108/metrics
+     http.server is imported by MetricsServer only, so the stage metrics do not slow down the start.
+"""
+
+latency_buckets = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)      # seconds
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=''):
+    labels = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+        Base class of the metrics, values are kept per tuple of label values.
+    """
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=(), function=None):
+        """
+        :param name: metric name, e.g., 'ais_decode_failures_total'
+        :param help: description
+        :param labels: label names, e.g., ('cause',)
+        :param function: optional function that returns the value (or a dict of label values tuple -> value)
+                         when the metrics are scraped
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.function = function
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def samples(self):
+        """
+        :return: list of (name, label values, value)
+        """
+        if self.function is not None:
+            value = self.function()
+            if value is None:
+                return []
+            items = value.items() if isinstance(value, dict) else [((), value)]
+        else:
+            with self.lock:
+                items = list(self.values.items())
+        return [(self.name, key, value) for key, value in items if value is not None]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for name, key, value in self.samples():
+            lines.append(f'{name}{format_labels(self.labels, key)} {format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    """
+        Monotonic counter. E.g., decode_failures.inc(cause='InvalidNMEAMessageException')
+    """
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+        Value that can go up and down. E.g., Gauge('ais_targets', 'Vessels in the target store', function=len_targets)
+    """
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    """
+        Histogram with fixed buckets. E.g., sweep_seconds.observe(0.012)
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=latency_buckets):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]    # counts, sum, count
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self.lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items()]
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append((self.name + '_bucket', key, cumulative, f'le="{format_value(float(bound))}"'))
+            samples.append((self.name + '_sum', key, total, ''))
+            samples.append((self.name + '_count', key, count, ''))
+        return samples
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for name, key, value, extra in self.samples():
+            lines.append(f'{name}{format_labels(self.labels, key, extra)} {format_value(value)}')
+        return lines
+
+
+class Registry:
+    """
+        Collection of metrics, rendered together in the Prometheus text format.
+    """
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric         # a metric with the same name is replaced
+        return metric
+
+    def counter(self, name, help, labels=(), function=None):
+        return self.register(Counter(name, help, labels, function))
+
+    def gauge(self, name, help, labels=(), function=None):
+        return self.register(Gauge(name, help, labels, function))
+
+    def histogram(self, name, help, labels=(), buckets=latency_buckets):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print('Metric {} failed: {}'.format(metric.name, e))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# stage metrics
+position_reports = registry.counter('ais_position_reports_total', 'Position reports stored in the target store')
+decode_failures = registry.counter('ais_decode_failures_total', 'AIS sentences that could not be decoded, by cause',
+                                   ('cause',))
+unsupported_messages = registry.counter('ais_unsupported_messages_total',
+                                        'Decoded AIS messages that are not position reports, by message type',
+                                        ('msg_type',))
+receive_to_decode = registry.histogram('ais_receive_to_decode_seconds',
+                                       'Time from receiving a datagram to the decoded sentence')
+decode_to_store = registry.histogram('ais_decode_to_store_seconds',
+                                     'Time from the decoded sentence to the updated target store')
+sweep_seconds = registry.histogram('ais_collision_sweep_seconds', 'Duration of a full collision test')
+collision_warnings = registry.counter('ais_collision_warnings_total', 'Collision warnings given')
+startup_seconds = registry.gauge('ais_startup_seconds', 'Seconds from the start of the program to a startup phase',
+                                 ('phase',))
+
+
+def register_store(targets, registry=registry):
+    """
+    :param targets: TargetStore
+    """
+    registry.gauge('ais_targets', 'Vessels in the target store', function=lambda: len(targets))
+    registry.counter('ais_target_evictions_total', 'Vessels removed without position report',
+                     function=lambda: targets.evictions)
+
+
+def register_cache(cache, registry=registry):
+    """
+    :param cache: cpa_cache.CPACache
+    """
+    registry.gauge('ais_cpa_cache_size', 'Vessels in the cpa cache', function=lambda: len(cache))
+    registry.counter('ais_cpa_cache_hits_total', 'Vessels whose cached cpa was reused', function=lambda: cache.hits)
+    registry.counter('ais_cpa_cache_misses_total', 'Vessels whose cpa was calculated', function=lambda: cache.misses)
+    registry.counter('ais_cpa_cache_evictions_total', 'Least recently used vessels removed from the cpa cache',
+                     function=lambda: cache.evictions)
+
+
+def register_receiver(receiver, registry=registry):
+    """
+    :param receiver: ais_receiver.FeedMerger
+    """
+    def feed_counter(*names):
+        def function():
+            feeds = receiver.counters()['feeds']
+            values = {}
+            for feed, counters in feeds.items():
+                value = next((counters[name] for name in names if name in counters), None)
+                if value is not None:
+                    values[(feed,)] = value
+            return values
+        return function
+
+    registry.counter('ais_datagrams_total', 'Datagrams (UDP) or reads (TCP) received, by feed', ('feed',),
+                     function=feed_counter('datagrams', 'reads'))
+    registry.counter('ais_received_bytes_total', 'Bytes received, by feed', ('feed',), function=feed_counter('bytes'))
+    registry.counter('ais_received_sentences_total', 'Sentences received, by feed', ('feed',),
+                     function=feed_counter('sentences'))
+    registry.counter('ais_duplicate_sentences_total', 'Sentences dropped as duplicates, by feed', ('feed',),
+                     function=feed_counter('duplicates'))
+    registry.counter('ais_kernel_drops_total', 'Datagrams dropped by the kernel because the socket buffer was full',
+                     ('feed',), function=feed_counter('kernel_drops'))
+
+
+class MetricsHandler:
+    """
+        Request handler methods, combined with http.server.BaseHTTPRequestHandler by MetricsServer.
+    """
+    registry = registry
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass                                    # no line per scrape
+
+
+class MetricsServer(threading.Thread):
+    """
+        HTTP server for the metrics in a background thread.
+        E.g., server = MetricsServer(port=9108); server.start(); ...; server.stop()
+    """
+    def __init__(self, port=9108, address='127.0.0.1', registry=registry):
+        """
+        :param port: HTTP port
+        :param address: address to listen on, '0.0.0.0' to allow scrapes from other machines
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        super().__init__(name='MetricsServer', daemon=True)
+        handler = type('Handler', (MetricsHandler, BaseHTTPRequestHandler), {'registry': registry})
+        self.server = ThreadingHTTPServer((address, port), handler)
+        self.server.daemon_threads = True
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
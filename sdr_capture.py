@@ -0,0 +1,359 @@
+import os
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+"""
+     Gapless IQ capture of an RTL-SDR into a ring buffer in shared memory.
+
+     SDRCapture reads the dongle with the asynchronous interface of pyrtlsdr (read_bytes_async): librtlsdr keeps
+     several USB transfers in flight and calls back with a view of each filled buffer, which is copied once into the
+     ring buffer. Nothing is allocated per block, and there are no gaps between reads as long as the callback keeps up.
+
+     IQRingBuffer holds the raw uint8 I/Q bytes (rtl_sdr format) in a multiprocessing.shared_memory block with a small
+     header (bytes written, capacity), so consumers in other threads or processes (IQRingBuffer(name=...,
+     create=False)) read blocks as NumPy views of the shared memory, without copies. Every consumer has its own RingReader; a consumer
+     that falls behind by more than the capacity is moved to the oldest data still in the buffer and counts the
+     overrun and the lost bytes.
+
+     FilePlayback feeds a raw .cu8 file into the ring buffer at the sample rate (or faster), RingRecorder writes the
+     ring buffer to a .cu8 file, so everything downstream can be tested without a dongle.
+
+     E.g., python sdr_capture.py --record run.cu8 --seconds 60    (dongle to file)
+           python sdr_capture.py --play run.cu8 --demodulate      (file through the ring buffer into ais_demodulator)
+"""
+
+header_dtype = np.dtype([('written', '<u8'), ('capacity', '<u8')])
+header_size = 64
+
+
+class IQRingBuffer:
+    """
+        Single producer ring buffer of raw I/Q bytes in shared memory.
+        E.g., ring = IQRingBuffer(capacity=32 * 1024 * 1024); reader = ring.reader(); block = reader.read(262144)
+              in another process: ring = IQRingBuffer(name=ring.name, create=False)
+    """
+    def __init__(self, capacity=32 * 1024 * 1024, name=None, create=True):
+        """
+        :param capacity: bytes of I/Q data (2 bytes per sample, e.g., 32 MiB = 8 s at 2.048 MS/s), rounded to even
+        :param name: name of the shared memory block, a generated name if None
+        :param create: False: attach to an existing ring buffer of that name (capacity is read from its header)
+        """
+        if create:
+            capacity -= capacity % 2
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=header_size + capacity)
+        elif sys.version_info >= (3, 13):
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if os.name == 'posix':
+                # attaching registers the block with the resource tracker of this process, which would unlink it
+                # when this consumer exits; only the creator removes it
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.owner = create
+        self.header = np.ndarray(1, dtype=header_dtype, buffer=self.shm.buf)
+        if create:
+            self.header['written'] = 0
+            self.header['capacity'] = capacity
+        self.capacity = int(self.header['capacity'][0])
+        self.data = np.ndarray(self.capacity, dtype=np.uint8, buffer=self.shm.buf, offset=header_size)
+        self.blocks = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def written(self):
+        """
+        :return: bytes written since the start (the write position is written % capacity)
+        """
+        return int(self.header['written'][0])
+
+    def write(self, block):
+        """
+        :param block: uint8 array (or buffer) of I/Q bytes, at most capacity bytes
+        """
+        block = np.frombuffer(block, dtype=np.uint8)
+        written = self.written
+        position = written % self.capacity
+        first = min(len(block), self.capacity - position)
+        self.data[position:position + first] = block[:first]
+        self.data[:len(block) - first] = block[first:]
+        self.header['written'] = written + len(block)           # published after the copy
+        self.blocks += 1
+
+    def reader(self, oldest=False):
+        """
+        :param oldest: start with the oldest data in the buffer instead of new data
+        """
+        return RingReader(self, oldest)
+
+    def close(self):
+        """
+        Detaches from the shared memory, the creator also removes it.
+        """
+        self.header = None
+        self.data = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class RingReader:
+    """
+        Read position of one consumer of an IQRingBuffer.
+    """
+    def __init__(self, ring, oldest=False):
+        self.ring = ring
+        written = ring.written
+        self.position = max(written - ring.capacity, 0) if oldest else written
+        self.block_start = self.position
+        self.bytes = 0
+        self.overruns = 0
+        self.lost_bytes = 0
+
+    def available(self):
+        return self.ring.written - self.position
+
+    def read(self, max_bytes=262144, timeout=None, poll=0.001):
+        """
+        :param max_bytes: maximum size of the block (even)
+        :param timeout: seconds to wait for data, None waits forever
+        :param poll: seconds between checks for new data
+        :return: uint8 view of the next contiguous block in the ring buffer (valid until the producer wraps around,
+                 see intact()), None if no data arrived within timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            written = self.ring.written
+            if written > self.position:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+
+        capacity = self.ring.capacity
+        if written - self.position > capacity:
+            # overrun: the producer has overwritten data this consumer did not read yet
+            skip = written - capacity - self.position
+            skip += skip % 2                                    # keep I/Q pairs aligned
+            self.overruns += 1
+            self.lost_bytes += skip
+            self.position += skip
+
+        start = self.position % capacity
+        count = min(written - self.position, capacity - start, max_bytes - max_bytes % 2)
+        count -= count % 2
+        self.block_start = self.position
+        self.position += count
+        self.bytes += count
+        return self.ring.data[start:start + count]
+
+    def intact(self):
+        """
+        :return: False if the producer overwrote the last block while it was used
+        """
+        intact = self.ring.written - self.block_start <= self.ring.capacity
+        if not intact:
+            self.overruns += 1
+        return intact
+
+    def counters(self):
+        return {'bytes': self.bytes, 'lag': self.available(), 'overruns': self.overruns,
+                'lost_bytes': self.lost_bytes}
+
+
+class SDRCapture(threading.Thread):
+    """
+        Asynchronous capture of an RTL-SDR into an IQRingBuffer (needs pyrtlsdr).
+        E.g., capture = SDRCapture(ring); capture.start(); ...; capture.stop()
+    """
+    def __init__(self, ring, sample_rate=2.048e6, center_freq=162.0e6, freq_correction=60, gain='auto',
+                 block_size=256 * 1024, device_index=0):
+        """
+        :param ring: IQRingBuffer
+        :param block_size: bytes per USB transfer and callback (multiple of 512)
+        """
+        super().__init__(name='SDRCapture', daemon=True)
+        from rtlsdr import RtlSdr       # only needed for a dongle
+
+        self.ring = ring
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.sdr = RtlSdr(device_index)
+        # configure device
+        self.sdr.sample_rate = sample_rate
+        self.sdr.center_freq = center_freq
+        self.sdr.freq_correction = freq_correction
+        self.sdr.gain = gain
+        self.callbacks = 0
+        self.late = 0                       # callbacks more than two blocks after the previous one (possible gap)
+        self.last_callback = None
+        self.error = None
+
+    def on_bytes(self, values, context):
+        now = time.perf_counter()
+        if self.last_callback is not None and now - self.last_callback > 2 * self.block_size / 2 / self.sample_rate:
+            self.late += 1
+        self.last_callback = now
+        self.callbacks += 1
+        self.ring.write(values)             # ctypes view of the librtlsdr buffer, one copy into the ring buffer
+
+    def run(self):
+        try:
+            self.sdr.read_bytes_async(self.on_bytes, self.block_size)
+        except Exception as e:
+            self.error = e
+            print('SDR error: {}'.format(e))
+
+    def stop(self):
+        self.sdr.cancel_read_async()
+        if self.is_alive():
+            self.join(timeout=2.0)
+        self.sdr.close()
+
+    def counters(self):
+        return {'callbacks': self.callbacks, 'late': self.late, 'bytes': self.ring.written}
+
+
+class FilePlayback(threading.Thread):
+    """
+        Plays a raw .cu8 file (rtl_sdr uint8 I/Q) into an IQRingBuffer, in place of SDRCapture.
+        E.g., playback = FilePlayback(ring, 'run.cu8', speed=0); playback.start(); playback.join()
+    """
+    def __init__(self, ring, path, sample_rate=2.048e6, speed=1.0, block_size=256 * 1024, loop=False):
+        """
+        :param speed: 1 = real time, N = N times faster, 0 = as fast as possible
+        :param loop: start again at the end of the file
+        """
+        super().__init__(name='FilePlayback', daemon=True)
+        self.ring = ring
+        self.path = path
+        self.sample_rate = sample_rate
+        self.speed = speed
+        self.block_size = block_size - block_size % 2
+        self.loop = loop
+        self.stop_event = threading.Event()
+        self.bytes = 0
+
+    def run(self):
+        block = bytearray(self.block_size)
+        start = time.monotonic()
+        with open(self.path, 'rb') as f:
+            while not self.stop_event.is_set():
+                count = f.readinto(block)
+                count -= count % 2
+                if count == 0:
+                    if not self.loop or self.bytes == 0:
+                        break
+                    f.seek(0)
+                    continue
+                self.ring.write(memoryview(block)[:count])
+                self.bytes += count
+                if self.speed:
+                    delay = start + self.bytes / 2 / self.sample_rate / self.speed - time.monotonic()
+                    if delay > 0:
+                        self.stop_event.wait(delay)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def counters(self):
+        return {'bytes': self.bytes}
+
+
+class RingRecorder(threading.Thread):
+    """
+        Writes the data of an IQRingBuffer to a raw .cu8 file (rtl_sdr format).
+        E.g., recorder = RingRecorder(ring, 'run.cu8'); recorder.start(); ...; recorder.stop()
+    """
+    def __init__(self, ring, path):
+        super().__init__(name='RingRecorder', daemon=True)
+        self.reader = ring.reader()
+        self.file = open(path, 'wb')
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            block = self.reader.read(timeout=0.1)
+            if block is not None:
+                self.file.write(block)
+            elif self.stop_event.is_set():
+                break
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.file.close()
+
+    def counters(self):
+        return self.reader.counters()
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gapless RTL-SDR capture into a shared-memory ring buffer")
+    parser.add_argument("--play", help="raw .cu8 file to play instead of the dongle")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed, 0 = as fast as possible")
+    parser.add_argument("--record", help="raw .cu8 file to record to")
+    parser.add_argument("--demodulate", action="store_true", help="print the AIS sentences (ais_demodulator.py)")
+    parser.add_argument("--seconds", type=float, help="stop after seconds (default: end of the playback or CTRL + C)")
+    parser.add_argument("-s", "--sample-rate", type=float, default=2.048e6, help="IQ samples per second")
+    parser.add_argument("-f", "--center-freq", type=float, default=162.0e6, help="tuning frequency in Hz")
+    parser.add_argument("--capacity", type=int, default=32 * 1024 * 1024, help="ring buffer size in bytes")
+
+    args = parser.parse_args()
+
+    ring = IQRingBuffer(args.capacity)
+    print(f'Ring buffer {ring.name}: {ring.capacity} bytes ({ring.capacity / 2 / args.sample_rate:.1f} s)')
+    demodulator_reader = ring.reader() if args.demodulate else None
+    recorder = RingRecorder(ring, args.record) if args.record else None
+    if args.play:
+        source = FilePlayback(ring, args.play, args.sample_rate, args.speed)
+    else:
+        source = SDRCapture(ring, args.sample_rate, args.center_freq)
+    if recorder is not None:
+        recorder.start()
+    source.start()
+
+    demodulator = None
+    if demodulator_reader is not None:
+        from ais_demodulator import AISDemodulator
+        demodulator = AISDemodulator(args.sample_rate, args.center_freq)
+    end = None if args.seconds is None else time.monotonic() + args.seconds
+    try:
+        while (end is None or time.monotonic() < end) and (source.is_alive() or
+                                                           (demodulator_reader is not None and
+                                                            demodulator_reader.available() > 0)):
+            if demodulator_reader is None:
+                time.sleep(0.1)
+                continue
+            block = demodulator_reader.read(timeout=0.1)
+            if block is None:
+                continue
+            for sentence in demodulator.process(block):
+                print(sentence.decode('ascii'))
+            demodulator_reader.intact()
+    except KeyboardInterrupt:
+        pass
+
+    source.stop()
+    if recorder is not None:
+        recorder.stop()
+        print(f'Recorder: {recorder.counters()}')
+    print(f'Source: {source.counters()}')
+    if demodulator is not None:
+        print(f'Demodulator: {demodulator.counters()}, reader: {demodulator_reader.counters()}')
+    ring.close()
@@ -0,0 +1,141 @@
+import math
+
+import numpy as np
+
+from arpaocalc import calculate_cpa_pairs_batch, calculate_distance_batch
+
+"""
+     Shore-station mode: close approaches between all tracked vessels, without an own ship.
+
+     Checking every pair of n vessels is n^2 / 2 cpa calculations. Instead every vessel gets the bounding box of its
+     straight path over the next horizon minutes, widened by half of max_cpa on all sides. Two vessels can only come
+     closer than max_cpa within the horizon if their boxes overlap, so only vessels whose boxes share a cell of a
+     lat/lon grid are candidates. Boxes, grid cells and candidate pairs are built with NumPy on all vessels at once;
+     for typical traffic (a few vessels per cell) the number of candidates and the run time grow about linearly
+     with the number of vessels. The candidates are checked with the closed-form flat cpa of
+     arpaocalc.calculate_cpa_pairs_batch and the k closest pairs are reported.
+
+     Pairs of vessels that are both slower than min_speed (moored, at anchor) are skipped: alongside each other
+     in port they would fill the top k.
+"""
+
+
+def movement(speed, course, heading):
+    """
+    :return: arrays of speed (knots) and direction (degrees) of the vessels, course over ground or the heading if
+             the course is not available (360), not moving if speed (102.3) or both directions are not available
+    """
+    angle = np.where(course < 360, course, heading)
+    moving = (speed > 0) & (speed < 102.3) & (angle < 360)
+    return np.where(moving, speed, 0.0), np.where(moving, angle, 0.0)
+
+
+def swept_boxes(lat, lon, speed, angle, horizon, pad):
+    """
+    :param horizon: minutes ahead
+    :param pad: nautical miles added on every side
+    :return: arrays lat_min, lat_max, lon_min, lon_max of the boxes around the paths of the vessels (decimal
+             degrees, longitudes not wrapped)
+    """
+    distance = speed * horizon / 60.0                                   # nautical miles
+    angle = np.radians(angle)
+    end_lat = lat + distance * np.cos(angle) / 60.0
+    lat_min = np.maximum(np.minimum(lat, end_lat) - pad / 60.0, -90.0)
+    lat_max = np.minimum(np.maximum(lat, end_lat) + pad / 60.0, 90.0)
+    # degrees of longitude per nautical mile at the latitude of the box closest to a pole (the widest)
+    cos_lat = np.maximum(np.cos(np.radians(np.maximum(np.abs(lat_min), np.abs(lat_max)))), 1e-3)
+    end_lon = lon + distance * np.sin(angle) / (60.0 * cos_lat)
+    lon_min = np.minimum(lon, end_lon) - pad / (60.0 * cos_lat)
+    lon_max = np.maximum(lon, end_lon) + pad / (60.0 * cos_lat)
+    return lat_min, lat_max, lon_min, lon_max
+
+
+class BoxGrid:
+    """
+        Lat/lon grid of the cells overlapped by boxes, rebuilt for every check.
+        E.g., grid = BoxGrid(*swept_boxes(lat, lon, speed, angle, 30, 0.5)); a, b = grid.pairs()
+    """
+    def __init__(self, lat_min, lat_max, lon_min, lon_max, cell_size=0.05):
+        """
+        :param cell_size: cell edge in decimal degrees, as in spatial_index.GridIndex
+        """
+        self.lon_cells = int(math.ceil(360.0 / cell_size))     # cells around the earth, to wrap at 180 degrees
+        self.i_min = np.floor(lat_min / cell_size).astype(np.int64)
+        i_max = np.floor(lat_max / cell_size).astype(np.int64)
+        j_min = np.floor((lon_min + 180.0) / cell_size).astype(np.int64)
+        j_max = np.floor((lon_max + 180.0) / cell_size).astype(np.int64)
+        self.columns = np.minimum(j_max - j_min + 1, self.lon_cells)
+        self.j_min = j_min % self.lon_cells
+
+        # one entry (cell, box) for every cell a box overlaps
+        counts = (i_max - self.i_min + 1) * self.columns
+        self.box = np.repeat(np.arange(len(counts)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        self.i = self.i_min[self.box] + offset // self.columns[self.box]
+        self.j = (self.j_min[self.box] + offset % self.columns[self.box]) % self.lon_cells
+
+    def pairs(self):
+        """
+        :return: arrays of box numbers a < b of all pairs of boxes that share at least one cell, every pair once
+        """
+        cell = self.i * self.lon_cells + self.j
+        order = np.lexsort((self.box, cell))
+        cell = cell[order]
+
+        # every entry is paired with the entries after it in the same cell
+        starts = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+        sizes = np.diff(np.r_[starts, len(cell)])
+        following = np.repeat(starts + sizes, sizes) - np.arange(len(cell)) - 1
+        first = np.repeat(np.arange(len(cell)), following)
+        second = first + 1 + np.arange(following.sum()) - np.repeat(np.cumsum(following) - following, following)
+        first = order[first]
+        second = order[second]
+
+        # boxes that share several cells: keep the pair only in the first cell both boxes overlap
+        a = self.box[first]
+        b = self.box[second]
+        b_starts_in_a = (self.j_min[b] - self.j_min[a]) % self.lon_cells < self.columns[a]
+        first_i = np.maximum(self.i_min[a], self.i_min[b])
+        first_j = np.where(b_starts_in_a, self.j_min[b], self.j_min[a])
+        keep = (self.i[first] == first_i) & (self.j[first] == first_j)
+        return a[keep], b[keep]
+
+
+def close_pairs(targets, now=None, k=10, max_cpa=1.0, horizon=30.0, cell_size=0.05, min_speed=0.5):
+    """
+    :param targets: TargetStore with the position reports of the vessels
+    :param now: time in seconds since the epoch the vessels are dead reckoned to, reported positions if None
+    :param k: number of pairs to return
+    :param max_cpa: nautical miles, pairs that do not come closer within horizon are not reported
+    :param horizon: minutes ahead
+    :param cell_size: grid cell edge in decimal degrees (0.05 degree latitude = 3 nautical miles)
+    :param min_speed: knots, pairs of vessels that are both slower are skipped
+    :return: dict of arrays 'mmsi_a', 'mmsi_b', 'cpa' (Nm), 'tcpa' (min) and 'distance' (current, Nm) of the k
+             pairs with the smallest cpa, sorted by cpa, and 'candidates': number of pairs checked
+    """
+    columns = targets.view()
+    if now is None:
+        lat, lon = columns['lat'], columns['lon']
+    else:
+        lat, lon = targets.dead_reckon(now)
+    speed, angle = movement(columns['speed'], columns['course'], columns['heading'])
+
+    a = b = np.zeros(0, dtype=np.int64)
+    if len(lat) > 1:
+        grid = BoxGrid(*swept_boxes(lat, lon, speed, angle, horizon, max_cpa / 2.0), cell_size=cell_size)
+        a, b = grid.pairs()
+        moving = (speed[a] >= min_speed) | (speed[b] >= min_speed)
+        a, b = a[moving], b[moving]
+
+    candidates = len(a)
+    cpa, tcpa = calculate_cpa_pairs_batch(lat[a], lon[a], speed[a], angle[a], lat[b], lon[b], speed[b], angle[b],
+                                          horizon=horizon)
+    close = np.flatnonzero(cpa <= max_cpa)
+    if len(close) > k:
+        close = close[np.argpartition(cpa[close], k)[:k]]
+    close = close[np.argsort(cpa[close], kind='stable')]
+    a, b = a[close], b[close]
+
+    distance = np.round(calculate_distance_batch(lat[a], lon[a], lat[b], lon[b]), 3)
+    return {'mmsi_a': columns['mmsi'][a].copy(), 'mmsi_b': columns['mmsi'][b].copy(), 'cpa': cpa[close],
+            'tcpa': tcpa[close], 'distance': distance, 'candidates': candidates}
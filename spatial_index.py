@@ -0,0 +1,92 @@
+import math
+
+"""
+     Incremental spatial grid index over vessel positions.
+
+     The earth is divided into cells of cell_size x cell_size decimal degrees (lat, lon). Every vessel is kept in
+     the cell of its latest position, so an update is O(1). A query returns the vessels of all cells that overlap
+     the bounding box of a circle around a position, e.g., all vessels that could reach the alarm radius of
+     own ship within the time horizon. Candidates still have to be checked with the exact distance.
+"""
+
+
+class GridIndex:
+    """
+        Lat/lon grid index, keyed by e.g. the MMSI.
+        E.g., index.update(211234560, 53.5, 9.9); index.query(53.4, 9.8, radius=10) -> {211234560}
+    """
+    def __init__(self, cell_size=0.1):
+        """
+        :param cell_size: cell edge in decimal degrees (0.1 degree latitude = 6 nautical miles)
+        """
+        self.cell_size = cell_size
+        self.lon_cells = int(math.ceil(360.0 / cell_size))     # cells around the earth, to wrap at 180 degrees
+        self.cells = {}         # cell -> set of keys
+        self.keys = {}          # key -> cell
+
+    def __len__(self):
+        return len(self.keys)
+
+    def cell(self, lat, lon):
+        return (int(math.floor(lat / self.cell_size)),
+                int(math.floor((lon + 180.0) / self.cell_size)) % self.lon_cells)
+
+    def update(self, key, lat, lon):
+        """
+        :param key: vessel key, e.g., mmsi
+        :param lat: latitude in decimal degrees
+        :param lon: longitude in decimal degrees
+        """
+        cell = self.cell(lat, lon)
+        old = self.keys.get(key)
+        if old == cell:
+            return
+        if old is not None:
+            self.discard(old, key)
+        self.cells.setdefault(cell, set()).add(key)
+        self.keys[key] = cell
+
+    def remove(self, key):
+        cell = self.keys.pop(key, None)
+        if cell is not None:
+            self.discard(cell, key)
+
+    def discard(self, cell, key):
+        keys = self.cells[cell]
+        keys.discard(key)
+        if not keys:
+            del self.cells[cell]
+
+    def query(self, lat, lon, radius):
+        """
+        :param lat: latitude of the center in decimal degrees
+        :param lon: longitude of the center in decimal degrees
+        :param radius: radius in nautical miles
+        :return: set of keys in all cells overlapping the bounding box of the circle
+        """
+        dlat = radius / 60.0                                     # 1 degree latitude = 60 nautical miles
+        lat_min = max(lat - dlat, -90.0)
+        lat_max = min(lat + dlat, 90.0)
+        cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+        dlon = 180.0 if cos_lat < 1e-9 else min(radius / (60.0 * cos_lat), 180.0)
+
+        i_min, j_min = self.cell(lat_min, lon - dlon)
+        i_max, j_max = self.cell(lat_max, lon + dlon)
+        if dlon >= 180.0:
+            j_min, j_max = 0, self.lon_cells - 1
+        j_count = (j_max - j_min) % self.lon_cells + 1
+
+        result = set()
+        if (i_max - i_min + 1) * j_count > len(self.cells):
+            # box covers more cells than are occupied: filter the occupied cells instead
+            for (i, j), keys in self.cells.items():
+                if i_min <= i <= i_max and (j - j_min) % self.lon_cells < j_count:
+                    result.update(keys)
+            return result
+
+        for i in range(i_min, i_max + 1):
+            for k in range(j_count):
+                keys = self.cells.get((i, (j_min + k) % self.lon_cells))
+                if keys:
+                    result.update(keys)
+        return result
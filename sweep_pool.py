@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from arpaocalc import Ship, ARPA_calculations_batch
+
+"""
+     Process pool for the collision sweep of very large target sets (e.g., shore-side with an aggregated AIS feed).
+
+     The targets are split into one shard per worker process. A shard is one compact float64 array of shape (4, n)
+     (lat, lon, speed, heading) that is pickled as a single buffer, own ship is sent as a tuple. Every worker runs
+     ARPA_calculations_batch on its shard and returns the cpa, tcpa and sign arrays, which are merged in target order.
+     Target sets smaller than min_shard per worker are calculated in the calling process, since the transfer to the
+     workers would take longer than the calculation.
+
+     Where available the workers are forked, so the calling script is not imported again by the workers.
+"""
+
+
+def calculate_shard(own_ship, shard, flat_range):
+    """
+    :param own_ship: (lat, lon, speed, heading) of own ship
+    :param shard: float64 array of shape (4, n) with lat, lon, speed and heading of the targets
+    :param flat_range: see ARPA_calculations_batch
+    :return: cpa, tcpa and sign arrays
+    """
+    lat, lon, speed, heading = own_ship
+    results = ARPA_calculations_batch(Ship((lat, lon), speed, heading), shard[0], shard[1], shard[2], shard[3],
+                                      flat_range=flat_range)
+    return results['cpa'], results['tcpa'], results['sign']
+
+
+class SweepPool:
+    """
+        Sharded ARPA_calculations_batch on a pool of worker processes.
+        E.g., pool = SweepPool(processes=4); results = pool.calculate(own_ship, lats, lons, speeds, headings)
+    """
+    def __init__(self, processes=None, min_shard=5000):
+        """
+        :param processes: number of worker processes, os.cpu_count() if None
+        :param min_shard: minimum number of targets per worker
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.min_shard = min_shard
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        self.pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+        self.sweeps = 0
+        self.shards = 0
+
+    def start(self):
+        """
+        Starts the worker processes, e.g., before other threads of the calling script are started.
+        """
+        for future in [self.pool.submit(os.getpid) for _ in range(self.processes)]:
+            future.result()
+
+    def calculate(self, objectA, lats, lons, speeds, headings, flat_range=None):
+        """
+        :param objectA: own ship as arpaocalc Ship instance
+        :return: same as ARPA_calculations_batch, dict of arrays 'cpa', 'tcpa' and 'sign'
+        """
+        targets = np.stack([np.asarray(lats, dtype=float), np.asarray(lons, dtype=float),
+                            np.asarray(speeds, dtype=float), np.asarray(headings, dtype=float)])
+        shards = min(self.processes, targets.shape[1] // self.min_shard)
+        self.sweeps += 1
+        if shards <= 1:
+            return ARPA_calculations_batch(objectA, targets[0], targets[1], targets[2], targets[3],
+                                           flat_range=flat_range)
+
+        own_ship = (float(objectA.position[0]), float(objectA.position[1]), float(objectA.speed),
+                    float(objectA.heading))
+        futures = [self.pool.submit(calculate_shard, own_ship, np.ascontiguousarray(shard), flat_range)
+                   for shard in np.array_split(targets, shards, axis=1)]
+        self.shards += shards
+        cpa, tcpa, sign = zip(*[future.result() for future in futures])
+        return {'cpa': np.concatenate(cpa), 'tcpa': np.concatenate(tcpa), 'sign': np.concatenate(sign)}
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+
+    import argparse
+    import time
+
+    from benchmark import random_geometries
+
+    parser = argparse.ArgumentParser(description="Scaling of the sharded collision sweep with the number of processes")
+    parser.add_argument("-n", type=int, default=100000, help="number of random ship geometries")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="timed runs per number of processes")
+    parser.add_argument("-p", "--processes", type=int, default=os.cpu_count(), help="maximum number of processes")
+
+    args = parser.parse_args()
+
+    own_ship, ships = random_geometries(args.n)
+    lats = np.array([ship.position[0] for ship in ships])
+    lons = np.array([ship.position[1] for ship in ships])
+    speeds = np.array([ship.speed for ship in ships])
+    headings = np.array([ship.heading for ship in ships])
+
+    start = time.perf_counter()
+    expected = ARPA_calculations_batch(own_ship, lats, lons, speeds, headings)
+    single = time.perf_counter() - start
+    print(f'{args.n} targets, 1 process (no pool): {single * 1000:.1f} ms')
+
+    for processes in range(2, args.processes + 1):
+        pool = SweepPool(processes, min_shard=1)
+        pool.start()
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results = pool.calculate(own_ship, lats, lons, speeds, headings)
+            times.append(time.perf_counter() - start)
+        pool.close()
+        assert np.array_equal(results['cpa'], expected['cpa']) and np.array_equal(results['tcpa'], expected['tcpa'])
+        print(f'{args.n} targets, {processes} processes: {min(times) * 1000:.1f} ms, speed-up {single / min(times):.2f}')
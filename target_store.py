@@ -0,0 +1,266 @@
+import numpy as np
+
+from arpaocalc import calculate_distance_batch, calculate_future_position_batch
+
+"""
+    Compact store for the latest position report of every vessel, keyed by MMSI.
+
+    Only the fields the collision check reads are kept (lat, lon, speed, course, heading, accuracy, timestamp,
+    msg_type, turn).
+    Every field is a preallocated NumPy column and a dict maps the MMSI to its row, so an update is O(1)
+    and the live rows can be handed to ARPA_calculations_batch without copying.
+    Rows are kept compact: removing a vessel moves the last row into the free slot.
+    An optional spatial index (e.g., spatial_index.GridIndex) is updated with every position, so the vessels
+    within a range of own ship can be found without checking every row.
+    An optional track history (track_history.TrackHistory) keeps the last position reports of every vessel.
+
+    Vessels that have not sent a position report for a while are removed with expire(), the time to live depends
+    on the AIS class and speed (TTLPolicy). dead_reckon() moves the vessels from their report time to a common
+    time, e.g., the time of the own ship gps fix.
+"""
+
+class_b_msg_types = (18, 19)        # AIS message types of class B position reports
+
+
+class TTLPolicy:
+    """
+        Seconds without a position report before a vessel is removed, by AIS class and reported speed.
+        E.g., ttl = TTLPolicy(); ttl(msg_type=np.array([1, 18]), speed=np.array([12.0, 0.0])) -> [60., 540.]
+        Defaults allow a few missed reports at the reporting intervals of ITU-R M.1371
+        (class A: 2 to 10 s under way, 3 min at anchor; class B: 30 s under way, 3 min below 2 knots).
+    """
+    def __init__(self, class_a=60, class_a_slow=540, class_b=180, class_b_slow=540, slow_speed=3):
+        """
+        :param class_a: seconds for class A vessels faster than slow_speed
+        :param class_a_slow: seconds for class A vessels at most slow_speed (anchored, moored)
+        :param class_b: seconds for class B vessels faster than slow_speed
+        :param class_b_slow: seconds for class B vessels at most slow_speed
+        :param slow_speed: knots
+        """
+        self.class_a = class_a
+        self.class_a_slow = class_a_slow
+        self.class_b = class_b
+        self.class_b_slow = class_b_slow
+        self.slow_speed = slow_speed
+
+    def __call__(self, msg_type, speed):
+        """
+        :param msg_type: array of AIS message types
+        :param speed: array of speeds in knots (102.3 = N/A counts as under way)
+        :return: array of seconds to live
+        """
+        class_b = np.isin(msg_type, class_b_msg_types)
+        slow = speed <= self.slow_speed
+        return np.where(class_b, np.where(slow, self.class_b_slow, self.class_b),
+                        np.where(slow, self.class_a_slow, self.class_a))
+
+
+class TargetStore:
+    """
+        Target store with O(1) upsert by MMSI.
+        E.g., store.upsert(211234560, 53.5, 9.9, 10.2, 271.3, 270, True, time.time())
+        Columns are grown by doubling when the capacity is reached.
+    """
+    columns = ('lat', 'lon', 'speed', 'course', 'heading', 'accuracy', 'timestamp', 'msg_type', 'turn')
+
+    def __init__(self, capacity=1024, index=None, history=None):
+        """
+        :param capacity: number of preallocated rows
+        :param index: optional spatial index with update(mmsi, lat, lon), remove(mmsi) and query(lat, lon, radius)
+        :param history: optional track history with append(mmsi, timestamp, lat, lon, speed, course, heading),
+                        tracks are kept when a vessel is removed
+        """
+        self.capacity = max(int(capacity), 1)
+        self.index = index
+        self.history = history
+        self.size = 0
+        self.rows = {}                                              # mmsi -> row number
+        self.mmsi = np.zeros(self.capacity, dtype=np.int64)
+        self.lat = np.zeros(self.capacity, dtype=np.float64)        # decimal degrees
+        self.lon = np.zeros(self.capacity, dtype=np.float64)        # decimal degrees
+        self.speed = np.zeros(self.capacity, dtype=np.float64)      # knots
+        self.course = np.zeros(self.capacity, dtype=np.float64)     # degrees, 360 = N/A
+        self.heading = np.zeros(self.capacity, dtype=np.float64)    # degrees, 511 = N/A
+        self.accuracy = np.zeros(self.capacity, dtype=bool)
+        self.timestamp = np.zeros(self.capacity, dtype=np.float64)  # receive time in seconds since the epoch
+        self.msg_type = np.zeros(self.capacity, dtype=np.uint8)     # AIS message type of the last report
+        self.turn = np.zeros(self.capacity, dtype=np.float64)       # rate of turn in degrees per minute, -128 = N/A
+        self.evictions = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, mmsi):
+        return mmsi in self.rows
+
+    def upsert(self, mmsi, lat, lon, speed, course, heading, accuracy, timestamp, msg_type=1, turn=-128):
+        """
+        :param mmsi: Maritime Mobile Service Identity (MMSI) number of the vessel
+        :param timestamp: receive time of the position report in seconds
+        :param msg_type: AIS message type (1, 2, 3: class A, 18, 19: class B)
+        :param turn: rate of turn in degrees per minute (class A only), -128 = N/A
+        :return: row number of the vessel
+
+        Inserts a new vessel or overwrites the previous position report of a known vessel.
+        """
+        row = self.rows.get(mmsi)
+        if row is None:
+            if self.size == self.capacity:
+                self._grow()
+            row = self.size
+            self.rows[mmsi] = row
+            self.mmsi[row] = mmsi
+            self.size += 1
+
+        self.lat[row] = lat
+        self.lon[row] = lon
+        self.speed[row] = speed
+        self.course[row] = course
+        self.heading[row] = heading
+        self.accuracy[row] = accuracy
+        self.timestamp[row] = timestamp
+        self.msg_type[row] = msg_type
+        self.turn[row] = turn
+        if self.index is not None:
+            self.index.update(mmsi, lat, lon)
+        if self.history is not None:
+            self.history.append(mmsi, timestamp, lat, lon, speed, course, heading)
+        return row
+
+    def upsert_report(self, report, timestamp):
+        """
+        :param report: decoded position report as dict, e.g., pyais decoded.asdict()
+        :param timestamp: receive time of the position report in seconds
+        :return: row number of the vessel
+        """
+        return self.upsert(report['mmsi'], report['lat'], report['lon'], report['speed'], report['course'],
+                           report['heading'], report['accuracy'], timestamp, report.get('msg_type', 1),
+                           report.get('turn', -128))
+
+    def remove(self, mmsi):
+        """
+        :param mmsi: vessel to remove
+        :return: True if the vessel was in the store
+
+        Moves the last row into the freed slot to keep the columns compact.
+        """
+        row = self.rows.pop(mmsi, None)
+        if row is None:
+            return False
+        if self.index is not None:
+            self.index.remove(mmsi)
+
+        last = self.size - 1
+        if row != last:
+            for name in ('mmsi',) + self.columns:
+                column = getattr(self, name)
+                column[row] = column[last]
+            self.rows[int(self.mmsi[row])] = row
+        self.size = last
+        return True
+
+    def expire(self, now, ttl):
+        """
+        :param now: current time in seconds since the epoch
+        :param ttl: TTLPolicy or function(msg_type, speed) returning seconds to live per vessel
+        :return: list of mmsi of the removed vessels
+        """
+        age = now - self.timestamp[:self.size]
+        expired = age > ttl(self.msg_type[:self.size], self.speed[:self.size])
+        removed = self.mmsi[:self.size][expired].tolist()
+        for mmsi in removed:
+            self.remove(mmsi)
+        self.evictions += len(removed)
+        return removed
+
+    def dead_reckon(self, at, rows=None):
+        """
+        :param at: time in seconds since the epoch, e.g., of the own ship gps fix
+        :param rows: row numbers, all vessels if None
+        :return: arrays of latitude and longitude of the vessels at time at
+
+        Moves every vessel along its course over ground (heading if the course is not available) at its speed
+        from the time of its last report. Vessels without speed (102.3) or course and heading stay in place.
+        """
+        if rows is None:
+            rows = slice(0, self.size)
+        lat = self.lat[rows]
+        lon = self.lon[rows]
+        speed = self.speed[rows]
+        course = self.course[rows]
+        heading = self.heading[rows]
+
+        # course N/A = 360, heading N/A = 511
+        angle = np.where(course < 360, course, heading)
+        moving = (speed > 0) & (speed < 102.3) & (angle < 360)
+        if not moving.any():
+            return lat.copy(), lon.copy()
+
+        distance = np.where(moving, speed * (at - self.timestamp[rows]) / 3600.0, 0.0)    # nautical miles
+        future_lat, future_lon = calculate_future_position_batch(lat, lon, distance, np.where(moving, angle, 0.0))
+        return np.where(moving, future_lat, lat), np.where(moving, future_lon, lon)
+
+    def within(self, lat, lon, radius, rows=None):
+        """
+        :param lat: latitude of the center in decimal degrees
+        :param lon: longitude of the center in decimal degrees
+        :param radius: radius in nautical miles
+        :param rows: row numbers to check, all vessels (from the spatial index if there is one) if None
+        :return: array of row numbers of the vessels within radius
+        """
+        if rows is None:
+            if self.index is not None:
+                rows = [self.rows[mmsi] for mmsi in self.index.query(lat, lon, radius)]
+            else:
+                rows = np.arange(self.size)
+        rows = np.asarray(rows, dtype=np.intp)
+        if rows.size == 0:
+            return rows
+
+        distance = calculate_distance_batch(lat, lon, self.lat[rows], self.lon[rows])
+        return rows[distance <= radius]
+
+    def get(self, mmsi):
+        """
+        :return: position report of one vessel as dict or None if the vessel is unknown
+        """
+        row = self.rows.get(mmsi)
+        if row is None:
+            return None
+        report = {name: getattr(self, name)[row].item() for name in self.columns}
+        report['mmsi'] = mmsi
+        return report
+
+    def view(self):
+        """
+        :return: dict of the live rows of every column (NumPy views, no copy)
+
+        Views are only valid until the next upsert or remove.
+        """
+        view = {name: getattr(self, name)[:self.size] for name in self.columns}
+        view['mmsi'] = self.mmsi[:self.size]
+        return view
+
+    def snapshot(self):
+        """
+        :return: dict with a copy of the live rows of every column
+        """
+        return {name: column.copy() for name, column in self.view().items()}
+
+    def to_dataframe(self):
+        """
+        :return: pandas dataframe of all vessels indexed by mmsi
+        """
+        import pandas as pd     # only needed for the export
+
+        snapshot = self.snapshot()
+        index = pd.Index(snapshot.pop('mmsi'), name='mmsi')
+        return pd.DataFrame(snapshot, index=index, columns=list(self.columns))
+
+    def _grow(self):
+        self.capacity *= 2
+        for name in ('mmsi',) + self.columns:
+            column = getattr(self, name)
+            grown = np.zeros(self.capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
@@ -1,6 +1,7 @@
 from rtlsdr import *
 #from pylab import *
 #from matplotlib import *
+from ais_demodulator import AISDemodulator
 
 sdr = RtlSdr()
 
@@ -10,6 +11,11 @@ sdr.center_freq = 162e6
 sdr.freq_correction = 60
 sdr.gain = 'auto'
 
+# AIS channel A and B are 25 kHz below and above the center frequency
+demodulator = AISDemodulator(sample_rate=sdr.sample_rate, center_freq=sdr.center_freq)
+
 samples = sdr.read_samples(256*1024)
+for sentence in demodulator.process(samples):
+    print(sentence.decode('ascii'))
+print(demodulator.counters())
 sdr.close()
-
@@ -0,0 +1,194 @@
+import cProfile
+import os
+import time
+
+import numpy as np
+
+"""
+     Opt-in latency tracing of position reports and per-cycle profiling.
+
+     Trace file (e.g., 'trace.bin'): header b'AISTRC01' followed by one record (trace_dtype) per position report
+     from receive to collision check:
+          time: receive time in seconds since the epoch
+          mmsi: vessel
+          queue_us: from receive to the start of decoding (the sentences before it in the same datagram or batch)
+          decode_us, store_us: decoding of the sentence, target store update
+          evaluate_us: from the updated target store to the cpa/tcpa of the vessel (waiting for the next collision
+                       check, gps fix, ARPA math)
+          total_us: message to alarm latency, from receive to the collision decision of the vessel
+          result: 0 no collision, 1 collision (warning), 2 not checked (outside the range gate)
+     Receive times are time.perf_counter() values taken when the datagram was read from the socket.
+
+     CycleProfiler wraps the main loop in cProfile and dumps one profile per cycle between full collision tests,
+     e.g., python -m pstats profiles/cycle-00001.prof
+
+     Summary of a trace file: python tracing.py trace.bin
+"""
+
+magic = b'AISTRC01'
+trace_dtype = np.dtype([('time', '<f8'), ('mmsi', '<u4'), ('queue_us', '<f4'), ('decode_us', '<f4'),
+                        ('store_us', '<f4'), ('evaluate_us', '<f4'), ('total_us', '<f4'), ('result', 'u1')])
+
+RESULT_CLEAR = 0
+RESULT_COLLISION = 1
+RESULT_GATED = 2
+
+
+class Tracer:
+    """
+        Carries the stage times of every position report until its collision check and writes them to a trace file.
+        E.g., tracer = Tracer('trace.bin'); tracer.stored(mmsi, received, decode_start, decoded, stored);
+              tracer.evaluated(mmsi_array, collision_array)
+    """
+    def __init__(self, path, flush_every=1024):
+        """
+        :param path: trace file, appended to if it exists
+        :param flush_every: records buffered before they are written
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(magic)
+        else:
+            with open(path, 'rb') as f:
+                if f.read(len(magic)) != magic:
+                    self.file.close()
+                    raise ValueError(f'{path} is not a trace file')
+        self.pending = {}       # mmsi -> (received, decode_start, decoded, stored) of the latest report not checked yet
+        self.records = []
+        self.written = 0
+
+    def stored(self, mmsi, received, decode_start, decoded, stored):
+        """
+        :param mmsi: vessel
+        :param received: time.perf_counter() when the datagram was received
+        :param decode_start: time.perf_counter() before decoding this sentence
+        :param decoded: time.perf_counter() after decoding
+        :param stored: time.perf_counter() after the target store update
+        """
+        self.pending[mmsi] = (received, decode_start, decoded, stored)
+
+    def evaluated(self, mmsi, collision, candidates=None):
+        """
+        :param mmsi: array of the checked vessels
+        :param collision: array of the collision results (1 or 0) of the checked vessels
+        :param candidates: vessels that were meant to be checked, all pending vessels if None;
+                           candidates that were not checked were left out by the range gate
+        """
+        if not self.pending:
+            return
+        now = time.perf_counter()
+        wall = time.time()
+        for vessel, result in zip(mmsi.tolist(), np.asarray(collision).tolist()):
+            times = self.pending.pop(vessel, None)
+            if times is not None:
+                self.record(vessel, times, now, wall, RESULT_COLLISION if result else RESULT_CLEAR)
+
+        if candidates is None:
+            candidates = list(self.pending)
+        for vessel in candidates:
+            times = self.pending.pop(int(vessel), None)
+            if times is not None:
+                self.record(int(vessel), times, now, wall, RESULT_GATED)
+
+        if len(self.records) >= self.flush_every:
+            self.flush()
+
+    def record(self, mmsi, times, now, wall, result):
+        received, decode_start, decoded, stored = times
+        self.records.append((wall - (now - received), mmsi, (decode_start - received) * 1e6,
+                             (decoded - decode_start) * 1e6, (stored - decoded) * 1e6, (now - stored) * 1e6,
+                             (now - received) * 1e6, result))
+
+    def flush(self):
+        if self.records:
+            self.file.write(np.array(self.records, dtype=trace_dtype).tobytes())
+            self.written += len(self.records)
+            self.records = []
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_trace(path):
+    """
+    :param path: trace file
+    :return: structured array of trace_dtype
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f'{path} is not a trace file')
+        data = f.read()
+    return np.frombuffer(data[:len(data) - len(data) % trace_dtype.itemsize], dtype=trace_dtype)
+
+
+class CycleProfiler:
+    """
+        cProfile of the main loop, one profile file per cycle.
+        E.g., profiler = CycleProfiler('profiles'); profiler.start(); ... profiler.next_cycle() ...; profiler.stop()
+    """
+    def __init__(self, directory):
+        """
+        :param directory: directory of the profile files cycle-<number>.prof, created if needed
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.cycle = 0
+        self.profile = None
+
+    def start(self):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def next_cycle(self):
+        """
+        Dumps the profile of the finished cycle and starts the next one.
+        """
+        if self.profile is None:
+            return
+        self.profile.disable()
+        self.cycle += 1
+        self.profile.dump_stats(os.path.join(self.directory, f'cycle-{self.cycle:05d}.prof'))
+        self.start()
+
+    def stop(self):
+        if self.profile is not None:
+            self.next_cycle()
+            self.profile.disable()
+            self.profile = None
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summary of a latency trace file")
+    parser.add_argument("file", help="trace file")
+    parser.add_argument("-k", "--top", type=int, default=10, help="number of vessels with the highest latency")
+
+    args = parser.parse_args()
+
+    trace = read_trace(args.file)
+    checked = trace[trace['result'] != RESULT_GATED]
+    print(f'{len(trace)} position reports, {len(checked)} checked, {np.count_nonzero(trace["result"] == RESULT_COLLISION)} '
+          f'with collision warning, {len(trace) - len(checked)} outside the range gate')
+    if len(checked):
+        print('stage            p50 (ms)    p90 (ms)    p99 (ms)    max (ms)')
+        for stage in [name for name in trace.dtype.names if name.endswith('_us')]:
+            p50, p90, p99, p100 = np.percentile(checked[stage], [50, 90, 99, 100]) / 1000.0
+            print(f'{stage[:-3]:<12} {p50:>12.3f}{p90:>12.3f}{p99:>12.3f}{p100:>12.3f}')
+
+        print('Vessels with the highest message to alarm latency:')
+        order = np.argsort(checked['total_us'])[::-1]
+        seen = set()
+        for i in order:
+            if checked['mmsi'][i] in seen:
+                continue
+            seen.add(checked['mmsi'][i])
+            print(f'  MMSI {checked["mmsi"][i]}: {checked["total_us"][i] / 1000.0:.3f} ms at '
+                  f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(checked["time"][i]))}')
+            if len(seen) == args.top:
+                break
@@ -0,0 +1,163 @@
+import numpy as np
+
+"""
+     Recent track of every vessel: a fixed number of past position reports per MMSI in a ring buffer.
+
+     All reports live in one preallocated NumPy structured array of max_targets x depth rows, so appending a report
+     does not allocate and memory use is fixed at max_targets * depth * history_dtype.itemsize bytes.
+     When all slots are taken, the slot of the vessel that was updated longest ago is reused.
+
+     Export of all tracks (or a time range) as columns: dict of arrays, .npz, Arrow table or Parquet file.
+     E.g., history.to_npz('tracks.npz', start=time.time() - 3600)
+"""
+
+history_dtype = np.dtype([('timestamp', '<f8'), ('lat', '<f8'), ('lon', '<f8'), ('speed', '<f4'), ('course', '<f4'),
+                          ('heading', '<f4')])
+
+
+class TrackHistory:
+    """
+        Ring buffer of the last depth position reports of up to max_targets vessels.
+        E.g., history.append(211234560, time.time(), 53.5, 9.9, 10.2, 271.3, 270); history.track(211234560)
+    """
+    def __init__(self, depth=64, max_targets=4096):
+        """
+        :param depth: position reports per vessel
+        :param max_targets: vessels with a track
+        """
+        self.depth = depth
+        self.max_targets = max_targets
+        self.buffer = np.zeros((max_targets, depth), dtype=history_dtype)
+        self.count = np.zeros(max_targets, dtype=np.int64)            # reports written per slot
+        self.updated = np.full(max_targets, -np.inf)                    # time of the last report per slot
+        self.mmsi = np.zeros(max_targets, dtype=np.int64)
+        self.slots = {}                                                 # mmsi -> slot
+        self.free = list(range(max_targets - 1, -1, -1))
+        self.reused = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, mmsi):
+        return mmsi in self.slots
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.count.nbytes + self.updated.nbytes + self.mmsi.nbytes
+
+    def slot(self, mmsi):
+        """
+        :return: slot of the vessel, a free slot or the slot of the vessel updated longest ago for a new vessel
+        """
+        slot = self.slots.get(mmsi)
+        if slot is not None:
+            return slot
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = int(np.argmin(self.updated))
+            del self.slots[int(self.mmsi[slot])]
+            self.reused += 1
+        self.slots[mmsi] = slot
+        self.mmsi[slot] = mmsi
+        self.count[slot] = 0
+        return slot
+
+    def append(self, mmsi, timestamp, lat, lon, speed, course, heading):
+        """
+        :param mmsi: Maritime Mobile Service Identity (MMSI) number of the vessel
+        :param timestamp: receive time of the position report in seconds
+        """
+        slot = self.slot(mmsi)
+        self.buffer[slot, self.count[slot] % self.depth] = (timestamp, lat, lon, speed, course, heading)
+        self.count[slot] += 1
+        self.updated[slot] = timestamp
+
+    def remove(self, mmsi):
+        """
+        :return: True if the vessel had a track
+        """
+        slot = self.slots.pop(mmsi, None)
+        if slot is None:
+            return False
+        self.count[slot] = 0
+        self.updated[slot] = -np.inf
+        self.free.append(slot)
+        return True
+
+    def track(self, mmsi, start=None, end=None):
+        """
+        :param mmsi: vessel
+        :param start: first timestamp, from the oldest report if None
+        :param end: last timestamp, to the latest report if None
+        :return: structured array (history_dtype) of the reports in chronological order (copy)
+        """
+        slot = self.slots.get(mmsi)
+        if slot is None:
+            return np.zeros(0, dtype=history_dtype)
+        count = int(self.count[slot])
+        if count <= self.depth:
+            track = self.buffer[slot, :count].copy()
+        else:
+            oldest = count % self.depth
+            track = np.concatenate([self.buffer[slot, oldest:], self.buffer[slot, :oldest]])
+        return track[in_range(track['timestamp'], start, end)]
+
+    def export(self, start=None, end=None):
+        """
+        :param start: first timestamp, from the oldest report if None
+        :param end: last timestamp, to the latest report if None
+        :return: dict of column arrays 'mmsi' and the fields of history_dtype, sorted by mmsi and timestamp
+        """
+        slots = np.fromiter(self.slots.values(), dtype=np.intp, count=len(self.slots))
+        filled = np.minimum(self.count[slots], self.depth)
+        valid = np.arange(self.depth)[None, :] < filled[:, None]
+        reports = self.buffer[slots][valid]
+        mmsi = np.repeat(self.mmsi[slots], filled)
+
+        selected = in_range(reports['timestamp'], start, end)
+        reports = reports[selected]
+        mmsi = mmsi[selected]
+        order = np.lexsort((reports['timestamp'], mmsi))
+
+        columns = {'mmsi': mmsi[order]}
+        for name in history_dtype.names:
+            columns[name] = reports[name][order]
+        return columns
+
+    def to_npz(self, path, start=None, end=None):
+        np.savez_compressed(path, **self.export(start, end))
+
+    def to_arrow(self, start=None, end=None):
+        """
+        :return: pyarrow Table of the tracks (needs pyarrow)
+        """
+        import pyarrow as pa     # only needed for the export
+
+        return pa.table(self.export(start, end))
+
+    def to_parquet(self, path, start=None, end=None):
+        """
+        Writes the tracks to a Parquet file (needs pyarrow).
+        """
+        import pyarrow.parquet as pq     # only needed for the export
+
+        pq.write_table(self.to_arrow(start, end), path)
+
+    def save(self, path, start=None, end=None):
+        """
+        :param path: file, Parquet if it ends with '.parquet', otherwise .npz
+        """
+        if path.endswith('.parquet'):
+            self.to_parquet(path, start, end)
+        else:
+            self.to_npz(path, start, end)
+
+
+def in_range(timestamps, start, end):
+    selected = np.ones(timestamps.shape, dtype=bool)
+    if start is not None:
+        selected &= timestamps >= start
+    if end is not None:
+        selected &= timestamps <= end
+    return selected
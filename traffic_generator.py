@@ -0,0 +1,432 @@
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from ais_decoder import encode_position
+from ais_demodulator import nmea_sentences
+
+"""
+     Synthetic AIS traffic and own ship gps for testing collision_detection.py without antenna and gps.
+
+     Fleet simulates own ship and n vessels around it (straight and turning tracks, class A and B) and plants
+     encounters: vessels on a collision course with own ship, closest approach after a few minutes. The vessels
+     report at their ITU-R M.1371 intervals (class A 2 to 10 s by speed, class B 30 s) or at a fixed total rate,
+     as !AIVDM sentences in UDP datagrams to port 5005 (like SDRangel). Reported positions have gps noise
+     (position_noise meters), so repeated reports of a moored vessel are not dropped as duplicates. Own ship sends $GPRMC sentences once per
+     second on a pseudo-terminal (Linux, macOS), which is used as the gps port; on Windows use a virtual null-modem pair
+     (e.g., com0com) with --gps-ports.
+
+     python traffic_generator.py --vessels 1000 --rate 2000
+          sends until CTRL + C; set port in collision_detection.py to the printed pseudo-terminal
+     python traffic_generator.py --vessels 1000 --rate 2000 --load-test --seconds 60
+          starts collision_detection.py (streaming mode) on the traffic and reports the sustained message
+          throughput, the drop rate (sentences sent, but neither stored nor dropped as duplicates) and the alarm
+          latency of the planted encounters (first report sent to first collision warning of that vessel)
+"""
+
+earth_radius = 6378.137 / 1.852       # nautical miles, same as arpaocalc
+
+
+def move(lat, lon, speed, course, seconds):
+    """
+    :return: lat, lon after seconds at speed (knots) and course (degrees), local flat approximation
+    """
+    distance = speed * seconds / 3600.0 / earth_radius                          # radians
+    course = np.radians(course)
+    new_lat = lat + np.degrees(distance * np.cos(course))
+    new_lon = lon + np.degrees(distance * np.sin(course) / np.cos(np.radians(lat)))
+    return new_lat, (new_lon + 180.0) % 360.0 - 180.0
+
+
+def report_interval(speed, turning, class_b):
+    """
+    :return: seconds between position reports (ITU-R M.1371 table 1, class B 'SO' 30 s)
+    """
+    interval = np.where(speed > 23, 2.0, np.where(speed > 14, 6.0, 10.0))
+    interval = np.where(turning & (speed <= 14), 10.0 / 3.0, np.where(turning, 2.0, interval))
+    return np.where(class_b, 30.0, np.where(speed < 0.5, 180.0, interval))
+
+
+class Fleet:
+    """
+        Own ship and the simulated vessels.
+        E.g., fleet = Fleet(1000); fleet.advance(0.1); sentences = fleet.reports(fleet.due(now))
+    """
+    def __init__(self, vessels=100, own_ship=(54.32, 10.15, 10.0, 45.0), radius=20.0, class_b=0.3, turning=0.2,
+                 encounters=5, encounter_minutes=(3.0, 15.0), rate=None, position_noise=3.0, seed=0):
+        """
+        :param vessels: number of vessels, including the encounters
+        :param own_ship: (lat, lon, speed, course) of own ship
+        :param radius: nautical miles around own ship of the start positions
+        :param class_b: fraction of class B vessels
+        :param turning: fraction of vessels that turn (1 to 10 degrees per minute)
+        :param encounters: vessels on a collision course with own ship (closest approach 0)
+        :param encounter_minutes: range of the minutes to the closest approach of the encounters
+        :param rate: position reports per second of the whole fleet, ITU-R M.1371 intervals if None
+        :param position_noise: standard deviation of the reported positions in meters
+        """
+        rng = np.random.default_rng(seed)
+        self.rng = rng
+        self.position_noise = position_noise / 1852.0 / 60.0        # degrees of latitude
+        self.own_lat, self.own_lon, self.own_speed, self.own_course = own_ship
+        self.mmsi = 200000000 + rng.choice(700000000, size=vessels, replace=False)
+        distance = radius * np.sqrt(rng.uniform(0.01, 1.0, vessels))
+        self.lat, self.lon = move(np.full(vessels, self.own_lat), np.full(vessels, self.own_lon),
+                                  distance * 3600.0, rng.uniform(0, 360, vessels), 1.0)
+        self.speed = np.where(rng.random(vessels) < 0.2, 0.0, rng.uniform(2.0, 25.0, vessels))
+        self.course = rng.uniform(0, 360, vessels)
+        self.turn = np.where(rng.random(vessels) < turning, rng.choice([-1, 1], vessels) * rng.uniform(1, 10, vessels),
+                             0.0)
+        self.class_b = rng.random(vessels) < class_b
+
+        # encounters: start where the vessel meets own ship after minutes on a straight course
+        count = min(encounters, vessels)
+        self.encounters = np.arange(count)
+        minutes = rng.uniform(*encounter_minutes, count)
+        self.speed[:count] = rng.uniform(8.0, 20.0, count)
+        self.turn[:count] = 0.0
+        self.class_b[:count] = False
+        meet_lat, meet_lon = move(np.full(count, self.own_lat), np.full(count, self.own_lon), self.own_speed,
+                                  self.own_course, minutes * 60.0)
+        self.lat[:count], self.lon[:count] = move(meet_lat, meet_lon, self.speed[:count],
+                                                  (self.course[:count] + 180.0) % 360.0, minutes * 60.0)
+        self.encounter_minutes = minutes
+
+        self.speed[self.class_b] = np.round(self.speed[self.class_b])
+        self.msg_type = np.where(self.class_b, 18, 1)
+        if rate:
+            self.interval = np.full(vessels, vessels / rate)
+        else:
+            self.interval = report_interval(self.speed, self.turn != 0, self.class_b)
+        self.rate = float(np.sum(1.0 / self.interval))                  # position reports per second
+        self.next_report = rng.uniform(0, 1, vessels) * self.interval      # first reports spread over an interval
+        self.first_sent = np.full(vessels, np.nan)                         # time.time() of the first report
+        self.sequence = 0
+
+    def __len__(self):
+        return len(self.mmsi)
+
+    def advance(self, seconds):
+        """
+        Moves own ship and the vessels, turning vessels change their course.
+        """
+        self.own_lat, self.own_lon = move(self.own_lat, self.own_lon, self.own_speed, self.own_course, seconds)
+        self.lat, self.lon = move(self.lat, self.lon, self.speed, self.course, seconds)
+        self.course = (self.course + self.turn * seconds / 60.0) % 360.0
+
+    def due(self, elapsed):
+        """
+        :param elapsed: seconds since the start
+        :return: array of the vessels (indices) with a position report due, their next report is scheduled;
+                 a vessel is repeated for every report due since the last call (interval shorter than the calls)
+        """
+        due = np.flatnonzero(self.next_report <= elapsed)
+        count = ((elapsed - self.next_report[due]) // self.interval[due]).astype(np.intp) + 1
+        self.next_report[due] += count * self.interval[due]
+        return np.repeat(due, count)
+
+    def reports(self, rows):
+        """
+        :return: list of !AIVDM sentences (bytes) of the position reports of the vessels, channel A and B alternating
+        """
+        sentences = []
+        now = time.time()
+        second = int(now) % 60
+        noise = self.rng.normal(scale=self.position_noise, size=(len(rows), 2))
+        lat = self.lat[rows] + noise[:, 0]
+        lon = self.lon[rows] + noise[:, 1] / np.cos(np.radians(self.lat[rows]))
+        for i, row in enumerate(rows):
+            payload = encode_position(int(self.mmsi[row]), float(lat[i]), float(lon[i]),
+                                      float(self.speed[row]), float(self.course[row]), int(round(self.course[row])) % 360,
+                                      int(self.msg_type[row]), float(self.turn[row]), True, second)
+            self.sequence += 1
+            sentences += nmea_sentences(payload.decode('ascii'), 0, 'AB'[self.sequence % 2])
+            if math.isnan(self.first_sent[row]):
+                self.first_sent[row] = now
+        return sentences
+
+    def rmc(self):
+        """
+        :return: $GPRMC sentence (bytes with CR LF) of own ship
+        """
+        now = time.gmtime()
+        lat, lon = abs(self.own_lat), abs(self.own_lon)
+        body = (f'GPRMC,{time.strftime("%H%M%S", now)}.00,A,'
+                f'{int(lat):02d}{(lat - int(lat)) * 60:08.5f},{"N" if self.own_lat >= 0 else "S"},'
+                f'{int(lon):03d}{(lon - int(lon)) * 60:08.5f},{"E" if self.own_lon >= 0 else "W"},'
+                f'{self.own_speed:.1f},{self.own_course:.1f},{time.strftime("%d%m%y", now)},,,A')
+        checksum = 0
+        for char in body.encode('ascii'):
+            checksum ^= char
+        return f'${body}*{checksum:02X}\r\n'.encode('ascii')
+
+
+class PseudoGPS:
+    """
+        Pseudo-terminal that stands in for the serial gps, e.g., gps = PseudoGPS(); SerialGPS(gps.port, 9600)
+        POSIX only, see NullModemGPS for Windows.
+    """
+    def __init__(self):
+        if os.name != 'posix':
+            raise OSError('PseudoGPS needs a pseudo-terminal (Linux, macOS), use NullModemGPS on this platform')
+        import tty
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+    def write(self, sentence):
+        os.write(self.master, sentence)
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class NullModemGPS:
+    """
+        One end of a virtual null-modem pair (e.g., com0com on Windows) that stands in for the serial gps, the other
+        end is the gps port. E.g., gps = NullModemGPS('COM10', 'COM11'); SerialGPS(gps.port, 9600)
+    """
+    def __init__(self, write_port, port, baudrate=9600):
+        """
+        :param write_port: end of the pair the sentences are written to
+        :param port: other end of the pair, used as the gps port
+        """
+        import serial
+
+        self.serial = serial.Serial(write_port, baudrate)
+        self.port = port
+
+    def write(self, sentence):
+        self.serial.write(sentence)
+
+    def close(self):
+        self.serial.close()
+
+
+class TrafficGenerator(threading.Thread):
+    """
+        Sends the position reports of a Fleet over UDP and own ship on a PseudoGPS in real time.
+        E.g., generator = TrafficGenerator(Fleet(1000, rate=2000)); generator.start(); ...; generator.stop()
+    """
+    def __init__(self, fleet, address=('127.0.0.1', 5005), gps=None, tick=0.01, gps_interval=1.0, chunk=1000):
+        """
+        :param address: (ip address, port) of the AIS UDP feed
+        :param gps: PseudoGPS or NullModemGPS for own ship, no gps if None
+        :param tick: seconds between the sends of the due position reports
+        :param chunk: position reports encoded and sent at once
+        """
+        super().__init__(name='TrafficGenerator', daemon=True)
+        self.fleet = fleet
+        self.address = address
+        self.gps = gps
+        self.tick = tick
+        self.gps_interval = gps_interval
+        self.chunk = chunk
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.stop_event = threading.Event()
+        self.traffic = threading.Event()        # AIS is only sent while set, own ship always
+        self.sentences = 0
+        self.send_errors = 0
+        self.started = None                     # time.time() of the first position report
+        self.sending = 0.0                      # seconds with AIS traffic
+
+    def run(self):
+        start = time.monotonic()
+        last = start
+        next_gps = start
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            self.fleet.advance(now - last)
+            if self.gps is not None and now >= next_gps:
+                self.gps.write(self.fleet.rmc())
+                next_gps += self.gps_interval
+            if self.traffic.is_set():
+                if self.started is None:
+                    self.started = time.time()
+                    traffic_start = now
+                due = self.fleet.due(now - traffic_start)
+                # in chunks: a generator that fell behind still stops soon after the traffic is switched off
+                for chunk in range(0, len(due), self.chunk):
+                    if not self.traffic.is_set() or self.stop_event.is_set():
+                        break
+                    for sentence in self.fleet.reports(due[chunk:chunk + self.chunk]):
+                        try:
+                            self.sock.sendto(sentence, self.address)
+                            self.sentences += 1
+                        except OSError:
+                            self.send_errors += 1
+                self.sending = time.monotonic() - traffic_start
+            last = now
+            self.stop_event.wait(max(self.tick - (time.monotonic() - now), 0))
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.sock.close()
+
+    def counters(self):
+        return {'sentences': self.sentences, 'send_errors': self.send_errors, 'seconds': self.sending,
+                'rate': self.sentences / max(self.sending, 1e-9), 'requested_rate': self.fleet.rate}
+
+
+def scrape(url):
+    """
+    :return: dict metric name -> value summed over all labels of a Prometheus text page
+    """
+    values = {}
+    with urllib.request.urlopen(url, timeout=5) as response:
+        for line in response.read().decode().splitlines():
+            if line and not line.startswith('#'):
+                name, _, value = line.rpartition(' ')
+                name = name.split('{')[0]
+                values[name] = values.get(name, 0.0) + float(value)
+    return values
+
+
+def load_test(fleet, seconds=60, udp_port=5005, metrics_port=9109, min_distance=400, sweep_interval=10, gps=None):
+    """
+    :param fleet: Fleet
+    :param seconds: seconds of AIS traffic
+    :param min_distance: minimum distance in meters for the collision warning
+    :param gps: PseudoGPS or NullModemGPS for own ship, a new PseudoGPS if None; closed at the end
+    :return: dict of the results
+
+    Runs collision_detection.py in a subprocess (streaming mode, gps on the given port, metrics on metrics_port)
+    and sends the traffic of the fleet to it.
+    """
+    if gps is None:
+        gps = PseudoGPS()
+    generator = TrafficGenerator(fleet, ('127.0.0.1', udp_port), gps)
+    script = (f'import collision_detection as cd\n'
+              f'cd.port = {gps.port!r}\n'
+              f'cd.udp_feeds = [("127.0.0.1", {udp_port})]\n'
+              f'cd.streaming_mode = True\n'
+              f'cd.sweep_interval = {sweep_interval}\n'
+              f'cd.metrics_port = {metrics_port}\n'
+              f'cd.set_min_distance({min_distance})\n'
+              f'cd.setup()\n'
+              f'try:\n'
+              f'    cd.stream_reader(cd.sweep_interval)\n'
+              f'except KeyboardInterrupt:\n'
+              f'    cd.close()\n')
+    process = subprocess.Popen([sys.executable, '-u', '-c', script], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               cwd=os.path.dirname(os.path.abspath(__file__)), text=True)
+    alarms = {}                                 # mmsi -> time.time() of the first collision warning
+    ready = threading.Event()
+    output = []
+
+    def read_output():
+        pattern = re.compile(r'MMSI (\d+) : collision detected')
+        for line in process.stdout:
+            match = pattern.match(line)
+            if match:
+                alarms.setdefault(int(match.group(1)), time.time())
+            elif line.startswith('Own ship position data'):
+                ready.set()                     # socket bound and first gps fix
+            elif len(output) < 200:
+                output.append(line)
+
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
+    generator.start()
+    try:
+        if not ready.wait(30):
+            raise RuntimeError('collision_detection.py did not start:\n' + ''.join(output))
+        generator.traffic.set()
+        time.sleep(seconds)
+        generator.traffic.clear()
+        time.sleep(1.0)                         # let the receiver drain the socket
+        metrics = scrape(f'http://127.0.0.1:{metrics_port}/metrics')
+    finally:
+        generator.stop()
+        process.send_signal(2)                  # SIGINT
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        gps.close()
+
+    sent = generator.counters()
+    received = metrics.get('ais_received_sentences_total', 0)
+    stored = metrics.get('ais_position_reports_total', 0)
+    duplicates = metrics.get('ais_duplicate_sentences_total', 0)      # same report twice (e.g., moored, same second)
+    encounters = fleet.mmsi[fleet.encounters]
+    latency = np.array([alarms[mmsi] - fleet.first_sent[row] for row, mmsi in zip(fleet.encounters, encounters)
+                        if mmsi in alarms])
+    return {'vessels': len(fleet), 'seconds': sent['seconds'], 'sent': sent['sentences'], 'send_rate': sent['rate'],
+            'requested_rate': sent['requested_rate'],
+            'received': int(received), 'stored': int(stored), 'throughput': stored / max(sent['seconds'], 1e-9),
+            'kernel_drops': int(metrics.get('ais_kernel_drops_total', 0)),
+            'duplicates': int(duplicates), 'decode_failures': int(metrics.get('ais_decode_failures_total', 0)),
+            'drop_rate': 1.0 - (stored + duplicates) / max(sent['sentences'], 1),
+            'encounters': len(encounters), 'detected': len(latency),
+            'alarm_latency': latency, 'other_alarms': len(set(alarms) - set(encounters.tolist()))}
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Synthetic AIS traffic over UDP and own ship gps on a pseudo-terminal")
+    parser.add_argument("--vessels", type=int, default=100, help="number of vessels")
+    parser.add_argument("--rate", type=float, help="position reports per second, ITU-R M.1371 intervals if not given")
+    parser.add_argument("--encounters", type=int, default=5, help="vessels on a collision course with own ship")
+    parser.add_argument("--turning", type=float, default=0.2, help="fraction of turning vessels")
+    parser.add_argument("--port", type=int, default=5005, help="UDP port of the AIS feed")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the fleet")
+    parser.add_argument("--load-test", action="store_true", help="run collision_detection.py and report the results")
+    parser.add_argument("--seconds", type=float, default=60, help="seconds of traffic in the load test")
+    parser.add_argument("--min-distance", type=float, default=400, help="minimum distance in meters (load test)")
+    parser.add_argument("--metrics-port", type=int, default=9109, help="metrics port of collision_detection.py")
+    parser.add_argument("--gps-ports", nargs=2, metavar=("WRITE", "READ"),
+                        help="virtual null-modem pair for own ship instead of a pseudo-terminal, e.g., COM10 COM11")
+
+    args = parser.parse_args()
+
+    fleet = Fleet(args.vessels, turning=args.turning, encounters=args.encounters, rate=args.rate, seed=args.seed)
+    gps = NullModemGPS(*args.gps_ports) if args.gps_ports else PseudoGPS()
+    if args.load_test:
+        results = load_test(fleet, args.seconds, args.port, args.metrics_port, args.min_distance, gps=gps)
+        latency = results.pop('alarm_latency')
+        print(f'{results["vessels"]} vessels, {results["seconds"]:.1f} s: {results["sent"]} sentences sent '
+              f'({results["send_rate"]:.0f}/s), {results["received"]} received, {results["stored"]} stored '
+              f'({results["throughput"]:.0f}/s), {results["duplicates"]} duplicates, {results["kernel_drops"]} kernel drops, '
+              f'{results["decode_failures"]} decode failures, '
+              f'drop rate {results["drop_rate"]:.2%}')
+        print(f'Encounters: {results["detected"]} of {results["encounters"]} detected, other vessels with warnings: '
+              f'{results["other_alarms"]}')
+        if len(latency):
+            print(f'Alarm latency: median {np.median(latency):.3f} s, 95th percentile '
+                  f'{np.percentile(latency, 95):.3f} s, max {latency.max():.3f} s')
+        if results['send_rate'] < 0.95 * results['requested_rate']:
+            print(f'Warning: {results["requested_rate"]:.0f} reports per second requested, the generator only sent '
+                  f'{results["send_rate"]:.0f}/s; the results are for the lower rate')
+    else:
+        generator = TrafficGenerator(fleet, ('127.0.0.1', args.port), gps)
+        print(f'Own ship gps on {gps.port}, AIS to UDP port {args.port}, {len(fleet)} vessels '
+              f'({fleet.interval.mean():.1f} s mean report interval). CTRL + C to stop.')
+        generator.traffic.set()
+        generator.start()
+        try:
+            while True:
+                time.sleep(10)
+                counters = generator.counters()
+                print(counters)
+                if counters['rate'] < 0.95 * counters['requested_rate']:
+                    print(f'Warning: the generator cannot keep up with {counters["requested_rate"]:.0f} reports per '
+                          f'second')
+        except KeyboardInterrupt:
+            pass
+        generator.stop()
+        gps.close()